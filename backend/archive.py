@@ -0,0 +1,107 @@
+import argparse
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from backend import crud, models
+from backend.database import SessionLocal, engine
+from backend.summaries import refresh_result_summaries
+from config import settings
+
+# Copied as they are; mark_id is dropped, the history table is keyed by MARK_KEY
+HISTORY_COLUMNS = ('academic_year', 'student_id', 'subject_id', 'exam_type', 'marks_obtained', 'updated_by',
+                   'updated_at')
+
+def partition_name(academic_year: str) -> str:
+    # Naming used by database/partition_marks.sql: 2022-23 -> p2022_23
+    return "p" + academic_year.replace("-", "_")
+
+def _has_partition(db: Session, academic_year: str) -> bool:
+    if db.get_bind().dialect.name != "mysql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = 'marks' AND partition_name = :name"
+    ), {"name": partition_name(academic_year)}).first() is not None
+
+def _partition_holds_only(db: Session, academic_year: str) -> bool:
+    # A partition without a lower bound (the first one) also holds every earlier year;
+    # dropping it would lose marks that were never copied to marks_history
+    return db.execute(text(
+        f"SELECT 1 FROM marks PARTITION ({partition_name(academic_year)}) WHERE academic_year <> :year LIMIT 1"
+    ), {"year": academic_year}).first() is None
+
+def year_counts(db: Session):
+    # -> ({live year: marks}, {archived year: marks})
+    live = dict(db.execute(
+        select(models.Mark.academic_year, func.count()).group_by(models.Mark.academic_year)
+    ).all())
+    archived = dict(db.execute(select(models.ArchivedYear.academic_year, models.ArchivedYear.marks_count)).all())
+    return live, archived
+
+def archive_year(db: Session, academic_year: str) -> int:
+    # Moves a closed year's marks into marks_history and marks the year read-only. Its
+    # result summaries stay, so overall CGPA keeps counting it. The year is only recorded as
+    # archived once its live rows are gone, so a failure part way leaves it live, and
+    # re-running picks up where the last run stopped.
+    if academic_year >= settings.current_academic_year:
+        raise ValueError(f"{academic_year} is not closed; the current academic year is "
+                         f"{settings.current_academic_year}")
+    if db.get(models.ArchivedYear, academic_year) is not None:
+        return 0
+    in_year = models.Mark.academic_year == academic_year
+    in_history = models.MarkHistory.academic_year == academic_year
+
+    student_ids = db.scalars(select(models.Mark.student_id).where(in_year).distinct()).all()
+    if student_ids:
+        # Bring the year's summaries up to date before its marks leave the live table
+        refresh_result_summaries(db, [(student_id, academic_year) for student_id in student_ids])
+        # A copy left by an interrupted run is replaced, not added to
+        db.execute(delete(models.MarkHistory).where(in_history))
+        db.execute(insert(models.MarkHistory).from_select(
+            HISTORY_COLUMNS,
+            select(*(getattr(models.Mark, column) for column in HISTORY_COLUMNS)).where(in_year)
+        ))
+    moved = db.scalar(select(func.count()).select_from(models.MarkHistory).where(in_history))
+    if not moved:
+        raise ValueError(f"No marks for {academic_year}")
+
+    if student_ids and _has_partition(db, academic_year) and _partition_holds_only(db, academic_year):
+        # Dropping the partition is a metadata change, unlike deleting its rows one by one.
+        # DDL commits implicitly, so the copy is committed first. The year is closed, so
+        # nothing writes to it between the two.
+        db.commit()
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE marks DROP PARTITION {partition_name(academic_year)}"))
+    elif student_ids:
+        db.execute(delete(models.Mark).where(in_year))
+
+    db.add(models.ArchivedYear(academic_year=academic_year, marks_count=moved))
+    crud.bump_data_version(db, crud.MARKS_VERSION)
+    db.commit()
+    return moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed academic years out of the marks table")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="marks per live and archived academic year")
+    close = commands.add_parser("close", help="move a closed year's marks into marks_history")
+    close.add_argument("academic_year", nargs="+")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if args.command == "status":
+            live, archived = year_counts(db)
+            for academic_year in sorted(live.keys() | archived.keys()):
+                if academic_year in archived:
+                    print(f"{academic_year}  archived  {archived[academic_year]:>9} marks in marks_history")
+                if academic_year in live:
+                    print(f"{academic_year}  live      {live[academic_year]:>9} marks")
+        else:
+            for academic_year in sorted(args.academic_year):
+                try:
+                    moved = archive_year(db, academic_year)
+                except ValueError as error:
+                    parser.exit(1, f"{error}\n")
+                print(f"{academic_year}: {moved} marks archived")
@@ -1,7 +1,92 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from config import settings
 from .auth import decode_jwt
 
+def token_hash(token: str) -> str:
+    # Revoked tokens are stored and compared by hash, never as usable bearer tokens
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class TokenCache:
+    # LRU of verified token payloads. Entries live until the token's exp or the
+    # TTL, whichever comes first. Only touched from the event loop, so no locking.
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._revoked_tokens = {}
+        # Revocation ids become visible at commit, not in id order, so each sync re-reads
+        # from the cursor of the sync before last
+        self._cursors = [0, 0]
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: dict):
+        expires_at = min(payload["exp"], time.time() + self.ttl)
+        self._entries[token] = (payload, expires_at)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, token: str) -> bool:
+        return token_hash(token) in self._revoked_tokens
+
+    def revoke(self, token: str, payload: dict):
+        # Logout on this worker: reject the token until it would have expired anyway. The
+        # caller also records it in revoked_tokens for the other workers.
+        self._entries.pop(token, None)
+        self._revoked_tokens[token_hash(token)] = payload["exp"]
+        self._prune_revoked()
+
+    @property
+    def sync_cursor(self) -> int:
+        return self._cursors[0]
+
+    def add_revoked(self, rows):
+        # rows: (revocation_id, token_hash, expires_at) read from revoked_tokens
+        for _, revoked_hash, expires_at in rows:
+            self._revoked_tokens[revoked_hash] = expires_at
+        self._cursors = [self._cursors[1], max([self._cursors[1], *(row[0] for row in rows)])]
+        self._prune_revoked()
+
+    def _prune_revoked(self):
+        now = time.time()
+        for revoked_hash, exp in list(self._revoked_tokens.items()):
+            if exp <= now:
+                del self._revoked_tokens[revoked_hash]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "revoked_tokens": len(self._revoked_tokens)
+        }
+
+token_cache = TokenCache(settings.token_cache_size, settings.token_cache_ttl_seconds)
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_error)
@@ -14,13 +99,20 @@ class JWTBearer(HTTPBearer):
             payload = self.verify_jwt(credentials.credentials)
             if not payload:
                 raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+            request.state.token = credentials.credentials
             return payload
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
     def verify_jwt(self, jwtoken: str) -> dict:
-        try:
-            payload = decode_jwt(jwtoken)
-            return payload
-        except:
+        payload = token_cache.get(jwtoken)
+        if payload is None:
+            try:
+                payload = decode_jwt(jwtoken)
+            except:
+                payload = None
+            if payload:
+                token_cache.put(jwtoken, payload)
+        if payload and token_cache.is_revoked(jwtoken):
             return None
+        return payload
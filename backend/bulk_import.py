@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend import crud, models, schemas
+from backend.database import AnySession, run_db
+from backend.hashing import password_hasher
+from backend.query_budget import query_budget
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_TARGETS = {
+    "students": (schemas.StudentCreate, models.Student, ("username", "email", "roll_number")),
+    "teachers": (schemas.TeacherCreate, models.Teacher, ("username", "email"))
+}
+
+def iter_records(stream: BinaryIO, format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    # Yields (row_number, record, parse_error) one line at a time
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for row_number, record in enumerate(reader, 1):
+            yield row_number, record, None
+    else:
+        for row_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Expected a JSON object"
+                continue
+            yield row_number, record, None
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+@query_budget(1)
+def _existing_values(db: Session, model, unique_fields, chunk) -> dict:
+    # One query per chunk for every unique column already present in the table
+    conditions = [
+        getattr(model, field).in_([record[field] for _, record in chunk])
+        for field in unique_fields
+    ]
+    columns = [getattr(model, field) for field in unique_fields]
+    existing = {field: set() for field in unique_fields}
+    for row in db.query(*columns).filter(or_(*conditions)):
+        for field, value in zip(unique_fields, row):
+            existing[field].add(value)
+    return existing
+
+def _insert_chunk(db: Session, model, rows: List[Tuple[int, dict]]) -> List[Tuple[int, str]]:
+    # Multi-row INSERT in its own transaction; on a constraint failure retry row by
+    # row inside savepoints so only the offending rows are reported.
+    if not rows:
+        return []
+    try:
+        db.execute(insert(model), [row for _, row in rows])
+        db.commit()
+        return []
+    except IntegrityError:
+        db.rollback()
+
+    errors = []
+    for row_number, row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(model), [row])
+        except IntegrityError as e:
+            errors.append((row_number, f"Rejected by database: {e.orig}"))
+    db.commit()
+    return errors
+
+def _touch_catalog(db: Session):
+    crud.bump_data_version(db, crud.CATALOG_VERSION)
+    db.commit()
+
+async def import_users(db: AnySession, target: str, stream: BinaryIO, format: str) -> dict:
+    schema, model, unique_fields = IMPORT_TARGETS[target]
+    report = {"total": 0, "inserted": 0, "failed": 0, "errors": []}
+    seen = {field: set() for field in unique_fields}
+
+    def fail(row_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+
+    async def flush(chunk):
+        if not chunk:
+            return
+        existing = await run_db(db, _existing_values, model, unique_fields, chunk)
+        accepted = []
+        for row_number, record in chunk:
+            duplicate = next((f for f in unique_fields if record[f] in existing[f]), None)
+            if duplicate:
+                fail(row_number, f"{duplicate} '{record[duplicate]}' already exists")
+            else:
+                accepted.append((row_number, record))
+
+        hashes = await password_hasher.hash_many([record.pop("password") for _, record in accepted])
+        for (_, record), password_hash in zip(accepted, hashes):
+            record["password_hash"] = password_hash
+
+        errors = await run_db(db, _insert_chunk, model, accepted)
+        for row_number, message in errors:
+            fail(row_number, message)
+        report["inserted"] += len(accepted) - len(errors)
+
+    chunk = []
+    for row_number, record, error in iter_records(stream, format):
+        report["total"] += 1
+        if error:
+            fail(row_number, error)
+            continue
+        try:
+            # Blank CSV cells mean "not provided"; unnamed extra CSV columns are dropped
+            validated = schema(**{k: v for k, v in record.items() if k and v not in ("", None)})
+        except ValidationError as e:
+            fail(row_number, _validation_message(e))
+            continue
+
+        record = validated.dict()
+        duplicate = next((f for f in unique_fields if record[f] in seen[f]), None)
+        if duplicate:
+            fail(row_number, f"Duplicate {duplicate} '{record[duplicate]}' earlier in the file")
+            continue
+        for field in unique_fields:
+            seen[field].add(record[field])
+
+        chunk.append((row_number, record))
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    await flush(chunk)
+    if target == "teachers" and report["inserted"]:
+        await run_db(db, _touch_catalog)
+    return report
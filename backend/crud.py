@@ -1,24 +1,58 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-from backend import models, schemas
-from backend.auth import verify_password, get_password_hash
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, bindparam, case, delete, func, insert, literal, null, or_, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from backend import gradebook, models, schemas
+from backend.auth import get_password_hash
+from backend.database import AnySession, native_async, run_db
+from backend.hashing import password_hasher
+from backend.query_budget import query_budget
+from backend.summaries import OVERALL_YEAR, Summary, refresh_result_summaries
+from config import settings
 from typing import List, Optional
+from datetime import datetime
 from decimal import Decimal
+import time
 
-def authenticate_user(db: Session, username: str, password: str, user_type: str):
-    if user_type == "admin":
-        user = db.query(models.Admin).filter(models.Admin.username == username).first()
-    elif user_type == "teacher":
-        user = db.query(models.Teacher).filter(models.Teacher.username == username).first()
-    elif user_type == "student":
-        user = db.query(models.Student).filter(models.Student.username == username).first()
-    else:
+USER_MODELS = {
+    "admin": models.Admin,
+    "teacher": models.Teacher,
+    "student": models.Student
+}
+
+def _user_statement(model, username: str):
+    return select(model).where(model.username == username).limit(1)
+
+@query_budget(1)
+def get_user(db: Session, username: str, user_type: str):
+    model = USER_MODELS.get(user_type)
+    if model is None:
         return None
-    
+    return db.scalar(_user_statement(model, username))
+
+@native_async(get_user)
+@query_budget(1)
+async def get_user_async(db: AsyncSession, username: str, user_type: str):
+    model = USER_MODELS.get(user_type)
+    if model is None:
+        return None
+    return await db.scalar(_user_statement(model, username))
+
+def set_password_hash(db: Session, user, password_hash: str):
+    user.password_hash = password_hash
+    db.commit()
+    db.refresh(user)
+
+async def authenticate_user(db: AnySession, username: str, password: str, user_type: str):
+    user = await run_db(db, get_user, username, user_type)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not verified:
         return None
+    if new_hash:
+        # Stored scheme or bcrypt cost is outdated; upgrade it while we have the plaintext
+        await run_db(db, set_password_hash, user, new_hash)
     return user
 
 def get_all_students(db: Session) -> List[models.Student]:
@@ -30,8 +64,152 @@ def get_all_teachers(db: Session) -> List[models.Teacher]:
 def get_all_subjects(db: Session) -> List[models.Subject]:
     return db.query(models.Subject).all()
 
-def create_student(db: Session, student: schemas.StudentCreate):
-    hashed_password = get_password_hash(student.password)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def _keyset_statement(statement, key_column, after: Optional[int], limit: Optional[int]):
+    # Keyset pagination on the primary key; limit=None returns every match. One row past the
+    # page tells whether there is a next one (_keyset_rows).
+    if after is not None:
+        statement = statement.where(key_column > after)
+    statement = statement.order_by(key_column)
+    return statement if limit is None else statement.limit(limit + 1)
+
+def _keyset_rows(rows, key_column, limit: Optional[int]):
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], key_column.key)
+    return rows, None
+
+def _students_statement(department: Optional[str], semester: Optional[int], prefix: Optional[str]):
+    statement = select(models.Student)
+    if department is not None:
+        statement = statement.where(models.Student.department == department)
+    if semester is not None:
+        statement = statement.where(models.Student.semester == semester)
+    if prefix:
+        statement = statement.where(or_(
+            models.Student.full_name.startswith(prefix, autoescape=True),
+            models.Student.roll_number.startswith(prefix, autoescape=True)
+        ))
+    return statement
+
+@query_budget(1)
+def list_students(db: Session, after: Optional[int] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                  department: Optional[str] = None, semester: Optional[int] = None, prefix: Optional[str] = None):
+    statement = _keyset_statement(_students_statement(department, semester, prefix), models.Student.student_id,
+                                  after, limit)
+    return _keyset_rows(db.scalars(statement).all(), models.Student.student_id, limit)
+
+@native_async(list_students)
+@query_budget(1)
+async def list_students_async(db: AsyncSession, after: Optional[int] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                              department: Optional[str] = None, semester: Optional[int] = None,
+                              prefix: Optional[str] = None):
+    statement = _keyset_statement(_students_statement(department, semester, prefix), models.Student.student_id,
+                                  after, limit)
+    return _keyset_rows((await db.scalars(statement)).all(), models.Student.student_id, limit)
+
+def _teachers_statement(department: Optional[str], prefix: Optional[str]):
+    statement = select(models.Teacher)
+    if department is not None:
+        statement = statement.where(models.Teacher.department == department)
+    if prefix:
+        statement = statement.where(or_(
+            models.Teacher.full_name.startswith(prefix, autoescape=True),
+            models.Teacher.username.startswith(prefix, autoescape=True)
+        ))
+    return statement
+
+@query_budget(1)
+def list_teachers(db: Session, after: Optional[int] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                  department: Optional[str] = None, prefix: Optional[str] = None):
+    statement = _keyset_statement(_teachers_statement(department, prefix), models.Teacher.teacher_id, after, limit)
+    return _keyset_rows(db.scalars(statement).all(), models.Teacher.teacher_id, limit)
+
+@native_async(list_teachers)
+@query_budget(1)
+async def list_teachers_async(db: AsyncSession, after: Optional[int] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                              department: Optional[str] = None, prefix: Optional[str] = None):
+    statement = _keyset_statement(_teachers_statement(department, prefix), models.Teacher.teacher_id, after, limit)
+    return _keyset_rows((await db.scalars(statement)).all(), models.Teacher.teacher_id, limit)
+
+def _subjects_statement(semester: Optional[int], prefix: Optional[str]):
+    statement = select(models.Subject)
+    if semester is not None:
+        statement = statement.where(models.Subject.semester == semester)
+    if prefix:
+        statement = statement.where(or_(
+            models.Subject.subject_name.startswith(prefix, autoescape=True),
+            models.Subject.subject_code.startswith(prefix, autoescape=True)
+        ))
+    return statement
+
+@query_budget(1)
+def list_subjects(db: Session, after: Optional[int] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                  semester: Optional[int] = None, prefix: Optional[str] = None):
+    statement = _keyset_statement(_subjects_statement(semester, prefix), models.Subject.subject_id, after, limit)
+    return _keyset_rows(db.scalars(statement).all(), models.Subject.subject_id, limit)
+
+@native_async(list_subjects)
+@query_budget(1)
+async def list_subjects_async(db: AsyncSession, after: Optional[int] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                              semester: Optional[int] = None, prefix: Optional[str] = None):
+    statement = _keyset_statement(_subjects_statement(semester, prefix), models.Subject.subject_id, after, limit)
+    return _keyset_rows((await db.scalars(statement)).all(), models.Subject.subject_id, limit)
+
+CATALOG_VERSION = "catalog"  # teachers, subjects and assignments
+MARKS_VERSION = "marks"  # marks and everything derived from them: summaries, ranks, percentiles
+
+def _data_version_statement(name: str):
+    return select(models.DataVersion.version).where(models.DataVersion.name == name)
+
+def get_data_version(db: Session, name: str) -> int:
+    return db.scalar(_data_version_statement(name)) or 0
+
+@native_async(get_data_version)
+async def get_data_version_async(db: AsyncSession, name: str) -> int:
+    return await db.scalar(_data_version_statement(name)) or 0
+
+def bump_data_version(db: Session, name: str):
+    # Call inside the writing transaction, so the new version commits together with the data.
+    # One upsert, so two first writers cannot both miss the row and race to insert it.
+    dialect = db.get_bind().dialect.name
+    next_version = models.DataVersion.version + 1
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        db.execute(mysql_insert(models.DataVersion).values(name=name, version=1)
+                   .on_duplicate_key_update(version=next_version))
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        db.execute(dialect_insert(models.DataVersion).values(name=name, version=1)
+                   .on_conflict_do_update(index_elements=["name"], set_={"version": next_version}))
+    else:
+        result = db.execute(
+            update(models.DataVersion).where(models.DataVersion.name == name).values(version=next_version)
+        )
+        if result.rowcount == 0:
+            db.execute(insert(models.DataVersion).values(name=name, version=1))
+
+def revoke_token(db: Session, token_hash: str, expires_at: int):
+    # Logout, picked up by every worker's revocation sync; expired rows are cleared on the way
+    db.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at <= int(time.time())))
+    db.add(models.RevokedToken(token_hash=token_hash, expires_at=expires_at))
+    db.commit()
+
+def get_revoked_tokens(db: Session, after_id: int):
+    return db.execute(select(
+        models.RevokedToken.revocation_id, models.RevokedToken.token_hash, models.RevokedToken.expires_at
+    ).where(
+        models.RevokedToken.revocation_id > after_id, models.RevokedToken.expires_at > int(time.time())
+    )).all()
+
+def create_student(db: Session, student: schemas.StudentCreate, hashed_password: Optional[str] = None):
+    # Callers on the event loop hash off-thread and pass the result in
+    hashed_password = hashed_password or get_password_hash(student.password)
     db_student = models.Student(
         username=student.username,
         password_hash=hashed_password,
@@ -47,8 +225,8 @@ def create_student(db: Session, student: schemas.StudentCreate):
     db.refresh(db_student)
     return db_student
 
-def create_teacher(db: Session, teacher: schemas.TeacherCreate):
-    hashed_password = get_password_hash(teacher.password)
+def create_teacher(db: Session, teacher: schemas.TeacherCreate, hashed_password: Optional[str] = None):
+    hashed_password = hashed_password or get_password_hash(teacher.password)
     db_teacher = models.Teacher(
         username=teacher.username,
         password_hash=hashed_password,
@@ -58,6 +236,7 @@ def create_teacher(db: Session, teacher: schemas.TeacherCreate):
         department=teacher.department
     )
     db.add(db_teacher)
+    bump_data_version(db, CATALOG_VERSION)
     db.commit()
     db.refresh(db_teacher)
     return db_teacher
@@ -65,17 +244,25 @@ def create_teacher(db: Session, teacher: schemas.TeacherCreate):
 def create_subject(db: Session, subject: schemas.SubjectBase):
     db_subject = models.Subject(**subject.dict())
     db.add(db_subject)
+    bump_data_version(db, CATALOG_VERSION)
     db.commit()
     db.refresh(db_subject)
     return db_subject
 
-def assign_teacher_to_subject(db: Session, teacher_id: int, subject_id: int, academic_year: str = "2024-25"):
+def assign_teacher_to_subject(db: Session, teacher_id: int, subject_id: int, academic_year: Optional[str] = None):
     assignment = models.TeacherSubject(
         teacher_id=teacher_id,
         subject_id=subject_id,
-        academic_year=academic_year
+        academic_year=academic_year or settings.current_academic_year
     )
     db.add(assignment)
+    try:
+        db.flush()
+    except IntegrityError:
+        # unique_assignment: this teacher already teaches the subject that year
+        db.rollback()
+        return None
+    bump_data_version(db, CATALOG_VERSION)
     db.commit()
     return assignment
 
@@ -84,108 +271,805 @@ def get_teacher_subjects(db: Session, teacher_id: int):
         models.TeacherSubject.teacher_id == teacher_id
     ).all()
 
-def get_marks_for_teacher_subjects(db: Session, teacher_id: int):
-    rows = db.query(
+TEACHER_MARKS_PAGE_SIZE = 500
+# Sent once per page; each row is a list in this order
+TEACHER_MARK_COLUMNS = ("mark_id", "student_id", "student_name", "subject_id", "exam_type", "marks_obtained")
+SUBJECT_COLUMNS = ("subject_id", "subject_code", "subject_name", "max_marks", "passing_marks")
+
+def mark_cursor(subject_id: int, mark_id: int) -> str:
+    return f"{subject_id}:{mark_id}"
+
+def parse_mark_cursor(cursor: str):
+    # -> (subject_id, mark_id); ValueError for anything else
+    subject_id, mark_id = cursor.split(":")
+    return int(subject_id), int(mark_id)
+
+def _teacher_marks_statement(teacher_id: int, academic_year: str, exam_type: Optional[str],
+                             subject_id: Optional[int], after: Optional[tuple], limit: int):
+    # One academic year at a time, subject by subject in mark_id order, keyset-paginated on
+    # (subject_id, mark_id). The subjects come from the teacher's assignments that same year;
+    # IN rather than a join, so no mark is listed twice.
+    taught = select(models.TeacherSubject.subject_id).where(
+        models.TeacherSubject.teacher_id == teacher_id,
+        models.TeacherSubject.academic_year == academic_year
+    )
+    statement = select(
         models.Mark.mark_id,
         models.Mark.student_id,
+        models.Student.full_name.label('student_name'),
         models.Mark.subject_id,
-        models.Mark.marks_obtained,
-        models.Mark.academic_year,
         models.Mark.exam_type,
-        models.Student.full_name.label('student_name'),
-        models.Subject.subject_name,
+        models.Mark.marks_obtained,
         models.Subject.subject_code,
+        models.Subject.subject_name,
         models.Subject.max_marks,
         models.Subject.passing_marks
-    ).join(models.Student).join(models.Subject).join(models.TeacherSubject).filter(
-        models.TeacherSubject.teacher_id == teacher_id
-    ).all()
-    
-    # Convert Row objects to dictionaries
-    return [dict(row._mapping) for row in rows]
+    ).join(models.Student).join(models.Subject).where(
+        models.Mark.academic_year == academic_year,
+        models.Mark.subject_id.in_(taught)
+    )
+    if exam_type is not None:
+        statement = statement.where(models.Mark.exam_type == exam_type)
+    if subject_id is not None:
+        statement = statement.where(models.Mark.subject_id == subject_id)
+    if after is not None:
+        after_subject, after_mark = after
+        statement = statement.where(or_(
+            models.Mark.subject_id > after_subject,
+            and_(models.Mark.subject_id == after_subject, models.Mark.mark_id > after_mark)
+        ))
+    return statement.order_by(models.Mark.subject_id, models.Mark.mark_id).limit(limit + 1)
+
+def _teacher_marks_page(rows, academic_year: str, exam_type: Optional[str], limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = mark_cursor(rows[-1].subject_id, rows[-1].mark_id)
+
+    # Columnar: names once, then one list per mark; subject details once per subject on the page
+    subjects = {}
+    for row in rows:
+        if row.subject_id not in subjects:
+            subjects[row.subject_id] = {column: getattr(row, column) for column in SUBJECT_COLUMNS}
+    return {
+        'academic_year': academic_year,
+        'exam_type': exam_type,
+        'columns': list(TEACHER_MARK_COLUMNS),
+        'rows': [[row.mark_id, row.student_id, row.student_name, row.subject_id, row.exam_type,
+                  float(row.marks_obtained) if row.marks_obtained is not None else None] for row in rows],
+        'subjects': list(subjects.values()),
+        'next_cursor': next_cursor
+    }
+
+@query_budget(1)
+def get_marks_for_teacher_subjects(db: Session, teacher_id: int, academic_year: Optional[str] = None,
+                                   exam_type: Optional[str] = None, subject_id: Optional[int] = None,
+                                   after: Optional[tuple] = None, limit: int = TEACHER_MARKS_PAGE_SIZE):
+    # The current academic year by default
+    academic_year = academic_year or settings.current_academic_year
+    statement = _teacher_marks_statement(teacher_id, academic_year, exam_type, subject_id, after, limit)
+    return _teacher_marks_page(db.execute(statement).all(), academic_year, exam_type, limit)
+
+@native_async(get_marks_for_teacher_subjects)
+@query_budget(1)
+async def get_marks_for_teacher_subjects_async(db: AsyncSession, teacher_id: int, academic_year: Optional[str] = None,
+                                               exam_type: Optional[str] = None, subject_id: Optional[int] = None,
+                                               after: Optional[tuple] = None, limit: int = TEACHER_MARKS_PAGE_SIZE):
+    academic_year = academic_year or settings.current_academic_year
+    statement = _teacher_marks_statement(teacher_id, academic_year, exam_type, subject_id, after, limit)
+    return _teacher_marks_page((await db.execute(statement)).all(), academic_year, exam_type, limit)
+
+
+MARK_KEY = ("student_id", "subject_id", "academic_year", "exam_type")
+UPSERT_CHUNK_SIZE = 1000
+
+def _mark_upsert_portable(db: Session, rows: List[dict]):
+    # Backends without an upsert statement: lock the rows that already exist, then one
+    # executemany UPDATE for those and one multi-row INSERT for the rest
+    existing = _current_marks(db, [tuple(row[column] for column in MARK_KEY) for row in rows], for_update=True)
+    updates = [row for row in rows if tuple(row[column] for column in MARK_KEY) in existing]
+    inserts = [row for row in rows if tuple(row[column] for column in MARK_KEY) not in existing]
+    marks = models.Mark.__table__
+    if updates:
+        db.execute(
+            update(marks).where(
+                *(marks.c[column] == bindparam(f"key_{column}") for column in MARK_KEY)
+            ).values(marks_obtained=bindparam("new_marks"), updated_by=bindparam("new_updated_by"),
+                     updated_at=func.now()),
+            [
+                {**{f"key_{column}": row[column] for column in MARK_KEY},
+                 'new_marks': row['marks_obtained'], 'new_updated_by': row['updated_by']}
+                for row in updates
+            ]
+        )
+    if inserts:
+        db.execute(insert(marks), inserts)
+
+def _mark_upsert(db: Session, rows: List[dict]):
+    # One multi-row INSERT keyed on the unique_mark constraint
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(models.Mark).values(rows)
+        db.execute(stmt.on_duplicate_key_update(
+            marks_obtained=stmt.inserted.marks_obtained,
+            updated_by=stmt.inserted.updated_by,
+            updated_at=func.now()
+        ))
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(models.Mark).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=list(MARK_KEY),
+            set_={
+                'marks_obtained': stmt.excluded.marks_obtained,
+                'updated_by': stmt.excluded.updated_by,
+                'updated_at': func.now()
+            }
+        ))
+    else:
+        _mark_upsert_portable(db, rows)
+
+def _current_marks(db: Session, keys: list, for_update: bool = False) -> dict:
+    # MARK_KEY tuple -> marks_obtained for the keys that exist, in one query
+    if not keys:
+        return {}
+    query = db.query(
+        models.Mark.student_id,
+        models.Mark.subject_id,
+        models.Mark.academic_year,
+        models.Mark.exam_type,
+        models.Mark.marks_obtained
+    ).filter(
+        # The plain IN on the leading column lets SQLite reach unique_mark; it won't for row values alone
+        models.Mark.student_id.in_(sorted({key[0] for key in keys})),
+        tuple_(*(getattr(models.Mark, column) for column in MARK_KEY)).in_(keys)
+    )
+    if for_update:
+        query = query.with_for_update()
+    return {tuple(row[:4]): row.marks_obtained for row in query}
+
+def _same_marks(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return Decimal(str(a)) == Decimal(str(b))
+
+@query_budget(1)
+def _archived_years_statement(academic_years=None):
+    statement = select(models.ArchivedYear.academic_year)
+    if academic_years is not None:
+        statement = statement.where(models.ArchivedYear.academic_year.in_(sorted(set(academic_years))))
+    return statement
+
+def get_archived_years(db: Session, academic_years=None) -> List[str]:
+    # Those of academic_years (all of them when None) that are archived, hence read-only
+    return sorted(db.scalars(_archived_years_statement(academic_years)))
+
+@native_async(get_archived_years)
+async def get_archived_years_async(db: AsyncSession, academic_years=None) -> List[str]:
+    return sorted(await db.scalars(_archived_years_statement(academic_years)))
 
+MARK_SOURCE_COLUMNS = ("student_id", "subject_id", "academic_year", "exam_type", "marks_obtained")
+
+def _marks_source(archived: List[str], academic_year: Optional[str] = None, name: Optional[str] = None):
+    # Where the marks being read are, given the archived years among them: the marks table,
+    # marks_history for an archived year, or with no year and some archived, both
+    history = models.MarkHistory.__table__
+    if not archived:
+        source = models.Mark.__table__
+    elif academic_year is not None:
+        source = history
+    else:
+        live = models.Mark.__table__
+        return union_all(
+            select(*(live.c[column] for column in MARK_SOURCE_COLUMNS)).where(live.c.academic_year.not_in(archived)),
+            select(*(history.c[column] for column in MARK_SOURCE_COLUMNS))
+        ).subquery(name or "all_marks")
+    return source if name is None else source.alias(name)
 
 def update_marks(db: Session, marks_updates: List[schemas.MarkUpdate], updated_by: int):
+    # Last write wins for duplicate keys within one batch
+    batch = {}
     for mark_update in marks_updates:
-        existing_mark = db.query(models.Mark).filter(
-            and_(
-                models.Mark.student_id == mark_update.student_id,
-                models.Mark.subject_id == mark_update.subject_id,
-                models.Mark.academic_year == mark_update.academic_year
-            )
-        ).first()
-        
-        if existing_mark:
-            existing_mark.marks_obtained = mark_update.marks_obtained
-            existing_mark.updated_by = updated_by
+        key = tuple(getattr(mark_update, column) for column in MARK_KEY)
+        batch[key] = mark_update.marks_obtained
+
+    existing = _current_marks(db, list(batch))
+
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    rows = []
+    for key, marks_obtained in batch.items():
+        if key not in existing:
+            counts['inserted'] += 1
+        elif _same_marks(existing[key], marks_obtained):
+            counts['unchanged'] += 1
+            continue
         else:
-            new_mark = models.Mark(
-                student_id=mark_update.student_id,
-                subject_id=mark_update.subject_id,
-                marks_obtained=mark_update.marks_obtained,
-                academic_year=mark_update.academic_year,
-                updated_by=updated_by
-            )
-            db.add(new_mark)
-    
+            counts['updated'] += 1
+        rows.append({**dict(zip(MARK_KEY, key)), 'marks_obtained': marks_obtained, 'updated_by': updated_by})
+
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        _mark_upsert(db, rows[start:start + UPSERT_CHUNK_SIZE])
+
+    if rows:
+        refresh_result_summaries(db, {(row['student_id'], row['academic_year']) for row in rows})
+        bump_data_version(db, MARKS_VERSION)
     db.commit()
+    return counts
+
+def _mark_conflicts(batch: dict, current: dict) -> list:
+    return [
+        {**dict(zip(MARK_KEY, key)), 'previous_marks': delta.previous_marks, 'current_marks': current.get(key)}
+        for key, delta in batch.items()
+        if not _same_marks(current.get(key), delta.previous_marks)
+    ]
+
+def _write_mark_deltas(db: Session, batch: dict, updates: List[dict], inserts: List[dict]) -> bool:
+    marks = models.Mark.__table__
+    if updates:
+        # Compare-and-set on the previous value, one executemany for the whole batch
+        result = db.execute(
+            update(marks).where(
+                *(marks.c[column] == bindparam(f"key_{column}") for column in MARK_KEY),
+                marks.c.marks_obtained == bindparam("previous_marks")
+            ).values(marks_obtained=bindparam("new_marks"), updated_by=bindparam("new_updated_by")),
+            [
+                {**{f"key_{column}": row[column] for column in MARK_KEY},
+                 'previous_marks': batch[tuple(row[column] for column in MARK_KEY)].previous_marks,
+                 'new_marks': row['marks_obtained'], 'new_updated_by': row['updated_by']}
+                for row in updates
+            ]
+        )
+        if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(updates):
+            return False
+    if inserts:
+        try:
+            db.execute(insert(marks), inserts)
+        except IntegrityError:
+            return False
     return True
 
-def get_student_results(db: Session, student_id: int):
-    marks = db.query(
-        models.Mark.marks_obtained,
+def apply_mark_deltas(db: Session, deltas: List[schemas.MarkDelta], updated_by: int):
+    # All-or-nothing: every delta must still see its previous value (None = no mark yet),
+    # otherwise nothing is written and the conflicting cells come back with their current value
+    batch = {}
+    for delta in deltas:
+        batch[tuple(getattr(delta, column) for column in MARK_KEY)] = delta
+
+    # FOR UPDATE locks the rows (and the gaps of missing keys) on MySQL until commit
+    conflicts = _mark_conflicts(batch, _current_marks(db, list(batch), for_update=True))
+    if conflicts:
+        db.rollback()
+        return {'updated': 0, 'inserted': 0, 'conflicts': conflicts}
+
+    updates, inserts = [], []
+    for key, delta in batch.items():
+        if _same_marks(delta.previous_marks, delta.marks_obtained):
+            continue
+        row = {**dict(zip(MARK_KEY, key)), 'marks_obtained': delta.marks_obtained, 'updated_by': updated_by}
+        (inserts if delta.previous_marks is None else updates).append(row)
+
+    if not _write_mark_deltas(db, batch, updates, inserts):
+        # Another writer got in between the read and the write
+        db.rollback()
+        return {'updated': 0, 'inserted': 0, 'conflicts': _mark_conflicts(batch, _current_marks(db, list(batch)))}
+
+    if updates or inserts:
+        refresh_result_summaries(db, {(row['student_id'], row['academic_year']) for row in updates + inserts})
+        bump_data_version(db, MARKS_VERSION)
+    db.commit()
+    return {'updated': len(updates), 'inserted': len(inserts), 'conflicts': []}
+
+def _student_marks_statement(student_id: int, academic_year: str, archived: bool):
+    return gradebook.cohort_statement([student_id], academic_year, archived).add_columns(
         models.Subject.subject_name,
-        models.Subject.subject_code,
-        models.Subject.credits,
-        models.Subject.max_marks,
-        models.Subject.passing_marks
-    ).join(models.Subject).filter(models.Mark.student_id == student_id).all()
-    
-    if not marks:
-        return None
-        
-    student = db.query(models.Student).filter(models.Student.student_id == student_id).first()
-    
-    # Convert marks to dictionaries
-    marks_dict = [dict(mark._mapping) for mark in marks]
-    
-    total_credits = sum(mark['credits'] for mark in marks_dict)
-    total_grade_points = sum(
-        (mark['marks_obtained'] / mark['max_marks'] * 10) * mark['credits'] 
-        for mark in marks_dict
+        models.Subject.subject_code
+    )
+
+def _student_summaries_statement(student_id: int, academic_year: str):
+    return select(Summary).where(
+        Summary.student_id == student_id, Summary.academic_year.in_((academic_year, OVERALL_YEAR))
     )
-    cgpa = total_grade_points / total_credits if total_credits > 0 else 0
-    passed = all(mark['marks_obtained'] >= mark['passing_marks'] for mark in marks_dict)
+
+def _student_statement(student_id: int):
+    return select(models.Student).where(models.Student.student_id == student_id)
+
+def _student_results(student, academic_year: str, marks, archived: bool, summaries: dict):
+    # One student's marks: small enough to compute wherever the rows were read
+    overall = summaries.get(OVERALL_YEAR)
+    # Same engine as the materialized summaries, so the numbers always agree
+    cohort = gradebook.cohort_from_rows(marks)
+    grade_points = gradebook.grade_points(cohort)
+    passed = gradebook.mark_passed(cohort)
+    _, year = gradebook.summarize(cohort)
+    
+    marks_dict = [
+        {
+            'marks_obtained': mark.marks_obtained,
+            'subject_name': mark.subject_name,
+            'subject_code': mark.subject_code,
+            'academic_year': mark.academic_year,
+            'credits': mark.credits,
+            'max_marks': mark.max_marks,
+            'passing_marks': mark.passing_marks,
+            'grade_point': round(float(grade_point), 2),
+            'passed': bool(mark_passed)
+        }
+        for mark, grade_point, mark_passed in zip(marks, grade_points, passed)
+    ]
     
     return {
         'student': student,  # This is an ORM instance, which FastAPI can serialize
-        'marks': marks_dict,  # Now these are dictionaries
-        'cgpa': round(cgpa, 2),
-        'total_credits': total_credits,
-        'passed': passed
+        'academic_year': academic_year,
+        'marks': marks_dict,
+        # An archived year keeps the summary stored when it was archived
+        'year_cgpa': float(summaries[academic_year].cgpa) if archived and academic_year in summaries
+                     else float(year.cgpa[0]) if marks else None,
+        'cgpa': float(overall.cgpa) if overall else 0.0,
+        'total_credits': overall.total_credits if overall else 0,
+        'passed': overall.passed if overall else True
     }
-def get_admin_summary(db: Session):
-    total_students = db.query(models.Student).count()
-    total_teachers = db.query(models.Teacher).count()
-    total_subjects = db.query(models.Subject).count()
-    
-    # Get pass/fail statistics
-    passed_students = 0
-    failed_students = 0
-    
-    students = db.query(models.Student).all()
-    for student in students:
-        result = get_student_results(db, student.student_id)
-        if result:
-            if result['passed']:
-                passed_students += 1
-            else:
-                failed_students += 1
-    
+
+@query_budget(4)
+def get_student_results(db: Session, student_id: int, academic_year: Optional[str] = None):
+    # Marks of one academic year (the current one by default), from marks_history once the
+    # year is archived; CGPA, credits and pass/fail across all years come from the summary
+    # row, which still covers archived years
+    academic_year = academic_year or settings.current_academic_year
+    marks, archived = [], False
+    for archived in (False, True):
+        marks = db.execute(_student_marks_statement(student_id, academic_year, archived)).all()
+        if marks:
+            break
+    summaries = {summary.academic_year: summary
+                 for summary in db.scalars(_student_summaries_statement(student_id, academic_year))}
+    if not marks and OVERALL_YEAR not in summaries:
+        return None
+    student = db.scalar(_student_statement(student_id))
+    return _student_results(student, academic_year, marks, archived, summaries)
+
+@native_async(get_student_results)
+@query_budget(4)
+async def get_student_results_async(db: AsyncSession, student_id: int, academic_year: Optional[str] = None):
+    academic_year = academic_year or settings.current_academic_year
+    marks, archived = [], False
+    for archived in (False, True):
+        marks = (await db.execute(_student_marks_statement(student_id, academic_year, archived))).all()
+        if marks:
+            break
+    summaries = {summary.academic_year: summary
+                 for summary in await db.scalars(_student_summaries_statement(student_id, academic_year))}
+    if not marks and OVERALL_YEAR not in summaries:
+        return None
+    student = await db.scalar(_student_statement(student_id))
+    return _student_results(student, academic_year, marks, archived, summaries)
+
+SUMMARY_BREAKDOWNS = ("department", "semester", "academic_year")
+
+def _pass_fail_counts(rows):
+    return {
+        'passed_students': sum(int(row.passed) for row in rows),
+        'failed_students': sum(int(row.failed) for row in rows)
+    }
+
+def _admin_counts_statement():
+    return select(
+        select(func.count(models.Student.student_id)).scalar_subquery().label('total_students'),
+        select(func.count(models.Teacher.teacher_id)).scalar_subquery().label('total_teachers'),
+        select(func.count(models.Subject.subject_id)).scalar_subquery().label('total_subjects')
+    )
+
+def _admin_pass_fail_statement(breakdowns: List[str]):
+    # Pass/fail comes from the materialized summaries: the OVERALL_YEAR rows for
+    # student-level counts, plus the per-year rows when academic_year is requested.
+    passed = func.sum(case((Summary.passed, 1), else_=0))
+    failed = func.sum(case((Summary.passed, 0), else_=1))
+
+    statement = select(
+        literal('student').label('level'),
+        models.Student.department,
+        models.Student.semester,
+        literal(None).label('academic_year'),
+        passed.label('passed'),
+        failed.label('failed')
+    ).select_from(Summary).join(models.Student).where(
+        Summary.academic_year == OVERALL_YEAR
+    ).group_by(models.Student.department, models.Student.semester)
+
+    if 'academic_year' in breakdowns:
+        statement = union_all(statement, select(
+            literal('year'),
+            literal(None),
+            literal(None),
+            Summary.academic_year,
+            passed,
+            failed
+        ).where(Summary.academic_year != OVERALL_YEAR).group_by(Summary.academic_year))
+    return statement
+
+def _admin_summary(counts, rows, breakdowns: List[str]):
+    student_rows = [row for row in rows if row.level == 'student']
+
+    summary = {
+        'total_students': counts.total_students,
+        'total_teachers': counts.total_teachers,
+        'total_subjects': counts.total_subjects,
+        **_pass_fail_counts(student_rows)
+    }
+
+    if breakdowns:
+        summary['breakdowns'] = {}
+        for breakdown in breakdowns:
+            level_rows = student_rows if breakdown != 'academic_year' else [row for row in rows if row.level == 'year']
+            groups = {}
+            for row in level_rows:
+                groups.setdefault(getattr(row, breakdown), []).append(row)
+            summary['breakdowns'][breakdown] = [
+                {breakdown: key, **_pass_fail_counts(group)} for key, group in groups.items()
+            ]
+
+    return summary
+
+@query_budget(2)
+def get_admin_summary(db: Session, breakdowns: Optional[List[str]] = None):
+    breakdowns = [b for b in SUMMARY_BREAKDOWNS if b in (breakdowns or [])]
+    counts = db.execute(_admin_counts_statement()).one()
+    rows = db.execute(_admin_pass_fail_statement(breakdowns)).all()
+    return _admin_summary(counts, rows, breakdowns)
+
+@native_async(get_admin_summary)
+@query_budget(2)
+async def get_admin_summary_async(db: AsyncSession, breakdowns: Optional[List[str]] = None):
+    breakdowns = [b for b in SUMMARY_BREAKDOWNS if b in (breakdowns or [])]
+    counts = (await db.execute(_admin_counts_statement())).one()
+    rows = (await db.execute(_admin_pass_fail_statement(breakdowns))).all()
+    return _admin_summary(counts, rows, breakdowns)
+
+DEFAULT_BUCKET_WIDTH = 10
+
+def _histogram_buckets(bucket_width: int):
+    # Percentage-of-max_marks ranges; the first and last buckets are open-ended
+    edges = list(range(0, 100, bucket_width))
+    return [(low, min(low + bucket_width, 100)) for low in edges]
+
+def _stats_row(row, buckets):
+    average = row.average
+    return {
+        'students': row.students,
+        'marks': row.marks,
+        'average': round(float(average), 2) if average is not None else None,
+        'min': row.lowest,
+        'max': row.highest,
+        'passed': row.passed or 0,
+        'pass_percentage': round((row.passed or 0) * 100 / row.marks, 1) if row.marks else None,
+        'histogram': [getattr(row, f'bucket_{i}') or 0 for i in range(len(buckets))]
+    }
+
+def _teacher_stats_statement(archived: List[str], teacher_id: int, academic_year: Optional[str],
+                             exam_type: Optional[str], buckets):
+    # Marks of the subjects this teacher taught in that same academic year. Joining the distinct
+    # (subject, year) pairs drives the query from the teacher's assignments, and a duplicated
+    # assignment row can't double-count.
+    source = _marks_source(archived, academic_year)
+    mark = source.c
+    taught = select(models.TeacherSubject.subject_id, models.TeacherSubject.academic_year).where(
+        models.TeacherSubject.teacher_id == teacher_id
+    ).distinct().subquery()
+    scope = and_(taught.c.subject_id == mark.subject_id,
+                 taught.c.academic_year == mark.academic_year)
+    conditions = []
+    if academic_year is not None:
+        conditions.append(mark.academic_year == academic_year)
+    if exam_type is not None:
+        conditions.append(mark.exam_type == exam_type)
+
+    percent = mark.marks_obtained * 100 / models.Subject.max_marks
+    bucket_columns = []
+    for i, (low, high) in enumerate(buckets):
+        if i == 0:
+            in_bucket = percent < high
+        elif i == len(buckets) - 1:
+            in_bucket = percent >= low
+        else:
+            in_bucket = (percent >= low) & (percent < high)
+        bucket_columns.append(func.sum(case((in_bucket, 1), else_=0)).label(f'bucket_{i}'))
+    aggregates = [
+        func.count(func.distinct(mark.student_id)).label('students'),
+        func.count(func.distinct(mark.subject_id)).label('subjects'),
+        func.count().label('marks'),
+        func.avg(mark.marks_obtained).label('average'),
+        func.min(mark.marks_obtained).label('lowest'),
+        func.max(mark.marks_obtained).label('highest'),
+        func.sum(case((mark.marks_obtained >= models.Subject.passing_marks, 1), else_=0)).label('passed'),
+        *bucket_columns
+    ]
+
+    # Per subject and year, plus one overall row (level 'total'), in a single statement
+    subject_columns = (mark.subject_id, mark.academic_year, models.Subject.subject_code,
+                       models.Subject.subject_name, models.Subject.max_marks, models.Subject.passing_marks)
+    of_subject = models.Subject.subject_id == mark.subject_id
+    per_subject = select(literal('subject').label('level'), *subject_columns, *aggregates).select_from(
+        taught
+    ).join(source, scope).join(models.Subject, of_subject).where(*conditions).group_by(*subject_columns)
+    overall = select(
+        literal('total'), *(literal(None) for _ in subject_columns), *aggregates
+    ).select_from(taught).join(source, scope).join(models.Subject, of_subject).where(*conditions)
+    return union_all(per_subject, overall)
+
+def _teacher_stats(rows, bucket_width: int, buckets):
+    total = next(row for row in rows if row.level == 'total')
+    subjects = sorted(
+        (row for row in rows if row.level == 'subject'),
+        key=lambda row: (row.academic_year, row.subject_code)
+    )
     return {
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_subjects': total_subjects,
-        'passed_students': passed_students,
-        'failed_students': failed_students
+        'bucket_width': bucket_width,
+        'buckets': [f"{low}-{high}" for low, high in buckets],
+        'totals': {'subjects': total.subjects, **_stats_row(total, buckets)},
+        'subjects': [
+            {
+                'subject_id': row.subject_id,
+                'subject_code': row.subject_code,
+                'subject_name': row.subject_name,
+                'academic_year': row.academic_year,
+                'max_marks': row.max_marks,
+                'passing_marks': row.passing_marks,
+                **_stats_row(row, buckets)
+            }
+            for row in subjects
+        ]
     }
+
+@query_budget(2)
+def get_teacher_stats(db: Session, teacher_id: int, academic_year: Optional[str] = None,
+                      exam_type: Optional[str] = None, bucket_width: int = DEFAULT_BUCKET_WIDTH):
+    archived = get_archived_years(db, None if academic_year is None else [academic_year])
+    buckets = _histogram_buckets(bucket_width)
+    statement = _teacher_stats_statement(archived, teacher_id, academic_year, exam_type, buckets)
+    return _teacher_stats(db.execute(statement).all(), bucket_width, buckets)
+
+@native_async(get_teacher_stats)
+@query_budget(2)
+async def get_teacher_stats_async(db: AsyncSession, teacher_id: int, academic_year: Optional[str] = None,
+                                  exam_type: Optional[str] = None, bucket_width: int = DEFAULT_BUCKET_WIDTH):
+    archived = await get_archived_years_async(db, None if academic_year is None else [academic_year])
+    buckets = _histogram_buckets(bucket_width)
+    statement = _teacher_stats_statement(archived, teacher_id, academic_year, exam_type, buckets)
+    return _teacher_stats((await db.execute(statement)).all(), bucket_width, buckets)
+
+def _standing(row):
+    # PERCENT_RANK is 0 at the top; report the share of the cohort ranked below instead
+    standing = dict(row)
+    standing['percentile'] = round((1 - standing.pop('percent_rank')) * 100, 1)
+    return standing
+
+def _ranked(statement, order, partition):
+    # RANK, PERCENT_RANK and the cohort size over the same window, in one pass
+    return statement.add_columns(
+        func.rank().over(partition_by=partition, order_by=order).label('rank'),
+        func.percent_rank().over(partition_by=partition, order_by=order).label('percent_rank'),
+        func.count().over(partition_by=partition).label('cohort_size')
+    )
+
+def _class_rankings_statement(academic_year: Optional[str], department: Optional[str], semester: Optional[int],
+                              top: Optional[int], student_id: Optional[int]):
+    # CGPA rank within department and semester, for one academic year or OVERALL_YEAR.
+    # Department/semester filters are safe inside the window because they are its partition.
+    if student_id is not None:
+        own = aliased(models.Student)
+        department = select(own.department).where(own.student_id == student_id).scalar_subquery()
+        semester = select(own.semester).where(own.student_id == student_id).scalar_subquery()
+    ranked = _ranked(
+        select(
+            Summary.student_id,
+            models.Student.roll_number,
+            models.Student.full_name.label('student_name'),
+            models.Student.department,
+            models.Student.semester,
+            Summary.academic_year,
+            Summary.cgpa,
+            Summary.passed
+        ).join(models.Student).where(Summary.academic_year == (academic_year or OVERALL_YEAR)),
+        Summary.cgpa.desc(),
+        (models.Student.department, models.Student.semester)
+    )
+    if department is not None:
+        ranked = ranked.where(models.Student.department == department)
+    if semester is not None:
+        ranked = ranked.where(models.Student.semester == semester)
+    ranked = ranked.subquery()
+
+    # Row filters go outside, so they don't shrink the cohort being ranked
+    statement = select(ranked).order_by(ranked.c.department, ranked.c.semester, ranked.c.rank, ranked.c.student_id)
+    if top is not None:
+        statement = statement.where(ranked.c.rank <= top)
+    if student_id is not None:
+        statement = statement.where(ranked.c.student_id == student_id)
+    return statement
+
+@query_budget(1)
+def get_class_rankings(db: Session, academic_year: Optional[str] = None, department: Optional[str] = None,
+                       semester: Optional[int] = None, top: Optional[int] = None,
+                       student_id: Optional[int] = None):
+    statement = _class_rankings_statement(academic_year, department, semester, top, student_id)
+    return [_standing(row) for row in db.execute(statement).mappings()]
+
+@native_async(get_class_rankings)
+@query_budget(1)
+async def get_class_rankings_async(db: AsyncSession, academic_year: Optional[str] = None,
+                                   department: Optional[str] = None, semester: Optional[int] = None,
+                                   top: Optional[int] = None, student_id: Optional[int] = None):
+    statement = _class_rankings_statement(academic_year, department, semester, top, student_id)
+    return [_standing(row) for row in (await db.execute(statement)).mappings()]
+
+def _subject_percentiles_statement(archived: List[str], subject_id: Optional[int], academic_year: Optional[str],
+                                   exam_type: Optional[str], top: Optional[int], student_id: Optional[int]):
+    # Rank and percentile of each mark among everyone who sat the same subject, year and exam
+    source = _marks_source(archived, academic_year)
+    mark = source.c
+    ranked = select(
+        mark.student_id,
+        models.Student.roll_number,
+        models.Student.full_name.label('student_name'),
+        mark.subject_id,
+        models.Subject.subject_code,
+        models.Subject.subject_name,
+        mark.academic_year,
+        mark.exam_type,
+        mark.marks_obtained
+    ).select_from(source).join(models.Student, models.Student.student_id == mark.student_id).join(
+        models.Subject, models.Subject.subject_id == mark.subject_id
+    )
+    ranked = _ranked(
+        ranked,
+        mark.marks_obtained.desc(),
+        (mark.subject_id, mark.academic_year, mark.exam_type)
+    )
+    if subject_id is not None:
+        ranked = ranked.where(mark.subject_id == subject_id)
+    if academic_year is not None:
+        ranked = ranked.where(mark.academic_year == academic_year)
+    if exam_type is not None:
+        ranked = ranked.where(mark.exam_type == exam_type)
+    if student_id is not None:
+        # Only the cohorts this student belongs to need ranking
+        own = _marks_source(archived, academic_year, "own").c
+        ranked = ranked.where(tuple_(mark.subject_id, mark.academic_year, mark.exam_type).in_(
+            select(own.subject_id, own.academic_year, own.exam_type).where(own.student_id == student_id)
+        ))
+    ranked = ranked.subquery()
+
+    statement = select(ranked).order_by(
+        ranked.c.academic_year, ranked.c.subject_code, ranked.c.exam_type, ranked.c.rank, ranked.c.student_id
+    )
+    if top is not None:
+        statement = statement.where(ranked.c.rank <= top)
+    if student_id is not None:
+        statement = statement.where(ranked.c.student_id == student_id)
+    return statement
+
+@query_budget(2)
+def get_subject_percentiles(db: Session, subject_id: Optional[int] = None, academic_year: Optional[str] = None,
+                            exam_type: Optional[str] = None, top: Optional[int] = None,
+                            student_id: Optional[int] = None):
+    archived = get_archived_years(db, None if academic_year is None else [academic_year])
+    statement = _subject_percentiles_statement(archived, subject_id, academic_year, exam_type, top, student_id)
+    return [_standing(row) for row in db.execute(statement).mappings()]
+
+@native_async(get_subject_percentiles)
+@query_budget(2)
+async def get_subject_percentiles_async(db: AsyncSession, subject_id: Optional[int] = None,
+                                        academic_year: Optional[str] = None, exam_type: Optional[str] = None,
+                                        top: Optional[int] = None, student_id: Optional[int] = None):
+    archived = await get_archived_years_async(db, None if academic_year is None else [academic_year])
+    statement = _subject_percentiles_statement(archived, subject_id, academic_year, exam_type, top, student_id)
+    return [_standing(row) for row in (await db.execute(statement)).mappings()]
+
+MARKS_EXPORT_COLUMNS = [
+    'mark_id', 'student_id', 'roll_number', 'student_name', 'department', 'semester',
+    'subject_id', 'subject_code', 'subject_name', 'academic_year', 'exam_type',
+    'marks_obtained', 'max_marks', 'passing_marks', 'credits', 'updated_at'
+]
+
+RESULTS_EXPORT_COLUMNS = [
+    'student_id', 'roll_number', 'student_name', 'department', 'semester', 'academic_year',
+    'subjects_count', 'total_credits', 'failed_subjects', 'cgpa', 'passed'
+]
+
+def _stream_mappings(db: Session, statement, batch_size: int = 1000):
+    # Server-side cursor: rows are fetched batch_size at a time, never all at once
+    result = db.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    for row in result.mappings():
+        yield dict(row)
+
+def marks_export_key(archived: bool = False):
+    # marks_history has no mark_id: its rows are keyed by year, student, subject and exam
+    if archived:
+        history = models.MarkHistory
+        return (history.academic_year, history.student_id, history.subject_id, history.exam_type)
+    return (models.Mark.mark_id,)
+
+def marks_export_statement(academic_year: Optional[str] = None, department: Optional[str] = None,
+                           semester: Optional[int] = None, updated_since: Optional[datetime] = None,
+                           archived: bool = False):
+    # archived=True reads marks_history, where mark_id is empty
+    source = models.MarkHistory if archived else models.Mark
+    statement = select(
+        null().label('mark_id') if archived else models.Mark.mark_id,
+        source.student_id,
+        models.Student.roll_number,
+        models.Student.full_name.label('student_name'),
+        models.Student.department,
+        models.Student.semester,
+        source.subject_id,
+        models.Subject.subject_code,
+        models.Subject.subject_name,
+        source.academic_year,
+        source.exam_type,
+        source.marks_obtained,
+        models.Subject.max_marks,
+        models.Subject.passing_marks,
+        models.Subject.credits,
+        source.updated_at
+    ).select_from(source).join(models.Student, models.Student.student_id == source.student_id).join(
+        models.Subject, models.Subject.subject_id == source.subject_id
+    ).order_by(*marks_export_key(archived))
+    if academic_year is not None:
+        statement = statement.where(source.academic_year == academic_year)
+    if department is not None:
+        statement = statement.where(models.Student.department == department)
+    if semester is not None:
+        statement = statement.where(models.Student.semester == semester)
+    if updated_since is not None:
+        statement = statement.where(source.updated_at >= updated_since)
+    return statement
+
+def marks_export_parts(db: Session, academic_year: Optional[str] = None, department: Optional[str] = None,
+                       semester: Optional[int] = None):
+    # [(statement, order key)]: live marks, then those of archived years from marks_history
+    archived = get_archived_years(db, None if academic_year is None else [academic_year])
+    parts = []
+    if academic_year is None or not archived:
+        live = marks_export_statement(academic_year, department, semester)
+        if archived:
+            live = live.where(models.Mark.academic_year.not_in(archived))
+        parts.append((live, marks_export_key()))
+    if archived:
+        parts.append((marks_export_statement(academic_year, department, semester, archived=True),
+                      marks_export_key(archived=True)))
+    return parts
+
+def iter_marks_export(db: Session, academic_year: Optional[str] = None,
+                      department: Optional[str] = None, semester: Optional[int] = None):
+    for statement, _ in marks_export_parts(db, academic_year, department, semester):
+        yield from _stream_mappings(db, statement)
+
+def results_export_statement(academic_year: Optional[str] = None, department: Optional[str] = None,
+                             semester: Optional[int] = None):
+    statement = select(
+        Summary.student_id,
+        models.Student.roll_number,
+        models.Student.full_name.label('student_name'),
+        models.Student.department,
+        models.Student.semester,
+        Summary.academic_year,
+        Summary.subjects_count,
+        Summary.total_credits,
+        Summary.failed_subjects,
+        Summary.cgpa,
+        Summary.passed
+    ).join(models.Student).where(
+        Summary.academic_year == (academic_year or OVERALL_YEAR)
+    ).order_by(Summary.student_id)
+    if department is not None:
+        statement = statement.where(models.Student.department == department)
+    if semester is not None:
+        statement = statement.where(models.Student.semester == semester)
+    return statement
+
+def iter_results_export(db: Session, academic_year: Optional[str] = None,
+                        department: Optional[str] = None, semester: Optional[int] = None):
+    return _stream_mappings(db, results_export_statement(academic_year, department, semester))
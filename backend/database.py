@@ -1,16 +1,125 @@
+from itertools import count
+from typing import Union
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from backend import query_budget, replicas
+from backend.pool_metrics import PoolMonitor, monitored_pool_class
 from config import settings
 
-engine = create_engine(settings.database_url)
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg"
+}
+
+def to_async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def pool_options(url, base_pool, monitor: PoolMonitor) -> dict:
+    # In-memory SQLite keeps its single-connection pool; everything else gets a sized QueuePool
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": monitored_pool_class(base_pool, monitor),
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_timeout": settings.db_pool_timeout
+    }
+
+pool_monitors = {"primary": PoolMonitor("primary")}
+engine = create_engine(settings.database_url, **pool_options(settings.database_url, QueuePool, pool_monitors["primary"]))
+pool_monitors["primary"].attach(engine)
+query_budget.install(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _monitored_engine(create, url, base_pool, name):
+    pool_monitors[name] = PoolMonitor(name)
+    replica = create(url, **pool_options(url, base_pool, pool_monitors[name]))
+    pool_monitors[name].attach(replica)
+    query_budget.install(replica)
+    return replica
+
+replica_engines = [
+    _monitored_engine(create_engine, url, QueuePool, f"replica{index}")
+    for index, url in enumerate(settings.replica_urls, 1)
+]
+ReplicaSessions = [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines]
+
+async_engine = None
+AsyncSessionLocal = None
+async_replica_engines = []
+AsyncReplicaSessions = []
+if settings.async_db:
+    async_url = settings.async_database_url or to_async_url(settings.database_url)
+    pool_monitors["async"] = PoolMonitor("async")
+    async_engine = create_async_engine(async_url, **pool_options(async_url, AsyncAdaptedQueuePool, pool_monitors["async"]))
+    pool_monitors["async"].attach(async_engine)
+    query_budget.install(async_engine)
+    # Objects are serialized after the session closes, outside the greenlet, so never expire them
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    async_replica_engines = [
+        _monitored_engine(create_async_engine, to_async_url(url), AsyncAdaptedQueuePool, f"async_replica{index}")
+        for index, url in enumerate(settings.replica_urls, 1)
+    ]
+    AsyncReplicaSessions = [
+        async_sessionmaker(replica, autoflush=False, expire_on_commit=False) for replica in async_replica_engines
+    ]
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+AnySession = Union[Session, AsyncSession]
+
+_replica_turn = count()
+
+def session_factory(request: Request, primary, replica_sessions):
+    # Round robin over the replicas for reads; the primary for writes and sticky clients
+    if replica_sessions and replicas.reads_from_replica(request):
+        return replica_sessions[next(_replica_turn) % len(replica_sessions)]
+    return primary
+
+def get_db(request: Request):
+    db = session_factory(request, SessionLocal, ReplicaSessions)()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request):
+    async with session_factory(request, AsyncSessionLocal, AsyncReplicaSessions)() as db:
+        yield db
+
+def read_session() -> Session:
+    # For batch jobs that only read (snapshots): the first replica when there is one
+    return (ReplicaSessions[0] if ReplicaSessions else SessionLocal)()
+
+# Request-scoped session used by the API routes
+get_session = get_async_db if settings.async_db else get_db
+
+def native_async(sync_fn):
+    # Registers an AsyncSession version of a sync crud function, which run_db awaits instead
+    def register(async_fn):
+        sync_fn.native_async = async_fn
+        return async_fn
+    return register
+
+async def run_db(db: AnySession, fn, *args, **kwargs):
+    # crud functions are written against a sync Session and run in the threadpool. On an
+    # AsyncSession, those with a native_async version await the async driver directly; the
+    # rest go through run_sync, which waits on the driver without blocking but runs their
+    # Python (ORM loading, result shaping) on the event loop thread.
+    if isinstance(db, AsyncSession):
+        native = getattr(fn, "native_async", None)
+        if native is not None:
+            return await native(db, *args, **kwargs)
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
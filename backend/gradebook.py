@@ -0,0 +1,141 @@
+from operator import itemgetter
+from typing import NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import Float, select, type_coerce
+from sqlalchemy.orm import Session
+
+from backend import models
+
+GRADE_POINT_SCALE = 10
+
+class Cohort(NamedTuple):
+    # One entry per mark, held column by column
+    student_id: np.ndarray
+    academic_year: np.ndarray
+    subject_id: np.ndarray
+    marks: np.ndarray
+    max_marks: np.ndarray
+    passing_marks: np.ndarray
+    credits: np.ndarray
+
+def cohort_columns(source=models.Mark):
+    # source: Mark, or MarkHistory for archived years (same column names)
+    return (
+        source.student_id,
+        source.academic_year,
+        source.subject_id,
+        # Read as float: the arrays are float64 anyway, and skipping Decimal conversion halves load time
+        type_coerce(source.marks_obtained, Float).label('marks_obtained'),
+        models.Subject.max_marks,
+        models.Subject.passing_marks,
+        models.Subject.credits
+    )
+COHORT_DTYPES = (np.int64, object, np.int64, np.float64, np.float64, np.float64, np.float64)
+
+def cohort_from_rows(rows) -> Cohort:
+    # Straight into typed arrays one column at a time; transposing with zip(*rows) builds a
+    # tuple per column of boxed values and is slower than the arithmetic that follows
+    return Cohort(*(
+        np.fromiter(map(itemgetter(index), rows), dtype=dtype, count=len(rows))
+        for index, dtype in enumerate(COHORT_DTYPES)
+    ))
+
+def cohort_statement(student_ids=None, academic_year: Optional[str] = None, archived: bool = False):
+    # Live marks leave out archived years: their summaries are kept as archived, and rows still
+    # in marks while a year is being archived must not be summarized a second time.
+    # archived=True reads marks_history instead.
+    source = models.MarkHistory if archived else models.Mark
+    statement = select(*cohort_columns(source)).join(models.Subject, models.Subject.subject_id == source.subject_id)
+    if not archived:
+        statement = statement.where(source.academic_year.not_in(select(models.ArchivedYear.academic_year)))
+    if student_ids is not None:
+        statement = statement.where(source.student_id.in_(student_ids))
+    if academic_year is not None:
+        statement = statement.where(source.academic_year == academic_year)
+    return statement
+
+def load_cohort(db: Session, student_ids=None, academic_year: Optional[str] = None, archived: bool = False) -> Cohort:
+    return cohort_from_rows(db.execute(cohort_statement(student_ids, academic_year, archived)).all())
+
+def grade_points(cohort: Cohort) -> np.ndarray:
+    return cohort.marks / cohort.max_marks * GRADE_POINT_SCALE
+
+def mark_passed(cohort: Cohort) -> np.ndarray:
+    return cohort.marks >= cohort.passing_marks
+
+SUMMARY_FIELDS = ('student_id', 'academic_year', 'subjects_count', 'total_credits', 'grade_points',
+                  'failed_subjects', 'cgpa', 'passed')
+
+class Totals(NamedTuple):
+    # One entry per group (a student, or a student and academic year)
+    student_id: np.ndarray
+    academic_year: Optional[np.ndarray]
+    subjects_count: np.ndarray
+    total_credits: np.ndarray
+    grade_points: np.ndarray
+    failed_subjects: np.ndarray
+    cgpa: np.ndarray
+    passed: np.ndarray
+
+    def rows(self, academic_year: Optional[str] = None):
+        years = self.academic_year if self.academic_year is not None else [academic_year] * len(self.student_id)
+        # tolist() hands back plain Python numbers, which every DBAPI driver accepts
+        columns = zip(
+            self.student_id.tolist(), list(years), self.subjects_count.tolist(), self.total_credits.tolist(),
+            round_half_up(self.grade_points, 4).tolist(), self.failed_subjects.tolist(), self.cgpa.tolist(),
+            self.passed.tolist()
+        )
+        return [dict(zip(SUMMARY_FIELDS, values)) for values in columns]
+
+def round_half_up(values: np.ndarray, digits: int) -> np.ndarray:
+    # Like SQL ROUND on DECIMAL: 6.765 becomes 6.77, where np.round would give the binary
+    # float's 6.76. The epsilon absorbs representation error below the last digit.
+    scale = 10 ** digits
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5 + 1e-9) / scale
+
+def cgpa(weighted_points: np.ndarray, credits: np.ndarray) -> np.ndarray:
+    safe = np.where(credits > 0, credits, 1)
+    return np.where(credits > 0, round_half_up(weighted_points / safe, 2), 0.0)
+
+def _encode(labels: np.ndarray):
+    # Only a handful of distinct years: a dict lookup per mark is much cheaper than
+    # np.unique sorting Python strings
+    distinct = sorted(set(labels.tolist()))
+    codes = {label: code for code, label in enumerate(distinct)}
+    return np.array(distinct, dtype=object), np.fromiter(map(codes.__getitem__, labels), dtype=np.int64, count=len(labels))
+
+def _group_totals(groups: np.ndarray, cohort: Cohort, weighted: np.ndarray, failed: np.ndarray):
+    keys, inverse = np.unique(groups, return_inverse=True)
+    size = len(keys)
+    subjects_count = np.bincount(inverse, minlength=size)
+    total_credits = np.bincount(inverse, weights=cohort.credits, minlength=size)
+    points = np.bincount(inverse, weights=weighted, minlength=size)
+    failed_subjects = np.bincount(inverse, weights=failed, minlength=size)
+    return keys, subjects_count, total_credits, points, failed_subjects
+
+def summarize(cohort: Cohort):
+    # Per (student, academic year) and per student, in one pass over the cohort:
+    # bincount sums the weighted grade points, credits and failures of every group at once.
+    weighted = grade_points(cohort) * cohort.credits
+    failed = (~mark_passed(cohort)).astype(np.float64)
+
+    years, year_codes = _encode(cohort.academic_year)
+    year_count = max(len(years), 1)
+    keys, subjects_count, total_credits, points, failed_subjects = _group_totals(
+        cohort.student_id * year_count + year_codes, cohort, weighted, failed
+    )
+    per_year = Totals(
+        keys // year_count, years[keys % year_count] if len(years) else np.array([], dtype=object),
+        subjects_count, total_credits.astype(np.int64), points, failed_subjects.astype(np.int64),
+        cgpa(points, total_credits), failed_subjects == 0
+    )
+
+    keys, subjects_count, total_credits, points, failed_subjects = _group_totals(
+        cohort.student_id, cohort, weighted, failed
+    )
+    overall = Totals(
+        keys, None, subjects_count, total_credits.astype(np.int64), points, failed_subjects.astype(np.int64),
+        cgpa(points, total_credits), failed_subjects == 0
+    )
+    return per_year, overall
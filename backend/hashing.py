@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from backend.auth import pwd_context
+from config import settings
+
+# These run inside the worker processes, which build their own pwd_context on import
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _hash_batch(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+class PasswordHasher:
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        # pending is only touched on the event loop thread, so no lock is needed
+        if self.pending >= self.queue_limit:
+            raise HTTPException(
+                status_code=503,
+                detail="Password service is busy, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        # Bulk imports: one large job per worker instead of one job per password
+        if not passwords:
+            return []
+        size = -(-len(passwords) // self.workers)
+        batches = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        results = await asyncio.gather(*(self._submit(_hash_batch, batch) for batch in batches))
+        return [password_hash for batch in results for password_hash in batch]
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        # Returns (verified, new_hash); new_hash is set when the stored scheme or cost is outdated
+        try:
+            return await self._submit(_verify_and_update, password, hashed_password)
+        except ValueError:
+            # Unknown or malformed stored hash
+            return False, None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(settings.hash_workers, settings.hash_queue_limit)
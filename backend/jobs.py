@@ -0,0 +1,312 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse
+from sqlalchemy import and_, func, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from backend import crud, export, models, schemas
+from backend.database import SessionLocal, engine, read_session
+from backend.summaries import Summary
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 5000
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes
+Job = models.ReportJob
+
+class Progress:
+    # Rows written so far, saved on the job row at most every PROGRESS_INTERVAL seconds
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.rows = 0
+        self._saved_at = time.monotonic()
+
+    def add(self, rows: int):
+        self.rows += rows
+        if time.monotonic() - self._saved_at >= PROGRESS_INTERVAL:
+            _update(self.job_id, rows_done=self.rows)
+            self._saved_at = time.monotonic()
+
+def _json(value) -> Iterator[bytes]:
+    yield json.dumps(jsonable_encoder(value)).encode()
+
+def _summary(db: Session, params: dict, progress: Progress):
+    return _json(crud.get_admin_summary(db, params["breakdown"])), None
+
+def _rankings(db: Session, params: dict, progress: Progress):
+    rows = crud.get_class_rankings(db, params["academic_year"], params["department"], params["semester"],
+                                   params["top"])
+    progress.add(len(rows))
+    return _json([schemas.ClassRank.model_validate(row) for row in rows]), len(rows)
+
+def _pages(db: Session, statement, key, progress: Progress) -> Iterator[dict]:
+    # Keyset pages on the statement's order key (a tuple of columns) rather than one long
+    # cursor: between pages the read holds nothing open, so progress writes (and on SQLite,
+    # every other writer) aren't held up for the length of the export
+    last = None
+    while True:
+        if last is None:
+            page = statement
+        elif len(key) == 1:
+            page = statement.where(key[0] > last[0])
+        else:
+            page = statement.where(tuple_(*key) > tuple_(*last))
+        rows = db.execute(page.limit(PAGE_SIZE)).mappings().all()
+        for row in rows:
+            yield dict(row)
+        progress.add(len(rows))
+        if len(rows) < PAGE_SIZE:
+            return
+        last = tuple(rows[-1][column.key] for column in key)
+
+def _results_parts(db: Session, *filters):
+    return [(crud.results_export_statement(*filters), (Summary.student_id,))]
+
+def _export(columns: List[str], parts_for: Callable):
+    # parts_for(db, academic_year, department, semester) -> [(statement, order key)], read in turn
+    def write(db: Session, params: dict, progress: Progress):
+        parts = parts_for(db, params["academic_year"], params["department"], params["semester"])
+        total = sum(db.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+                    for statement, _ in parts)
+        rows = itertools.chain.from_iterable(_pages(db, statement, key, progress) for statement, key in parts)
+        chunks = export.encode_csv(columns, rows) if params["format"] == "csv" else export.encode_ndjson(rows)
+        return (export.gzip_chunks(chunks) if params["gzip"] else chunks), total
+    return write
+
+class Report(NamedTuple):
+    params: Tuple[str, ...]  # the schemas.JobCreate fields it takes
+    versions: Tuple[str, ...]  # data versions its result depends on
+    # (db, params, progress) -> (chunks of the result, total rows if known up front)
+    write: Callable
+
+EXPORT_PARAMS = ("format", "academic_year", "department", "semester", "gzip")
+
+REPORTS = {
+    # Counts teachers and subjects too, so a catalog change also makes it stale
+    "summary": Report(("breakdown",), (crud.MARKS_VERSION, crud.CATALOG_VERSION), _summary),
+    "rankings": Report(("academic_year", "department", "semester", "top"), (crud.MARKS_VERSION,), _rankings),
+    "marks_export": Report(EXPORT_PARAMS, (crud.MARKS_VERSION,),
+                           _export(crud.MARKS_EXPORT_COLUMNS, crud.marks_export_parts)),
+    "results_export": Report(EXPORT_PARAMS, (crud.MARKS_VERSION,),
+                             _export(crud.RESULTS_EXPORT_COLUMNS, _results_parts)),
+}
+
+def current_versions(db: Session) -> dict:
+    return dict(db.execute(select(models.DataVersion.name, models.DataVersion.version)).all())
+
+def data_version(kind: str, versions: dict) -> str:
+    return ",".join(f"{name}:{versions.get(name, 0)}" for name in REPORTS[kind].versions)
+
+def describe(job: Job, versions: dict) -> dict:
+    progress = None
+    if job.status == "done":
+        progress = 1.0
+    elif job.rows_total:
+        progress = round(min(job.rows_done / job.rows_total, 1.0), 4)
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "params": json.loads(job.params),
+        "status": job.status,
+        "rows_done": job.rows_done or 0,
+        "rows_total": job.rows_total,
+        "progress": progress,
+        "stale": job.status == "done" and job.data_version != data_version(job.kind, versions),
+        "result_bytes": job.result_bytes,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+def enqueue(db: Session, request: schemas.JobCreate, requested_by: int) -> Tuple[dict, bool]:
+    # -> (job, whether it is new). A queued job, or a running or finished one computed from
+    # the current data, is reused instead of running the same report again.
+    params = {name: getattr(request, name) for name in REPORTS[request.kind].params}
+    if "breakdown" in params:
+        params["breakdown"] = sorted(set(params["breakdown"]))
+    params = json.dumps(params, sort_keys=True)
+    versions = current_versions(db)
+    if not request.refresh:
+        job = db.scalars(
+            select(Job).where(
+                Job.kind == request.kind,
+                Job.params == params,
+                or_(Job.status == "queued",
+                    and_(Job.status.in_(("running", "done")), Job.data_version == data_version(request.kind, versions)))
+            ).order_by(Job.job_id.desc()).limit(1)
+        ).first()
+        if job is not None:
+            return describe(job, versions), False
+    job = Job(kind=request.kind, params=params, status="queued", requested_by=requested_by)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return describe(job, versions), True
+
+def get_job(db: Session, job_id: int) -> Optional[Job]:
+    return db.get(Job, job_id)
+
+def job_status(db: Session, job_id: int) -> Optional[dict]:
+    job = db.get(Job, job_id)
+    return None if job is None else describe(job, current_versions(db))
+
+def list_jobs(db: Session, limit: int = 20) -> List[dict]:
+    jobs = db.scalars(select(Job).order_by(Job.job_id.desc()).limit(limit)).all()
+    versions = current_versions(db)
+    return [describe(job, versions) for job in jobs]
+
+def result_response(job: Job) -> FileResponse:
+    # Sent like the synchronous endpoints send the same report
+    params = json.loads(job.params)
+    if job.kind in ("summary", "rankings"):
+        return FileResponse(job.result_path, media_type="application/json", filename=f"{job.kind}.json")
+    name = job.kind.removesuffix("_export")
+    headers = {"Content-Encoding": "gzip"} if params["gzip"] else None
+    return FileResponse(job.result_path, media_type=export.MEDIA_TYPES[params["format"]],
+                        filename=f"{name}.{params['format']}", headers=headers)
+
+def _update(job_id: int, *conditions, **values) -> int:
+    # Job state always goes to the primary, on its own short transaction
+    with SessionLocal() as db:
+        result = db.execute(update(Job).where(Job.job_id == job_id, *conditions).values(**values))
+        db.commit()
+        return result.rowcount
+
+def _result_path(job_id: int, params: dict) -> Path:
+    extension = params.get("format", "json") + (".gz" if params.get("gzip") else "")
+    return Path(settings.job_result_dir) / f"{job_id}.{extension}"
+
+def _write_file(path: Path, chunks) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    try:
+        with open(temporary, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+    return path.stat().st_size
+
+def _expire_older(job: Job):
+    # A newer result replaces the earlier ones of the same report
+    with SessionLocal() as db:
+        older = db.scalars(select(Job).where(
+            Job.kind == job.kind, Job.params == job.params, Job.status == "done", Job.job_id < job.job_id
+        )).all()
+        for previous in older:
+            Path(previous.result_path).unlink(missing_ok=True)
+            previous.status, previous.result_path = "expired", None
+        db.commit()
+
+def run_job(job_id: int):
+    # Only one worker gets past the claim, however many processes were handed the job
+    if not _update(job_id, Job.status == "queued", status="running", started_at=func.now(), rows_done=0):
+        return
+    try:
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+        params = json.loads(job.params)
+        progress = Progress(job_id)
+        # Reads the data (and the versions it is labelled with) off a replica when there is one
+        with read_session() as db:
+            version = data_version(job.kind, current_versions(db))
+            chunks, total = REPORTS[job.kind].write(db, params, progress)
+            _update(job_id, data_version=version, rows_total=total)
+            path = _result_path(job_id, params)
+            size = _write_file(path, chunks)
+        _update(job_id, status="done", rows_done=progress.rows, result_path=str(path), result_bytes=size,
+                finished_at=func.now())
+        _expire_older(job)
+    except Exception as error:
+        logger.exception("Report job %s failed", job_id)
+        _update(job_id, status="failed", error=str(error)[:2000], finished_at=func.now())
+
+def runnable_jobs(db: Session) -> List[int]:
+    # Queued jobs, after putting back running ones whose process died (no progress for
+    # JOB_STALE_SECONDS). The cutoff uses the database clock, which wrote updated_at.
+    cutoff = db.scalar(select(func.now())) - timedelta(seconds=settings.job_stale_seconds)
+    requeued = db.execute(
+        update(Job).where(Job.status == "running", Job.updated_at < cutoff).values(status="queued")
+    ).rowcount
+    db.commit()
+    if requeued:
+        logger.warning("Requeued %s report jobs without progress for %ss", requeued, settings.job_stale_seconds)
+    return db.scalars(select(Job.job_id).where(Job.status == "queued").order_by(Job.job_id)).all()
+
+class JobRunner:
+    # A thread pool in the API process: the work is SQL and encoding. With no workers the
+    # jobs wait for python -m backend.jobs worker.
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+        return self._executor
+
+    def submit(self, job_id: int):
+        with self._lock:
+            if not self.workers or job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        future = self._pool().submit(run_job, job_id)
+        future.add_done_callback(lambda _: self._discard(job_id))
+
+    def _discard(self, job_id: int):
+        with self._lock:
+            self._pending.discard(job_id)
+
+    def resume(self):
+        with SessionLocal() as db:
+            job_ids = runnable_jobs(db)
+        for job_id in job_ids:
+            self.submit(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+job_runner = JobRunner(settings.job_workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background report jobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="run queued jobs until interrupted")
+    worker.add_argument("--workers", type=int, default=max(settings.job_workers, 1))
+    worker.add_argument("--poll", type=float, default=2.0, help="seconds between looks at the queue")
+    commands.add_parser("status", help="the most recent jobs")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    if args.command == "status":
+        with SessionLocal() as db:
+            for job in list_jobs(db):
+                progress = "" if job["progress"] is None else f"{job['progress']:.0%}"
+                print(f"{job['job_id']:>6}  {job['kind']:<15} {job['status']:<8} {progress:>5}  "
+                      f"{'stale ' if job['stale'] else ''}{json.dumps(job['params'])}")
+    else:
+        runner = JobRunner(args.workers)
+        try:
+            while True:
+                runner.resume()
+                time.sleep(args.poll)
+        except KeyboardInterrupt:
+            runner.shutdown()
@@ -1,12 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import logging
+
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional, Union
 
-from backend import models, schemas, crud
-from backend.database import get_db, engine
+from backend import models, schemas, crud, export, bulk_import, jobs, metrics, query_budget, snapshots
+from backend.database import (
+    AnySession, SessionLocal, get_db, get_session, engine, async_engine, replica_engines, async_replica_engines,
+    pool_monitors, run_db
+)
 from backend.auth import create_access_token
-from backend.auth_bearer import JWTBearer
+from backend.hashing import password_hasher
+from backend.auth_bearer import JWTBearer, token_cache, token_hash
+from backend.replicas import ReadYourWritesMiddleware
+from backend.response_cache import cached_json_response, catalog_cache, rankings_cache
+from config import settings
+
+logger = logging.getLogger(__name__)
 
 models.Base.metadata.create_all(bind=engine)
 
@@ -19,12 +34,62 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(query_budget.QueryBudgetMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+for instrumented in [engine, async_engine, *replica_engines, *async_replica_engines]:
+    if instrumented is not None:
+        metrics.instrument_engine(instrumented)
 
 jwt_bearer = JWTBearer()
 
+def read_revocations(after_id: int):
+    # Always the primary: a logout must not wait for a replica to catch up
+    with SessionLocal() as db:
+        return crud.get_revoked_tokens(db, after_id)
+
+async def sync_revocations():
+    # Only the read goes to the threadpool; the token cache is updated on the event loop
+    rows = await run_in_threadpool(read_revocations, token_cache.sync_cursor)
+    token_cache.add_revoked(rows)
+
+async def keep_revocations_synced():
+    while True:
+        await asyncio.sleep(settings.token_revocation_sync_seconds)
+        try:
+            await sync_revocations()
+        except Exception:
+            logger.exception("Token revocation sync failed")
+
+@app.on_event("startup")
+async def start_revocation_sync():
+    # Logouts made on other workers (or before a restart) reach this worker's token cache
+    # within TOKEN_REVOCATION_SYNC_SECONDS
+    await sync_revocations()
+    app.state.revocation_sync = asyncio.create_task(keep_revocations_synced())
+
+@app.on_event("shutdown")
+def stop_revocation_sync():
+    app.state.revocation_sync.cancel()
+
+@app.on_event("startup")
+def resume_report_jobs():
+    # Jobs queued before a restart, or left running by a worker that died
+    jobs.job_runner.resume()
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+    jobs.job_runner.shutdown()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(pool_monitors), media_type="text/plain; version=0.0.4")
+
 @app.post("/login", response_model=schemas.Token)
-async def login(user_credentials: schemas.UserLogin, user_type: str, db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, user_credentials.username, user_credentials.password, user_type)
+async def login(user_credentials: schemas.UserLogin, user_type: str, db: AnySession = Depends(get_session)):
+    user = await crud.authenticate_user(db, user_credentials.username, user_credentials.password, user_type)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,75 +111,383 @@ async def login(user_credentials: schemas.UserLogin, user_type: str, db: Session
         "full_name": user.full_name
     }
 
-@app.get("/admin/students", response_model=List[schemas.Student])
-async def get_students(current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+@app.post("/logout")
+async def logout(request: Request, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
+    token_cache.revoke(request.state.token, current_user)
+    await run_db(db, crud.revoke_token, token_hash(request.state.token), int(current_user["exp"]))
+    return {"detail": "Logged out"}
+
+@app.get("/admin/auth/token-cache")
+async def get_token_cache_stats(current_user: dict = Depends(jwt_bearer)):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return token_cache.stats()
+
+@app.get("/admin/pool")
+async def get_pool_stats(current_user: dict = Depends(jwt_bearer)):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.get_all_students(db)
+    return {name: monitor.snapshot() for name, monitor in pool_monitors.items()}
 
-@app.get("/admin/teachers", response_model=List[schemas.Teacher])
-async def get_teachers(current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+@app.get("/admin/students", response_model=Union[schemas.StudentPage, List[schemas.Student]])
+async def get_students(
+    after: Optional[int] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    department: Optional[str] = None,
+    semester: Optional[int] = None,
+    prefix: Optional[str] = None,
+    paginate: bool = True,
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.get_all_teachers(db)
+    items, next_cursor = await run_db(
+        db, crud.list_students, after, limit if paginate else None, department=department, semester=semester, prefix=prefix
+    )
+    return {"items": items, "next_cursor": next_cursor} if paginate else items
 
-@app.get("/admin/subjects", response_model=List[schemas.Subject])
-async def get_subjects(current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+@app.get("/admin/teachers", response_model=Union[schemas.TeacherPage, List[schemas.Teacher]])
+async def get_teachers(
+    request: Request,
+    after: Optional[int] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    department: Optional[str] = None,
+    prefix: Optional[str] = None,
+    paginate: bool = True,
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.get_all_subjects(db)
+    # Read the version before the data: a write in between only makes the entry stale sooner
+    version = await run_db(db, crud.get_data_version, crud.CATALOG_VERSION)
+
+    async def build():
+        items, next_cursor = await run_db(
+            db, crud.list_teachers, after, limit if paginate else None, department=department, prefix=prefix
+        )
+        items = [schemas.Teacher.model_validate(item) for item in items]
+        return {"items": items, "next_cursor": next_cursor} if paginate else items
+
+    return await cached_json_response(request, catalog_cache, version, build)
+
+@app.get("/admin/subjects", response_model=Union[schemas.SubjectPage, List[schemas.Subject]])
+async def get_subjects(
+    request: Request,
+    after: Optional[int] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    semester: Optional[int] = None,
+    prefix: Optional[str] = None,
+    paginate: bool = True,
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    version = await run_db(db, crud.get_data_version, crud.CATALOG_VERSION)
+
+    async def build():
+        items, next_cursor = await run_db(
+            db, crud.list_subjects, after, limit if paginate else None, semester=semester, prefix=prefix
+        )
+        items = [schemas.Subject.model_validate(item) for item in items]
+        return {"items": items, "next_cursor": next_cursor} if paginate else items
+
+    return await cached_json_response(request, catalog_cache, version, build)
 
 @app.post("/admin/students", response_model=schemas.Student)
-async def create_student(student: schemas.StudentCreate, current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def create_student(student: schemas.StudentCreate, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.create_student(db, student)
+    hashed_password = await password_hasher.hash(student.password)
+    return await run_db(db, crud.create_student, student, hashed_password)
 
 @app.post("/admin/teachers", response_model=schemas.Teacher)
-async def create_teacher(teacher: schemas.TeacherCreate, current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def create_teacher(teacher: schemas.TeacherCreate, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.create_teacher(db, teacher)
+    hashed_password = await password_hasher.hash(teacher.password)
+    return await run_db(db, crud.create_teacher, teacher, hashed_password)
+
+@app.post("/admin/import/{target}", response_model=schemas.ImportReport)
+async def import_users(
+    target: Literal["students", "teachers"],
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "jsonl"]] = None,
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    if format is None:
+        format = "csv" if (file.filename or "").lower().endswith(".csv") else "jsonl"
+    return await bulk_import.import_users(db, target, file.file, format)
 
 @app.post("/admin/subjects", response_model=schemas.Subject)
-async def create_subject(subject: schemas.SubjectBase, current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def create_subject(subject: schemas.SubjectBase, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.create_subject(db, subject)
+    return await run_db(db, crud.create_subject, subject)
 
 @app.post("/admin/assign-teacher")
-async def assign_teacher_to_subject(teacher_id: int, subject_id: int, current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def assign_teacher_to_subject(teacher_id: int, subject_id: int, academic_year: Optional[str] = None, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.assign_teacher_to_subject(db, teacher_id, subject_id)
+    assignment = await run_db(db, crud.assign_teacher_to_subject, teacher_id, subject_id, academic_year)
+    if assignment is None:
+        raise HTTPException(status_code=409, detail="Teacher is already assigned to this subject for this year")
+    return assignment
 
 @app.get("/admin/summary")
-async def get_admin_summary(current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def get_admin_summary(
+    breakdown: List[Literal["department", "semester", "academic_year"]] = Query([]),
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return await run_db(db, crud.get_admin_summary, breakdown)
+
+@app.get("/admin/rankings", response_model=List[schemas.ClassRank])
+async def get_class_rankings(
+    request: Request,
+    academic_year: Optional[str] = None,
+    department: Optional[str] = None,
+    semester: Optional[int] = None,
+    top: Optional[int] = Query(None, ge=1),
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    version = await run_db(db, crud.get_data_version, crud.MARKS_VERSION)
+
+    async def build():
+        rows = await run_db(db, crud.get_class_rankings, academic_year, department, semester, top)
+        return [schemas.ClassRank.model_validate(row) for row in rows]
+
+    return await cached_json_response(request, rankings_cache, version, build)
+
+@app.get("/admin/rankings/subjects/{subject_id}", response_model=List[schemas.SubjectPercentile])
+async def get_subject_percentiles(
+    request: Request,
+    subject_id: int,
+    academic_year: Optional[str] = None,
+    exam_type: Optional[Literal["internal", "external", "practical"]] = None,
+    top: Optional[int] = Query(None, ge=1),
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
     if current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.get_admin_summary(db)
+    version = await run_db(db, crud.get_data_version, crud.MARKS_VERSION)
+
+    async def build():
+        rows = await run_db(db, crud.get_subject_percentiles, subject_id, academic_year, exam_type, top)
+        return [schemas.SubjectPercentile.model_validate(row) for row in rows]
+
+    return await cached_json_response(request, rankings_cache, version, build)
+
+@app.get("/admin/export/marks")
+async def export_marks(
+    format: Literal["csv", "ndjson"] = "csv",
+    academic_year: Optional[str] = None,
+    department: Optional[str] = None,
+    semester: Optional[int] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(jwt_bearer),
+    db: Session = Depends(get_db)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    # Exports stay on a sync session: Starlette iterates the sync generator in its threadpool
+    rows = crud.iter_marks_export(db, academic_year, department, semester)
+    return export.streaming_export("marks", crud.MARKS_EXPORT_COLUMNS, rows, format, gzip)
+
+@app.get("/admin/export/results")
+async def export_results(
+    format: Literal["csv", "ndjson"] = "csv",
+    academic_year: Optional[str] = None,
+    department: Optional[str] = None,
+    semester: Optional[int] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(jwt_bearer),
+    db: Session = Depends(get_db)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    rows = crud.iter_results_export(db, academic_year, department, semester)
+    return export.streaming_export("results", crud.RESULTS_EXPORT_COLUMNS, rows, format, gzip)
+
+@app.get("/admin/snapshots")
+async def list_snapshots(current_user: dict = Depends(jwt_bearer)):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return snapshots.list_snapshots()
+
+@app.get("/admin/snapshots/marks")
+async def stream_marks_snapshot(
+    academic_year: List[str] = Query([]),
+    column: List[str] = Query([]),
+    current_user: dict = Depends(jwt_bearer)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    # Served from the Parquet snapshots only; never touches the database
+    available = snapshots.read_manifest()["years"]
+    missing = [year for year in academic_year if year not in available]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"No snapshot for {', '.join(missing)}")
+    unknown = [name for name in column if name not in snapshots.SCHEMA.names]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown column {', '.join(unknown)}")
+    return StreamingResponse(
+        snapshots.arrow_stream(academic_year or sorted(available), column or None),
+        media_type=snapshots.MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="marks.arrows"'}
+    )
+
+@app.post("/admin/jobs", response_model=schemas.Job, status_code=202)
+async def enqueue_report(
+    job_request: schemas.JobCreate,
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    job, created = await run_db(db, jobs.enqueue, job_request, int(current_user["sub"]))
+    if created:
+        jobs.job_runner.submit(job["job_id"])
+    return job
+
+@app.get("/admin/jobs", response_model=List[schemas.Job])
+async def list_report_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return await run_db(db, jobs.list_jobs, limit)
+
+@app.get("/admin/jobs/{job_id}", response_model=schemas.Job)
+async def get_report_job(job_id: int, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    job = await run_db(db, jobs.job_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/admin/jobs/{job_id}/result")
+async def download_report(job_id: int, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
+    if current_user["user_type"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    job = await run_db(db, jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "expired":
+        raise HTTPException(status_code=410, detail="A newer run of this report replaced the result")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return jobs.result_response(job)
 
 @app.get("/teacher/marks")
-async def get_teacher_marks(current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def get_teacher_marks(
+    academic_year: Optional[str] = None,
+    exam_type: Optional[Literal["internal", "external", "practical"]] = None,
+    subject_id: Optional[int] = None,
+    after: Optional[str] = None,
+    limit: int = Query(crud.TEACHER_MARKS_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "teacher":
+        raise HTTPException(status_code=403, detail="Access denied")
+    try:
+        cursor = crud.parse_mark_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The grid edits live marks; an archived year's are only in marks_history, by its statistics
+    if academic_year is not None and await run_db(db, crud.get_archived_years, [academic_year]):
+        raise HTTPException(status_code=410, detail=f"Academic year {academic_year} is archived; "
+                                                    "its marks are read-only and only in the statistics")
+    return await run_db(
+        db, crud.get_marks_for_teacher_subjects, int(current_user["sub"]), academic_year,
+        exam_type=exam_type, subject_id=subject_id, after=cursor, limit=limit
+    )
+
+@app.get("/teacher/stats", response_model=schemas.TeacherStats)
+async def get_teacher_stats(
+    academic_year: Optional[str] = None,
+    exam_type: Optional[Literal["internal", "external", "practical"]] = None,
+    bucket_width: int = Query(crud.DEFAULT_BUCKET_WIDTH, ge=5, le=50),
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "teacher":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return await run_db(db, crud.get_teacher_stats, int(current_user["sub"]), academic_year, exam_type, bucket_width)
+
+async def reject_archived_years(db: AnySession, academic_years):
+    archived = await run_db(db, crud.get_archived_years, academic_years)
+    if archived:
+        raise HTTPException(status_code=409, detail=f"Academic year {', '.join(archived)} is archived and read-only")
+
+@app.post("/teacher/marks", response_model=schemas.MarkUpsertResult)
+async def update_teacher_marks(marks: List[schemas.MarkUpdate], current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "teacher":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.get_marks_for_teacher_subjects(db, int(current_user["sub"]))
+    await reject_archived_years(db, {mark.academic_year for mark in marks})
+    return await run_db(db, crud.update_marks, marks, int(current_user["sub"]))
 
-@app.post("/teacher/marks")
-async def update_teacher_marks(marks: List[schemas.MarkUpdate], current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+@app.patch("/teacher/marks", response_model=schemas.MarkDeltaResult)
+async def patch_teacher_marks(deltas: List[schemas.MarkDelta], current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "teacher":
         raise HTTPException(status_code=403, detail="Access denied")
-    return crud.update_marks(db, marks, int(current_user["sub"]))
+    await reject_archived_years(db, {delta.academic_year for delta in deltas})
+    result = await run_db(db, crud.apply_mark_deltas, deltas, int(current_user["sub"]))
+    if result["conflicts"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Marks changed since they were loaded; nothing was saved", "conflicts": jsonable_encoder(result["conflicts"])}
+        )
+    return result
 
 @app.get("/student/results")
-async def get_student_results(current_user: dict = Depends(jwt_bearer), db: Session = Depends(get_db)):
+async def get_student_results(academic_year: Optional[str] = None, current_user: dict = Depends(jwt_bearer), db: AnySession = Depends(get_session)):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Access denied")
-    result = crud.get_student_results(db, int(current_user["sub"]))
+    result = await run_db(db, crud.get_student_results, int(current_user["sub"]), academic_year)
     if not result:
         raise HTTPException(status_code=404, detail="No results found")
     return result
 
+@app.get("/student/rank", response_model=schemas.StudentStanding)
+async def get_student_rank(
+    request: Request,
+    academic_year: Optional[str] = None,
+    current_user: dict = Depends(jwt_bearer),
+    db: AnySession = Depends(get_session)
+):
+    if current_user["user_type"] != "student":
+        raise HTTPException(status_code=403, detail="Access denied")
+    student_id = int(current_user["sub"])
+    version = await run_db(db, crud.get_data_version, crud.MARKS_VERSION)
+
+    async def build():
+        class_rank = await run_db(db, crud.get_class_rankings, academic_year, student_id=student_id)
+        subjects = await run_db(db, crud.get_subject_percentiles, None, academic_year, student_id=student_id)
+        return schemas.StudentStanding(
+            class_rank=class_rank[0] if class_rank else None,
+            subjects=subjects
+        )
+
+    # Same URL for every student, so the key has to carry who is asking
+    key = (request.url.path, student_id, academic_year)
+    return await cached_json_response(request, rankings_cache, version, build, key=key)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
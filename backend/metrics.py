@@ -0,0 +1,182 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "rows_affected")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows_affected = 0
+
+# Set by the middleware for the duration of a request; threadpool and run_sync
+# calls inherit the context, so cursor events land on the right request.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.rows_affected = 0
+        self.statuses = {}
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.untracked_queries = 0
+        self.untracked_db_seconds = 0.0
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            metrics = self.routes.get((method, route))
+            if metrics is None:
+                metrics = self.routes[(method, route)] = RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.db_seconds += stats.db_seconds
+            metrics.rows_affected += stats.rows_affected
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def record_untracked_query(self, seconds: float):
+        # Queries outside a request (startup, CLI commands, background work)
+        with self._lock:
+            self.untracked_queries += 1
+            self.untracked_db_seconds += seconds
+
+    def render(self, pool_monitors=None) -> str:
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist, bounds):
+            cumulative = 0
+            for bound, count in zip(list(bounds) + ["+Inf"], hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+
+            header("http_requests_total", "counter", "Requests by route and status code.")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            header("http_request_duration_seconds", "histogram", "Request latency by route.")
+            for (method, route), metrics in routes:
+                histogram("http_request_duration_seconds", f'method="{method}",route="{route}"',
+                          metrics.latency, LATENCY_BUCKETS)
+
+            header("http_request_db_queries", "histogram", "SQL statements issued per request.")
+            for (method, route), metrics in routes:
+                histogram("http_request_db_queries", f'method="{method}",route="{route}"',
+                          metrics.queries, QUERY_COUNT_BUCKETS)
+
+            header("http_request_db_seconds_total", "counter", "Time spent executing SQL, by route.")
+            for (method, route), metrics in routes:
+                lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {metrics.db_seconds}')
+
+            header("http_request_db_rows_affected_total", "counter",
+                   "Rows written by INSERT, UPDATE and DELETE (driver rowcount), by route.")
+            for (method, route), metrics in routes:
+                lines.append(f'http_request_db_rows_affected_total{{method="{method}",route="{route}"}} {metrics.rows_affected}')
+
+            header("db_untracked_queries_total", "counter", "SQL statements issued outside a request.")
+            lines.append(f"db_untracked_queries_total {self.untracked_queries}")
+            lines.append(f"db_untracked_seconds_total {self.untracked_db_seconds}")
+
+        for name, monitor in (pool_monitors or {}).items():
+            snapshot = monitor.snapshot()
+            for key in ("size", "checked_in", "checked_out", "overflow"):
+                if key in snapshot:
+                    lines.append(f'db_pool_{key}{{pool="{name}"}} {snapshot[key]}')
+            for key in ("checkouts", "connects", "invalidations", "timeouts"):
+                lines.append(f'db_pool_{key}_total{{pool="{name}"}} {snapshot[key]}')
+            wait = snapshot["wait_seconds"]
+            for bound, count in wait["buckets"].items():
+                lines.append(f'db_pool_wait_seconds_bucket{{pool="{name}",le="{bound}"}} {count}')
+            lines.append(f'db_pool_wait_seconds_sum{{pool="{name}"}} {wait["sum"]}')
+            lines.append(f'db_pool_wait_seconds_count{{pool="{name}"}} {wait["count"]}')
+
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+def instrument_engine(engine):
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's own execution context, which is dropped with it if the
+        # statement fails, so nothing builds up on the pooled connection
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        stats = current_request.get()
+        if stats is None:
+            registry.record_untracked_query(elapsed)
+            return
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        # rowcount only means something for statements without a result set (writes): it is
+        # -1 for a SELECT on SQLite and for streamed results, whose rows are fetched later
+        if cursor.description is None and cursor.rowcount > 0:
+            stats.rows_affected += cursor.rowcount
+
+class MetricsMiddleware:
+    # Plain ASGI middleware so streaming responses are timed until their last chunk
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            # Route templates keep label cardinality bounded (/items/{id}, not /items/42)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            registry.record_request(scope["method"], route_path, status, time.perf_counter() - started, stats)
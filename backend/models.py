@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, DECIMAL, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, DECIMAL, Enum, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from backend.database import Base
@@ -29,6 +29,10 @@ class Teacher(Base):
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Student list filters and the department/semester rankings partition
+        Index("ix_students_department_semester", "department", "semester"),
+    )
     
     student_id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True)
@@ -59,6 +63,12 @@ class Subject(Base):
 
 class TeacherSubject(Base):
     __tablename__ = "teacher_subjects"
+    __table_args__ = (
+        # Also serves lookups by teacher_id (its leading column)
+        UniqueConstraint("teacher_id", "subject_id", "academic_year", name="unique_assignment"),
+        # Who teaches a subject in a given year, probed from the marks side
+        Index("ix_teacher_subjects_subject_year", "subject_id", "academic_year"),
+    )
     
     assignment_id = Column(Integer, primary_key=True, index=True)
     teacher_id = Column(Integer, ForeignKey("teachers.teacher_id"))
@@ -70,6 +80,15 @@ class TeacherSubject(Base):
 
 class Mark(Base):
     __tablename__ = "marks"
+    __table_args__ = (
+        UniqueConstraint("student_id", "subject_id", "academic_year", "exam_type", name="unique_mark"),
+        # Everything scoped to a subject and year: teacher marks and stats, subject percentiles
+        Index("ix_marks_subject_year", "subject_id", "academic_year", "exam_type"),
+        # Year-scoped exports, ordered by mark_id, which the index carries
+        Index("ix_marks_year", "academic_year"),
+        # Incremental analytics snapshots: marks changed since the last run
+        Index("ix_marks_updated_at", "updated_at"),
+    )
     
     mark_id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.student_id"))
@@ -82,3 +101,87 @@ class Mark(Base):
     
     student = relationship("Student", back_populates="marks")
     subject = relationship("Subject", back_populates="marks")
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    
+    # Bumped in the same transaction as writes to the data it names; caches compare against it
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    # Logged-out tokens until they expire, synced into every worker's token cache. The id is
+    # the sync cursor; expires_at (epoch seconds, the token's exp) is when the row can go.
+    revocation_id = Column(Integer, primary_key=True, autoincrement=True)
+    token_hash = Column(String(64), nullable=False)
+    expires_at = Column(Integer, nullable=False)
+
+class StudentResultSummary(Base):
+    __tablename__ = "student_result_summaries"
+    __table_args__ = (
+        # One academic year (or OVERALL_YEAR) at a time, best CGPA first: rankings and results export
+        Index("ix_summaries_year_cgpa", "academic_year", "cgpa"),
+    )
+    
+    student_id = Column(Integer, ForeignKey("students.student_id"), primary_key=True)
+    # One row per academic year plus an OVERALL_YEAR row across all years
+    academic_year = Column(String(20), primary_key=True)
+    subjects_count = Column(Integer, default=0)
+    total_credits = Column(Integer, default=0)
+    grade_points = Column(DECIMAL(12,4), default=0)
+    failed_subjects = Column(Integer, default=0)
+    cgpa = Column(DECIMAL(4,2), default=0)
+    passed = Column(Boolean, default=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class MarkHistory(Base):
+    __tablename__ = "marks_history"
+    __table_args__ = {"mysql_row_format": "COMPRESSED"}
+    
+    # Marks of archived academic years, moved out of marks by python -m backend.archive.
+    # Write-once and read by year: no surrogate id, no secondary indexes, compressed on MySQL.
+    academic_year = Column(String(20), primary_key=True)
+    student_id = Column(Integer, primary_key=True)
+    subject_id = Column(Integer, primary_key=True)
+    exam_type = Column(Enum('internal', 'external', 'practical'), primary_key=True)
+    marks_obtained = Column(DECIMAL(5,2), default=0)
+    updated_by = Column(Integer)
+    updated_at = Column(DateTime(timezone=True))
+
+class ArchivedYear(Base):
+    __tablename__ = "archived_years"
+    
+    # Closed years are read-only: their summaries are kept and mark writes are refused
+    academic_year = Column(String(20), primary_key=True)
+    marks_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        # Earlier runs of the same report, whose result may still be current
+        Index("ix_report_jobs_report", "kind", "params"),
+        # Workers picking up queued jobs, oldest first
+        Index("ix_report_jobs_status", "status", "job_id"),
+    )
+    
+    # Heavy reports run by backend.jobs; the result is a file under JOB_RESULT_DIR
+    job_id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(30), nullable=False)
+    params = Column(String(500), nullable=False)  # canonical JSON
+    status = Column(Enum('queued', 'running', 'done', 'failed', 'expired'), nullable=False, default='queued')
+    # Data versions the result was computed from, e.g. "marks:12,catalog:3"
+    data_version = Column(String(100))
+    rows_done = Column(Integer, nullable=False, default=0)
+    rows_total = Column(Integer)
+    result_path = Column(String(255))
+    result_bytes = Column(Integer)
+    error = Column(Text)
+    requested_by = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    # Touched by every progress write; a running job that stops updating has lost its worker
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True))
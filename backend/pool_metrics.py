@@ -0,0 +1,82 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event, exc
+
+# Upper bounds (seconds) of the checkout wait-time histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class PoolMonitor:
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_sum = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_counts[bisect_left(WAIT_BUCKETS, seconds)] += 1
+            self.wait_sum += seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def _count(self, attribute):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def attach(self, engine):
+        # The sync pool of an AsyncEngine is reached through .sync_engine
+        engine = getattr(engine, "sync_engine", engine)
+        self.pool = engine.pool
+        event.listen(engine, "engine_disposed", lambda *_: setattr(self, "pool", engine.pool))
+        event.listen(engine, "checkout", lambda *_: self._count("checkouts"))
+        event.listen(engine, "connect", lambda *_: self._count("connects"))
+        event.listen(engine, "invalidate", lambda *_: self._count("invalidations"))
+        event.listen(engine, "soft_invalidate", lambda *_: self._count("soft_invalidations"))
+        return self
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        stats = {"pool_class": type(pool).__name__ if pool is not None else None}
+        if pool is not None and hasattr(pool, "checkedout"):
+            stats.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow()
+            })
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(WAIT_BUCKETS + ("+Inf",), self.wait_counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            stats.update({
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds": {"buckets": buckets, "count": cumulative, "sum": self.wait_sum}
+            })
+        return stats
+
+def monitored_pool_class(base, monitor: PoolMonitor):
+    # A subclass (not an instance hook) so the timing survives pool.recreate()
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = base._do_get(self)
+        except exc.TimeoutError:
+            monitor.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        monitor.observe_wait(time.perf_counter() - started)
+        return record
+
+    return type(f"Monitored{base.__name__}", (base,), {"_do_get": _do_get})
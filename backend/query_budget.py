@@ -0,0 +1,195 @@
+import functools
+import inspect
+import logging
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class Budget(NamedTuple):
+    # None disables a check, for routes whose statement count scales with the input
+    max_queries: Optional[int]
+    max_repeats: Optional[int] = 3
+
+# Statement budgets per route template, enforced by QueryBudgetMiddleware. Numbers are the
+# worst case of the current implementation; raise them deliberately when a route needs more.
+ROUTE_BUDGETS = {
+    ("GET", "/metrics"): Budget(0),
+    ("POST", "/login"): Budget(3),  # user lookup, plus rehash update and refresh on upgrade
+    ("POST", "/logout"): Budget(2),  # clear expired revocations, record this one
+    ("GET", "/admin/auth/token-cache"): Budget(0),
+    ("GET", "/admin/pool"): Budget(0),
+    ("GET", "/admin/students"): Budget(1),
+    ("GET", "/admin/teachers"): Budget(2),  # catalog version, then the page only on a cache miss
+    ("GET", "/admin/subjects"): Budget(2),
+    ("POST", "/admin/students"): Budget(2),  # insert, refresh
+    ("POST", "/admin/teachers"): Budget(3),  # insert, catalog version upsert, refresh
+    # Two statements per 500-row chunk, plus a row-by-row fallback when a chunk hits a conflict
+    ("POST", "/admin/import/{target}"): Budget(None, max_repeats=None),
+    ("POST", "/admin/subjects"): Budget(4),
+    ("POST", "/admin/assign-teacher"): Budget(3),
+    ("GET", "/admin/summary"): Budget(2),  # counts, pass/fail grouped over the summary table
+    ("GET", "/admin/rankings"): Budget(2),  # marks version, then the windowed query on a cache miss
+    # marks version, then archived years and the windowed query on a cache miss
+    ("GET", "/admin/rankings/subjects/{subject_id}"): Budget(3),
+    ("GET", "/admin/export/marks"): Budget(3),  # archived years, then marks and marks_history
+    ("GET", "/admin/export/results"): Budget(1),
+    ("GET", "/admin/snapshots"): Budget(0),  # Parquet files and their manifest, no database
+    ("GET", "/admin/snapshots/marks"): Budget(0),
+    ("POST", "/admin/jobs"): Budget(4),  # data versions, reusable job, insert, refresh
+    ("GET", "/admin/jobs"): Budget(2),  # jobs, data versions for staleness
+    ("GET", "/admin/jobs/{job_id}"): Budget(2),
+    ("GET", "/admin/jobs/{job_id}/result"): Budget(1),  # the job; the result is a file
+    ("GET", "/teacher/marks"): Budget(2),  # archived-year check when a year is given, the page
+    # Archived years, then per subject/year, totals and histogram in one UNION ALL
+    ("GET", "/teacher/stats"): Budget(2),
+    # Archived-year check, existing-row load, one upsert per 1000-row chunk, summary refresh
+    ("POST", "/teacher/marks"): Budget(None, max_repeats=100),
+    # Archived-year check, locked read, compare-and-set update, insert, summary refresh (load,
+    # delete, insert per year, insert overall), marks version upsert, or a re-read on a lost race
+    ("PATCH", "/teacher/marks"): Budget(9),
+    # Year's marks with subjects (marks_history when archived), year and overall summaries, student
+    ("GET", "/student/results"): Budget(4),
+    ("GET", "/student/rank"): Budget(4),  # marks version, class rank, archived years, subject percentiles
+}
+
+# IN lists and multi-row VALUES vary in length with the input; collapse them so the same
+# statement issued for different batches has the same shape.
+_PARAM_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_REPEATED_GROUPS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+_SAVEPOINT = re.compile(r"\bsa_savepoint_\d+\b")
+
+def statement_shape(statement: str) -> str:
+    shape = _PARAM_LIST.sub("(?)", statement)
+    shape = _REPEATED_GROUPS.sub(r"\1", shape)
+    shape = _SAVEPOINT.sub("sa_savepoint", shape)
+    return " ".join(shape.split())
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class QueryTracker:
+    def __init__(self, name: str, budget: Budget, mode: str):
+        self.name = name
+        self.budget = budget
+        self.mode = mode
+        self.count = 0
+        self.shapes = Counter()
+        self.violations = []
+
+    def record(self, statement: str):
+        self.count += 1
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.budget.max_queries is not None and self.count == self.budget.max_queries + 1:
+            self.violate(f"{self.name}: more than {self.budget.max_queries} SQL statements")
+        if self.budget.max_repeats is not None and self.shapes[shape] == self.budget.max_repeats + 1:
+            self.violate(f"{self.name}: statement repeated more than {self.budget.max_repeats} times "
+                         f"(likely N+1): {shape[:200]}")
+
+    def violate(self, message: str):
+        self.violations.append(message)
+        if self.mode == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning("Query budget exceeded: %s", message)
+
+# Every active tracker sees every statement, so a crud budget nests inside a route budget.
+# Context variables follow run_in_threadpool and run_sync into the worker thread.
+_active: ContextVar[Tuple[QueryTracker, ...]] = ContextVar("query_budget_trackers", default=())
+
+class query_budget:
+    # Context manager or decorator (sync and async functions):
+    #   with query_budget(2, name="summary") as tracker: ...
+    #   @query_budget(3)
+    def __init__(self, max_queries: Optional[int], max_repeats: Optional[int] = 3, name: Optional[str] = None,
+                 mode: Optional[str] = None):
+        self.budget = Budget(max_queries, max_repeats)
+        self.name = name
+        self.mode = mode
+        self._tokens = []
+
+    def __enter__(self) -> QueryTracker:
+        mode = self.mode or settings.query_budget_mode
+        tracker = QueryTracker(self.name or "query_budget", self.budget, mode)
+        if mode != "off":
+            self._tokens.append(_active.set(_active.get() + (tracker,)))
+        else:
+            self._tokens.append(None)
+        return tracker
+
+    def __exit__(self, exc_type, exc, tb):
+        token = self._tokens.pop()
+        if token is not None:
+            _active.reset(token)
+        return False
+
+    def __call__(self, fn):
+        name = self.name or f"{fn.__module__}.{fn.__qualname__}"
+        make = lambda: query_budget(self.budget.max_queries, self.budget.max_repeats, name, self.mode)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with make():
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with make():
+                return fn(*args, **kwargs)
+        return wrapper
+
+def assert_max_queries(max_queries: Optional[int], max_repeats: Optional[int] = 3):
+    # For tests: always raises regardless of QUERY_BUDGET_MODE
+    return query_budget(max_queries, max_repeats, name="assert_max_queries", mode="raise")
+
+def install(engine):
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        for tracker in _active.get():
+            tracker.record(statement)
+
+class RouteTracker(QueryTracker):
+    def __init__(self, scope, mode: str):
+        super().__init__("unmatched", Budget(None), mode)
+        self.scope = scope
+        self.resolved = False
+
+    def record(self, statement: str):
+        if not self.resolved:
+            route = getattr(self.scope.get("route"), "path", None)
+            if route is not None:
+                self.resolved = True
+                key = (self.scope["method"], route)
+                self.name = f"{key[0]} {key[1]}"
+                if key in ROUTE_BUDGETS:
+                    self.budget = ROUTE_BUDGETS[key]
+                else:
+                    self.violate(f"{self.name}: no query budget declared in ROUTE_BUDGETS")
+        super().record(statement)
+
+class QueryBudgetMiddleware:
+    # The route is only known once the router has matched it (it writes scope["route"]),
+    # so the budget is resolved lazily on the first statement.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.query_budget_mode == "off":
+            await self.app(scope, receive, send)
+            return
+        tracker = RouteTracker(scope, settings.query_budget_mode)
+        token = _active.set(_active.get() + (tracker,))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _active.reset(token)
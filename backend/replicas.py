@@ -0,0 +1,47 @@
+import time
+
+from starlette.requests import Request
+
+from config import settings
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Set on every successful write. Until it expires the client's reads go to the primary, so
+# it sees its own write however far the replicas lag. Carried by the client rather than
+# kept per process, so it holds across uvicorn workers.
+STICKY_COOKIE = "read_primary_until"
+# Signing in or out changes nothing the client reads back; without this every dashboard's
+# first page load after login would go to the primary
+NOT_WRITES = {"/login", "/logout"}
+
+def reads_from_replica(request: Request) -> bool:
+    if not settings.replica_urls or request.method not in READ_METHODS:
+        return False
+    try:
+        primary_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    return primary_until <= time.time()
+
+def sticky_cookie() -> str:
+    seconds = settings.replica_sticky_seconds
+    return f"{STICKY_COOKIE}={time.time() + seconds:.3f}; Max-Age={seconds}; Path=/; HttpOnly; SameSite=Lax"
+
+class ReadYourWritesMiddleware:
+    # Plain ASGI middleware: adds the cookie to the response start of streaming responses too
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] in READ_METHODS or scope["path"] in NOT_WRITES
+                or not settings.replica_urls):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = list(message.get("headers", [])) + [(b"set-cookie", sticky_cookie().encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
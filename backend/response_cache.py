@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from config import settings
+
+class ResponseCache:
+    # Serialized JSON bodies keyed by request, each tagged with the data version it was built
+    # from. The version lives in the database (data_versions), so every worker sees a bump on
+    # its next request and rebuilds; nothing has to be broadcast between processes.
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, version: int, body: bytes) -> Tuple[str, bytes]:
+        # Strong validator: the digest of the exact bytes, so every worker computes the same tag
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        with self._lock:
+            self._entries[key] = (version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag, body
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def request_key(request: Request) -> tuple:
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+async def cached_json_response(request: Request, cache: ResponseCache, version: int,
+                               build: Callable[[], Awaitable], key: Optional[Hashable] = None) -> Response:
+    # Pass key when the body depends on more than the URL, e.g. on who is asking
+    key = key if key is not None else request_key(request)
+    entry = cache.get(key, version)
+    if entry is None:
+        content = jsonable_encoder(await build())
+        entry = cache.put(key, version, json.dumps(content, separators=(",", ":")).encode())
+    etag, body = entry
+    # no-cache: clients may store the body but must revalidate, which costs a 304 at most
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+catalog_cache = ResponseCache(settings.catalog_cache_size)
+rankings_cache = ResponseCache(settings.rankings_cache_size)
@@ -1,7 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 from decimal import Decimal
+from config import settings
+
+def current_year() -> str:
+    # Read per instance, not frozen into the class at import time
+    return settings.current_academic_year
 
 class UserLogin(BaseModel):
     username: str
@@ -34,6 +39,10 @@ class Student(StudentBase):
     class Config:
         from_attributes = True
 
+class StudentPage(BaseModel):
+    items: List[Student]
+    next_cursor: Optional[int] = None
+
 class TeacherBase(BaseModel):
     full_name: str
     email: str
@@ -52,6 +61,10 @@ class Teacher(TeacherBase):
     class Config:
         from_attributes = True
 
+class TeacherPage(BaseModel):
+    items: List[Teacher]
+    next_cursor: Optional[int] = None
+
 class SubjectBase(BaseModel):
     subject_code: str
     subject_name: str
@@ -66,12 +79,44 @@ class Subject(SubjectBase):
     class Config:
         from_attributes = True
 
+class SubjectPage(BaseModel):
+    items: List[Subject]
+    next_cursor: Optional[int] = None
+
 class MarkUpdate(BaseModel):
     mark_id: Optional[int] = None
     student_id: int
     subject_id: int
     marks_obtained: Decimal
-    academic_year: str = "2024-25"
+    academic_year: str = Field(default_factory=current_year)
+    exam_type: Literal["internal", "external", "practical"] = "external"
+
+class MarkUpsertResult(BaseModel):
+    inserted: int
+    updated: int
+    unchanged: int
+
+class MarkDelta(BaseModel):
+    student_id: int
+    subject_id: int
+    academic_year: str = Field(default_factory=current_year)
+    exam_type: Literal["internal", "external", "practical"] = "external"
+    previous_marks: Optional[Decimal] = None  # value the client loaded; None = no mark yet
+    marks_obtained: Decimal
+
+class MarkDeltaResult(BaseModel):
+    updated: int
+    inserted: int
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    total: int
+    inserted: int
+    failed: int
+    errors: List[ImportRowError]
 
 class MarkResponse(BaseModel):
     mark_id: int
@@ -89,6 +134,87 @@ class MarkResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class StatsSummary(BaseModel):
+    students: int
+    marks: int
+    average: Optional[float] = None
+    min: Optional[Decimal] = None
+    max: Optional[Decimal] = None
+    passed: int
+    pass_percentage: Optional[float] = None
+    histogram: List[int]
+
+class StatsTotals(StatsSummary):
+    subjects: int
+
+class SubjectStats(StatsSummary):
+    subject_id: int
+    subject_code: str
+    subject_name: str
+    academic_year: str
+    max_marks: int
+    passing_marks: int
+
+class TeacherStats(BaseModel):
+    bucket_width: int
+    buckets: List[str]  # percentage-of-max_marks ranges, one per histogram entry
+    totals: StatsTotals
+    subjects: List[SubjectStats]
+
+class Standing(BaseModel):
+    student_id: int
+    roll_number: str
+    student_name: str
+    rank: int  # ties share a rank, the next one is skipped
+    cohort_size: int
+    percentile: float  # share of the cohort ranked below
+
+class ClassRank(Standing):
+    department: str
+    semester: int
+    academic_year: str
+    cgpa: Decimal
+    passed: bool
+
+class SubjectPercentile(Standing):
+    subject_id: int
+    subject_code: str
+    subject_name: str
+    academic_year: str
+    exam_type: str
+    marks_obtained: Decimal
+
+class StudentStanding(BaseModel):
+    class_rank: Optional[ClassRank] = None
+    subjects: List[SubjectPercentile]
+
+class JobCreate(BaseModel):
+    kind: Literal["summary", "rankings", "marks_export", "results_export"]
+    # Each kind takes the parameters of its synchronous endpoint; the others are ignored
+    breakdown: List[Literal["department", "semester", "academic_year"]] = []
+    academic_year: Optional[str] = None
+    department: Optional[str] = None
+    semester: Optional[int] = None
+    top: Optional[int] = Field(None, ge=1)
+    format: Literal["csv", "ndjson"] = "csv"
+    gzip: bool = False
+    refresh: bool = False  # run again even if a result for the current data exists
+
+class Job(BaseModel):
+    job_id: int
+    kind: str
+    params: dict
+    status: Literal["queued", "running", "done", "failed", "expired"]
+    rows_done: int
+    rows_total: Optional[int] = None
+    progress: Optional[float] = None  # 0-1, when the number of rows is known up front
+    stale: bool  # marks changed since the result was computed
+    result_bytes: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class StudentResult(BaseModel):
     student_id: int
     student_name: str
@@ -0,0 +1,210 @@
+import argparse
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+
+from backend import crud, models
+from backend.database import engine, read_session
+from config import settings
+
+# The marks export columns, typed for analytics. Marks are float64 so pandas gets plain
+# NumPy columns out of the Arrow buffers.
+SCHEMA = pa.schema([
+    ("mark_id", pa.int64()),
+    ("student_id", pa.int64()),
+    ("roll_number", pa.string()),
+    ("student_name", pa.string()),
+    ("department", pa.string()),
+    ("semester", pa.int32()),
+    ("subject_id", pa.int64()),
+    ("subject_code", pa.string()),
+    ("subject_name", pa.string()),
+    ("academic_year", pa.string()),
+    ("exam_type", pa.string()),
+    ("marks_obtained", pa.float64()),
+    ("max_marks", pa.int32()),
+    ("passing_marks", pa.int32()),
+    ("credits", pa.int32()),
+    ("updated_at", pa.timestamp("us")),
+])
+
+BATCH_SIZE = 50000
+COMPRESSION = "zstd"
+MANIFEST = "_manifest.json"
+MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def snapshot_root() -> Path:
+    return Path(settings.snapshot_dir) / "marks"
+
+def year_path(root: Path, academic_year: str) -> Path:
+    # One file per academic year; quoted, since the year comes from the data
+    return root / f"{quote(academic_year, safe='')}.parquet"
+
+def read_manifest(root: Optional[Path] = None) -> dict:
+    path = (root or snapshot_root()) / MANIFEST
+    if not path.exists():
+        return {"watermark": None, "years": {}}
+    return json.loads(path.read_text())
+
+def _temporary(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+def _replace(path: Path, write):
+    # Written next to the old file and swapped in: a reader that already opened the old
+    # file keeps reading it whole
+    temporary = _temporary(path)
+    write(temporary)
+    os.replace(temporary, path)
+
+def _record_batch(rows) -> pa.RecordBatch:
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(SCHEMA, columns):
+        if field.name == "marks_obtained":
+            # The driver hands over Decimal, which Arrow only converts to a decimal type
+            arrays.append(pa.array(values, type=pa.decimal128(5, 2)).cast(pa.float64()))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+def year_statement(academic_year: Optional[str] = None):
+    # Every mark (or one year's) in (academic_year, mark_id) order, so files are written one
+    # year after the other
+    return crud.marks_export_statement(academic_year).order_by(None).order_by(
+        models.Mark.academic_year, models.Mark.mark_id
+    )
+
+def changes_statement(since: datetime):
+    # Unordered: a range read on ix_marks_updated_at. Ordering by mark_id would tempt the
+    # planner into walking the whole table in key order instead; Arrow sorts the few rows.
+    return crud.marks_export_statement(updated_since=since).order_by(None)
+
+def _batches(db: Session, statement) -> Iterator[pa.RecordBatch]:
+    # Server-side cursor, BATCH_SIZE rows at a time
+    result = db.execute(statement.execution_options(stream_results=True, yield_per=BATCH_SIZE))
+    for rows in result.partitions():
+        yield _record_batch(rows)
+
+def _by_year(batch):
+    # -> (academic_year, rows of that year)
+    for academic_year in sorted(pc.unique(batch.column("academic_year")).to_pylist()):
+        yield academic_year, batch.filter(pc.equal(batch.column("academic_year"), academic_year))
+
+def _latest(watermark: Optional[datetime], batch) -> Optional[datetime]:
+    latest = pc.max(batch.column("updated_at")).as_py()
+    if latest is None:
+        return watermark
+    return latest if watermark is None else max(watermark, latest)
+
+def _write_full(db: Session, root: Path, academic_year: Optional[str] = None):
+    # Streams every mark (or one year's) straight into per-year Parquet files.
+    # -> ({academic_year: rows}, latest updated_at)
+    counts, watermark = {}, None
+    writer = current = None
+    for batch in _batches(db, year_statement(academic_year)):
+        watermark = _latest(watermark, batch)
+        for year, rows in _by_year(batch):
+            if year != current:
+                if writer is not None:
+                    writer.close()
+                    os.replace(temporary, year_path(root, current))
+                current = year
+                temporary = _temporary(year_path(root, year))
+                writer = pq.ParquetWriter(temporary, SCHEMA, compression=COMPRESSION)
+            writer.write_batch(rows)
+            counts[year] = counts.get(year, 0) + rows.num_rows
+    if writer is not None:
+        writer.close()
+        os.replace(temporary, year_path(root, current))
+    return counts, watermark
+
+def _merge_changes(db: Session, root: Path, since: datetime):
+    # Marks changed since the watermark replace their previous version (by mark_id) in the
+    # file of their year; years without a file yet are written in full.
+    batches = list(_batches(db, changes_statement(since)))
+    if not batches:
+        return {}, None
+    changes = pa.Table.from_batches(batches, schema=SCHEMA)
+    counts, watermark = {}, _latest(None, changes)
+    for year, delta in _by_year(changes):
+        path = year_path(root, year)
+        if not path.exists():
+            written, _ = _write_full(db, root, year)
+            counts.update(written)
+            continue
+        current = pq.read_table(path, schema=SCHEMA)
+        kept = current.filter(pc.invert(pc.is_in(current.column("mark_id"), value_set=delta.column("mark_id"))))
+        table = pa.concat_tables([kept, delta]).sort_by("mark_id")
+        _replace(path, lambda temporary: pq.write_table(table, temporary, compression=COMPRESSION))
+        counts[year] = table.num_rows
+    return counts, watermark
+
+def write_snapshots(db: Session, full: bool = False) -> dict:
+    # Incremental by updated_at after the first run. Years that are no longer in the marks
+    # table (archived) keep their last snapshot.
+    root = snapshot_root()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(root)
+    if full or manifest["watermark"] is None:
+        counts, watermark = _write_full(db, root)
+    else:
+        since = datetime.fromisoformat(manifest["watermark"]) - timedelta(seconds=settings.snapshot_lookback_seconds)
+        counts, watermark = _merge_changes(db, root, since)
+
+    written_at = datetime.now().isoformat(timespec="seconds")
+    for year, rows in counts.items():
+        manifest["years"][year] = {"rows": rows, "bytes": year_path(root, year).stat().st_size,
+                                   "written_at": written_at}
+    if watermark is not None:
+        manifest["watermark"] = watermark.isoformat()
+    _replace(root / MANIFEST, lambda temporary: temporary.write_text(json.dumps(manifest, indent=2)))
+    return counts
+
+def list_snapshots() -> dict:
+    manifest = read_manifest()
+    return {
+        "watermark": manifest["watermark"],
+        "years": [{"academic_year": year, **details} for year, details in sorted(manifest["years"].items())]
+    }
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+def arrow_stream(academic_years: List[str], columns: Optional[List[str]] = None) -> Iterator[bytes]:
+    # One Arrow IPC stream over the years' files, a record batch at a time, so memory stays
+    # flat however large the snapshot. Columns come in schema order.
+    root = snapshot_root()
+    names = [name for name in SCHEMA.names if columns is None or name in columns]
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, pa.schema([SCHEMA.field(name) for name in names])) as writer:
+        for academic_year in academic_years:
+            parquet = pq.ParquetFile(year_path(root, academic_year))
+            for batch in parquet.iter_batches(batch_size=BATCH_SIZE, columns=names):
+                writer.write_batch(batch)
+                yield _drain(sink)
+    yield _drain(sink)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write Parquet snapshots of marks for analytics, one file per academic year")
+    parser.add_argument("--full", action="store_true", help="rewrite every year instead of merging changed marks")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    # Off the primary when a replica is configured; the lookback absorbs replication lag
+    with read_session() as db:
+        counts = write_snapshots(db, args.full)
+    for year, rows in sorted(counts.items()):
+        print(f"{year}: {rows} marks")
+    print(f"Snapshots in {snapshot_root()}" if counts else "No changes since the last snapshot")
@@ -0,0 +1,76 @@
+import argparse
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from backend import gradebook, models
+from backend.database import SessionLocal, engine
+from backend.query_budget import query_budget
+
+OVERALL_YEAR = "ALL"
+
+Summary = models.StudentResultSummary
+
+def _overall_rows(student_ids):
+    # OVERALL_YEAR from the per-year rows, so archived years (whose marks have left the
+    # marks table) still count
+    grade_points = func.sum(Summary.grade_points)
+    total_credits = func.sum(Summary.total_credits)
+    failed_subjects = func.sum(Summary.failed_subjects)
+    statement = select(
+        Summary.student_id,
+        literal(OVERALL_YEAR),
+        func.sum(Summary.subjects_count),
+        total_credits,
+        grade_points,
+        failed_subjects,
+        case((total_credits > 0, func.round(grade_points / total_credits, 2)), else_=0),
+        failed_subjects == 0
+    ).where(Summary.academic_year != OVERALL_YEAR).group_by(Summary.student_id)
+    if student_ids is not None:
+        statement = statement.where(Summary.student_id.in_(student_ids))
+    return statement
+
+@query_budget(4)
+def refresh_result_summaries(db: Session, pairs: Optional[Iterable[Tuple[int, str]]] = None):
+    # Runs inside the caller's transaction; pairs=None rebuilds everything. A student's
+    # OVERALL_YEAR row depends on every year, so all live years of an affected student are
+    # rebuilt, which also clears years that no longer have marks. Rows of archived years are
+    # left as they are.
+    if pairs is None:
+        student_ids = None
+    else:
+        student_ids = sorted({student_id for student_id, _ in pairs})
+        if not student_ids:
+            return
+
+    per_year, _ = gradebook.summarize(gradebook.load_cohort(db, student_ids))
+
+    stale = delete(Summary).where(Summary.academic_year.not_in(select(models.ArchivedYear.academic_year)))
+    if student_ids is not None:
+        stale = stale.where(Summary.student_id.in_(student_ids))
+    db.execute(stale)
+
+    rows = per_year.rows()
+    if rows:
+        db.execute(insert(Summary), rows)
+    db.execute(insert(Summary).from_select(
+        ['student_id', 'academic_year', 'subjects_count', 'total_credits', 'grade_points', 'failed_subjects',
+         'cgpa', 'passed'],
+        _overall_rows(student_ids)
+    ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the materialized student result summaries")
+    parser.add_argument("--student-id", type=int, action="append", help="only rebuild these students")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        pairs = None
+        if args.student_id:
+            pairs = [(student_id, OVERALL_YEAR) for student_id in args.student_id]
+        refresh_result_summaries(db, pairs)
+        db.commit()
+    print("Result summaries rebuilt")
@@ -0,0 +1,188 @@
+"""Mixed-load latency benchmark for the API.
+
+Starts the backend under uvicorn against a throwaway SQLite database, then
+drives a mix of logins (bcrypt), admin summaries, listings and student
+results with N concurrent clients and reports p50/p95/p99 per endpoint.
+
+    python benchmarks/concurrency.py --mode sync --mode async
+    python benchmarks/concurrency.py --app-dir /path/to/older/checkout --mode sync
+
+Pointing --app-dir at a checkout of an older commit gives the "before" numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SEED_SCRIPT = """
+import random, sys
+from backend import models
+from backend.database import SessionLocal, engine
+from backend.auth import get_password_hash
+
+students, subjects = int(sys.argv[1]), int(sys.argv[2])
+models.Base.metadata.create_all(bind=engine)
+password_hash = get_password_hash("secret")
+rng = random.Random(7)
+with SessionLocal() as db:
+    db.add(models.Admin(username="admin", password_hash=password_hash, full_name="Admin", email="admin@bench"))
+    db.add(models.Teacher(username="teacher1", password_hash=password_hash, full_name="Teacher", email="t@bench", department="CS"))
+    db.add_all(models.Subject(subject_code=f"S{i}", subject_name=f"Subject {i}", semester=i % 8 + 1,
+                              credits=3, max_marks=100, passing_marks=40) for i in range(subjects))
+    db.add_all(models.Student(username=f"student{i}", password_hash=password_hash, full_name=f"Student {i}",
+                              email=f"s{i}@bench", roll_number=f"R{i:06d}", semester=i % 8 + 1, department="CS")
+               for i in range(1, students + 1))
+    db.flush()
+    db.add_all(models.Mark(student_id=s, subject_id=j + 1, marks_obtained=rng.randint(20, 100),
+                           academic_year="2024-25", updated_by=1)
+               for s in range(1, students + 1) for j in range(subjects))
+    db.commit()
+try:
+    from backend.summaries import refresh_result_summaries
+except ImportError:
+    pass
+else:
+    with SessionLocal() as db:
+        refresh_result_summaries(db)
+        db.commit()
+"""
+
+# (weight, name, user_type, method, path)
+WORKLOAD = [
+    (2, "login", None, "POST", "/login"),
+    (2, "admin_summary", "admin", "GET", "/admin/summary"),
+    (3, "admin_students", "admin", "GET", "/admin/students"),
+    (5, "student_results", "student", "GET", "/student/results"),
+    (2, "teacher_marks", "teacher", "GET", "/teacher/marks"),
+]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def login(client, username, user_type):
+    response = await client.post(f"/login?user_type={user_type}", json={"username": username, "password": "secret"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def run_load(base_url, requests_total, concurrency, students):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        headers = {
+            "admin": await login(client, "admin", "admin"),
+            "teacher": await login(client, "teacher1", "teacher"),
+            "student": await login(client, "student1", "student"),
+        }
+        rng = random.Random(42)
+        plan = rng.choices(WORKLOAD, weights=[w[0] for w in WORKLOAD], k=requests_total)
+        queue = asyncio.Queue()
+        for item in plan:
+            queue.put_nowait(item)
+        latencies = {name: [] for _, name, *_ in WORKLOAD}
+        errors = {name: 0 for _, name, *_ in WORKLOAD}
+
+        async def worker():
+            while not queue.empty():
+                _, name, user_type, method, path = queue.get_nowait()
+                started = time.perf_counter()
+                if name == "login":
+                    username = f"student{rng.randint(1, students)}"
+                    response = await client.post(f"{path}?user_type=student", json={"username": username, "password": "secret"})
+                else:
+                    response = await client.request(method, path, headers=headers[user_type])
+                latencies[name].append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {"elapsed_s": elapsed, "throughput_rps": requests_total / elapsed, "endpoints": {}}
+    everything = []
+    for name, values in latencies.items():
+        if not values:
+            continue
+        everything += values
+        report["endpoints"][name] = dict(summarize(values), errors=errors[name])
+    report["overall"] = summarize(everything)
+    return report
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean_ms": statistics.mean(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", ASYNC_DB="true" if mode == "async" else "false")
+        app_dir = str(Path(args.app_dir).resolve())
+        subprocess.run([sys.executable, "-c", SEED_SCRIPT, str(args.students), str(args.subjects)],
+                       cwd=app_dir, env=env, check=True)
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=app_dir, env=env
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            for _ in range(100):
+                try:
+                    httpx.get(f"{base_url}/docs")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            return asyncio.run(run_load(base_url, args.requests, args.concurrency, args.students))
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=str(REPO_ROOT), help="checkout whose backend is benchmarked")
+    parser.add_argument("--mode", action="append", choices=["sync", "async"], help="session mode(s) to run")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.mode or ["sync"]:
+        results[mode] = run_mode(mode, args)
+        overall = results[mode]["overall"]
+        print(f"{mode:>5}: {results[mode]['throughput_rps']:.1f} req/s  "
+              f"p50 {overall['p50_ms']:.1f} ms  p95 {overall['p95_ms']:.1f} ms  p99 {overall['p99_ms']:.1f} ms")
+        for name, stats in results[mode]["endpoints"].items():
+            print(f"       {name:<16} p50 {stats['p50_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+                  f"(n={stats['count']}, errors={stats['errors']})")
+
+    report = {"app_dir": args.app_dir, "config": vars(args), "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
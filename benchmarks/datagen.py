@@ -0,0 +1,138 @@
+"""Synthetic dataset generator.
+
+Fills the schema with a parameterised, reproducible dataset using multi-row
+INSERTs, then rebuilds the result summaries:
+
+    python benchmarks/datagen.py --database-url sqlite:///bench.db --students 50000 \\
+        --subjects 500 --years 5 --subjects-per-year 8
+    python benchmarks/datagen.py --database-url mysql+pymysql://root:pw@localhost/bench --drop
+
+Marks rows = students x years x subjects-per-year x exam types. Every account
+gets the password "secret"; usernames are admin, teacher<N> and student<N>.
+The same --seed always produces the same rows.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DEPARTMENTS = ["CS", "IT", "ECE", "ME", "CE", "Math"]
+EXAM_TYPES = ["external", "internal", "practical"]
+DEFAULT_LAST_YEAR = 2024
+
+def academic_years(count: int, last: int):
+    return [f"{year}-{(year + 1) % 100:02d}" for year in range(last - count + 1, last + 1)]
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def generate(db, args, password_hash):
+    from sqlalchemy import insert
+    from backend import models
+
+    rng = random.Random(args.seed)
+    years = academic_years(args.years, args.last_year)
+    exam_types = EXAM_TYPES[:args.exam_types]
+    counts = {}
+
+    def bulk(model, rows):
+        total = 0
+        for batch in batched(rows, args.batch_size):
+            db.execute(insert(model), batch)
+            total += len(batch)
+        db.commit()
+        counts[model.__tablename__] = total
+
+    bulk(models.Admin, [dict(admin_id=1, username="admin", password_hash=password_hash,
+                             full_name="Admin", email="admin@bench.local")])
+    bulk(models.Subject, (
+        dict(subject_id=i, subject_code=f"SUB{i:05d}", subject_name=f"Subject {i}",
+             semester=(i - 1) % 8 + 1, credits=rng.choice((2, 3, 4)), max_marks=100, passing_marks=40)
+        for i in range(1, args.subjects + 1)
+    ))
+    bulk(models.Teacher, (
+        dict(teacher_id=i, username=f"teacher{i}", password_hash=password_hash, full_name=f"Teacher {i}",
+             email=f"teacher{i}@bench.local", department=DEPARTMENTS[i % len(DEPARTMENTS)])
+        for i in range(1, args.teachers + 1)
+    ))
+    bulk(models.Student, (
+        dict(student_id=i, username=f"student{i}", password_hash=password_hash, full_name=f"Student {i}",
+             email=f"student{i}@bench.local", roll_number=f"R{i:07d}", semester=(i - 1) % 8 + 1,
+             department=DEPARTMENTS[i % len(DEPARTMENTS)])
+        for i in range(1, args.students + 1)
+    ))
+    # Each subject is taught by one teacher per year, rotating so teachers share the load evenly
+    bulk(models.TeacherSubject, (
+        dict(teacher_id=(subject_id + offset) % args.teachers + 1, subject_id=subject_id, academic_year=year)
+        for offset, year in enumerate(years)
+        for subject_id in range(1, args.subjects + 1)
+    ))
+
+    per_year = min(args.subjects_per_year, args.subjects)
+
+    def marks():
+        for student_id in range(1, args.students + 1):
+            for year in years:
+                for subject_id in rng.sample(range(1, args.subjects + 1), per_year):
+                    for exam_type in exam_types:
+                        # Roughly normal around 65 with a failing tail
+                        score = min(100, max(0, round(rng.gauss(65, 15), 2)))
+                        yield dict(student_id=student_id, subject_id=subject_id, marks_obtained=score,
+                                   academic_year=year, exam_type=exam_type, updated_by=1)
+    bulk(models.Mark, marks())
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--teachers", type=int, default=50)
+    parser.add_argument("--subjects", type=int, default=50)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--last-year", type=int, default=DEFAULT_LAST_YEAR, help="start year of the latest academic year")
+    parser.add_argument("--subjects-per-year", type=int, default=8)
+    parser.add_argument("--exam-types", type=int, choices=[1, 2, 3], default=1)
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--drop", action="store_true", help="drop and recreate all tables first")
+    args = parser.parse_args(argv)
+
+    # backend.database builds its engine from the environment at import time
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ["ASYNC_DB"] = "false"
+    sys.path.insert(0, str(REPO_ROOT))
+    from backend import models
+    from backend.auth import get_password_hash
+    from backend.database import SessionLocal, engine
+    from backend.summaries import refresh_result_summaries
+
+    if args.drop:
+        models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        counts = generate(db, args, get_password_hash("secret"))
+        inserted = time.perf_counter()
+        refresh_result_summaries(db)
+        db.commit()
+    finished = time.perf_counter()
+
+    print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+    print(f"inserted in {inserted - started:.1f}s, summaries rebuilt in {finished - inserted:.1f}s")
+    return {"rows": counts, "insert_s": inserted - started, "summaries_s": finished - inserted}
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Query-plan regression harness.
+
+Generates a dataset with benchmarks/datagen.py (or uses an existing database),
+runs each crud read path once while capturing the SQL it sends, then EXPLAINs
+every captured statement with its real parameters. A plan that reads a large
+table in full, where that query is expected to use an index, fails the run:
+
+    python benchmarks/explain.py
+    python benchmarks/explain.py --database-url mysql+pymysql://root:pw@localhost/bench --reuse
+    python benchmarks/explain.py --verbose --output plans.json
+
+SQLite plans come from EXPLAIN QUERY PLAN ("SCAN marks" is a full scan);
+MySQL plans from EXPLAIN (access type ALL). Paths that legitimately read
+everything -- full exports, full summary rebuilds, first pages of keyset lists --
+list the tables they may scan next to the call in crud_paths().
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Tables whose size grows with the number of students; scanning the catalog tables
+# (subjects, teachers, data_versions) is cheap and never flagged
+LARGE_TABLES = {"students", "marks", "teacher_subjects", "student_result_summaries"}
+
+DATASET = dict(students=2000, teachers=20, subjects=60, years=3, subjects_per_year=6, exam_types=2)
+
+def crud_paths(dataset):
+    from datetime import datetime
+
+    from sqlalchemy import func, select
+
+    from backend import crud, gradebook, jobs, models, snapshots, summaries
+
+    latest_year = dataset["latest_year"]
+    keys = [(1, subject_id, latest_year, "external") for subject_id in range(1, 11)]
+    return {
+        # name: (call, tables it may scan in full)
+        "get_user": (lambda db: crud.get_user(db, "student1", "student"), set()),
+        "get_data_version": (lambda db: crud.get_data_version(db, crud.MARKS_VERSION), set()),
+        "list_students_first_page": (lambda db: crud.list_students(db), {"students"}),
+        "list_students_next_page": (lambda db: crud.list_students(db, after=1000), set()),
+        "list_students_by_class": (lambda db: crud.list_students(db, department="CS", semester=3), set()),
+        "get_student_results": (lambda db: crud.get_student_results(db, 1), set()),
+        "get_marks_for_teacher_subjects": (lambda db: crud.get_marks_for_teacher_subjects(db, 1, latest_year), set()),
+        "get_marks_for_teacher_subjects_page": (
+            lambda db: crud.get_marks_for_teacher_subjects(db, 1, latest_year, "external", after=(1, 1000)), set()
+        ),
+        "get_teacher_stats": (lambda db: crud.get_teacher_stats(db, 1), set()),
+        "get_teacher_stats_year": (lambda db: crud.get_teacher_stats(db, 1, latest_year, "external"), set()),
+        "current_marks": (lambda db: crud._current_marks(db, keys), set()),
+        "load_cohort_students": (lambda db: gradebook.load_cohort(db, list(range(1, 51))), set()),
+        "get_class_rankings_year": (lambda db: crud.get_class_rankings(db, latest_year, top=10), set()),
+        "get_class_rankings_class": (lambda db: crud.get_class_rankings(db, department="CS", semester=3), set()),
+        "get_class_rankings_student": (lambda db: crud.get_class_rankings(db, student_id=1), set()),
+        "get_subject_percentiles": (lambda db: crud.get_subject_percentiles(db, 1, latest_year, "external"), set()),
+        "get_subject_percentiles_student": (lambda db: crud.get_subject_percentiles(db, student_id=1), set()),
+        "iter_marks_export_year": (lambda db: list(crud.iter_marks_export(db, latest_year)), {"students"}),
+        "iter_results_export": (lambda db: list(crud.iter_results_export(db)), set()),
+        "snapshot_changes": (lambda db: db.execute(snapshots.changes_statement(datetime.now())).all(), set()),
+        "snapshot_year": (lambda db: db.execute(snapshots.year_statement(latest_year).limit(100)).all(), set()),
+        # Report jobs: keyset pages after the first, and the row count for progress
+        "report_job_marks_page": (lambda db: db.execute(
+            crud.marks_export_statement(latest_year).where(models.Mark.mark_id > 1000).limit(jobs.PAGE_SIZE)
+        ).all(), set()),
+        "report_job_results_page": (lambda db: db.execute(
+            crud.results_export_statement(latest_year).where(summaries.Summary.student_id > 1000).limit(jobs.PAGE_SIZE)
+        ).all(), set()),
+        "report_job_marks_count": (lambda db: db.scalar(select(func.count()).select_from(
+            crud.marks_export_statement(latest_year).order_by(None).subquery()
+        )), set()),
+        # Whole-table reads by design
+        "get_admin_summary": (lambda db: crud.get_admin_summary(db, list(crud.SUMMARY_BREAKDOWNS)),
+                              {"students", "student_result_summaries"}),
+        "iter_marks_export_all": (lambda db: list(crud.iter_marks_export(db)), {"marks", "students"}),
+        "refresh_result_summaries_full": (lambda db: summaries.refresh_result_summaries(db),
+                                          {"marks", "student_result_summaries"}),
+        "refresh_result_summaries_students": (
+            lambda db: summaries.refresh_result_summaries(db, [(1, latest_year), (2, latest_year)]), set()
+        ),
+    }
+
+def capture(engine, db, call):
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        call(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        db.rollback()
+    return statements
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)")
+
+def explain(connection, statement, parameters):
+    # -> (plan lines, tables read in full)
+    cursor = connection.connection.cursor()
+    try:
+        if connection.dialect.name == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            details = [row[3] for row in cursor.fetchall()]
+            aliases = _aliases(statement)
+            scanned = set()
+            for detail in details:
+                match = _SQLITE_SCAN.match(detail)
+                if match:
+                    scanned.add(aliases.get(match.group(1), match.group(1)))
+            return details, scanned
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        aliases = _aliases(statement)
+        scanned = {aliases.get(row["table"], row["table"]) for row in rows if row.get("type") == "ALL"}
+        return [f"{row['table']}: {row['type']} key={row.get('key')} rows={row.get('rows')}" for row in rows], scanned
+    finally:
+        cursor.close()
+
+_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?\s+(?:AS\s+)?`?(\w+)`?", re.IGNORECASE)
+
+def _aliases(statement):
+    # marks AS marks_1 -> {"marks_1": "marks"}, so aliased reads still count against the table
+    return {alias: table for table, alias in _ALIAS.findall(statement)
+            if alias.upper() not in {"ON", "WHERE", "JOIN", "GROUP", "ORDER", "LIMIT", "LEFT", "INNER", "UNION"}}
+
+def measure(args):
+    # Runs in its own process: backend.database reads DATABASE_URL at import time
+    sys.path.insert(0, str(REPO_ROOT))
+    from backend.database import SessionLocal, engine
+
+    dataset = json.loads(args.dataset)
+    failures, report = [], {}
+    with SessionLocal() as db:
+        for name, (call, allowed) in crud_paths(dataset).items():
+            plans = []
+            for statement, parameters in capture(engine, db, call):
+                with engine.connect() as connection:
+                    lines, scanned = explain(connection, statement, parameters)
+                regressions = (scanned & LARGE_TABLES) - allowed
+                plans.append({"statement": " ".join(statement.split())[:300], "plan": lines,
+                              "full_scans": sorted(scanned), "regressions": sorted(regressions)})
+                if regressions:
+                    failures.append(f"{name}: full scan of {', '.join(sorted(regressions))}")
+            report[name] = plans
+            status = "FAIL" if any(plan["regressions"] for plan in plans) else "ok"
+            print(f"  {status:<4} {name} ({len(plans)} statements)")
+            if args.verbose or status == "FAIL":
+                for plan in plans:
+                    print(f"         {plan['statement'][:120]}")
+                    for line in plan["plan"]:
+                        print(f"           {line}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"failures": failures, "plans": report}, indent=2))
+    if failures:
+        print("\nPlan regressions:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nNo plan regressions")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    parser.add_argument("--reuse", action="store_true", help="use the data already in --database-url")
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not just the failing ones")
+    parser.add_argument("--output", help="write all plans as JSON here")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dataset", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args)
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from datagen import DEFAULT_LAST_YEAR, academic_years
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{tmp}/explain.db"
+        env = dict(os.environ, DATABASE_URL=url, ASYNC_DB="false", QUERY_BUDGET_MODE="off")
+        if not args.reuse:
+            options = [f"--{name.replace('_', '-')}={value}" for name, value in DATASET.items()]
+            subprocess.run([sys.executable, str(REPO_ROOT / "benchmarks" / "datagen.py"), "--drop", *options],
+                           env=env, check=True)
+        dataset = {"latest_year": academic_years(DATASET["years"], DEFAULT_LAST_YEAR)[-1]}
+        command = [sys.executable, __file__, "--measure", "--dataset", json.dumps(dataset)]
+        if args.verbose:
+            command.append("--verbose")
+        if args.output:
+            command += ["--output", str(Path(args.output).resolve())]
+        return subprocess.run(command, env=env).returncode
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Gradebook engine vs the per-student Python loop.
+
+Builds a synthetic cohort in memory (the row shape the marks query returns,
+with Decimal marks as the database driver hands them over) and computes
+per-year and overall CGPA, pass/fail and cohort ranks twice: once the way
+results used to be computed, one student at a time summing Decimal dicts,
+and once with backend/gradebook.py over NumPy columns (ranked here with a
+sort; the API ranks with SQL window functions). Both must agree. The
+gradebook time includes building the arrays from the rows, which is most of it.
+
+    python benchmarks/gradebook.py --students 1000 --students 50000
+    python benchmarks/gradebook.py --students 10000 --years 5 --repeat 10 --output gradebook.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from backend import gradebook  # noqa: E402
+
+def cohort_rows(students, subjects, years, subjects_per_year, seed):
+    rng = random.Random(seed)
+    catalog = [(subject_id, 100, 40, rng.choice((2, 3, 4))) for subject_id in range(1, subjects + 1)]
+    rows = []
+    for student_id in range(1, students + 1):
+        for year in years:
+            for subject_id, max_marks, passing_marks, credits in rng.sample(catalog, subjects_per_year):
+                score = Decimal(str(min(100, max(0, round(rng.gauss(65, 15), 2)))))
+                rows.append((student_id, year, subject_id, score, max_marks, passing_marks, credits))
+    return rows
+
+def per_student(rows):
+    # The previous approach: group into dicts, then per-row Decimal sums for every student
+    students = {}
+    for student_id, year, subject_id, marks, max_marks, passing_marks, credits in rows:
+        students.setdefault(student_id, []).append({
+            'academic_year': year, 'marks_obtained': marks, 'max_marks': max_marks,
+            'passing_marks': passing_marks, 'credits': credits
+        })
+    results = {}
+    for student_id, marks in students.items():
+        total_credits, grade_points, failed = 0, Decimal(0), 0
+        for mark in marks:
+            grade_points += mark['marks_obtained'] / mark['max_marks'] * 10 * mark['credits']
+            total_credits += mark['credits']
+            failed += mark['marks_obtained'] < mark['passing_marks']
+        cgpa = (grade_points / total_credits).quantize(Decimal("0.01"), ROUND_HALF_UP) if total_credits else 0
+        results[student_id] = (float(cgpa), failed == 0)
+    ordered = sorted(results.values(), key=lambda result: -result[0])
+    first_position = {}
+    for position, (cgpa, _) in enumerate(ordered, start=1):
+        first_position.setdefault(cgpa, position)
+    return {student_id: (cgpa, passed, first_position[cgpa]) for student_id, (cgpa, passed) in results.items()}
+
+def rank(values):
+    # Highest first with SQL RANK() semantics: ties share a position and the next one skips
+    descending = np.sort(-values)
+    return np.searchsorted(descending, -values, side='left') + 1
+
+def vectorized(rows):
+    return compute(gradebook.cohort_from_rows(rows))
+
+def compute(cohort):
+    _, overall = gradebook.summarize(cohort)
+    ranks = rank(overall.cgpa)
+    return {
+        student_id: (cgpa, passed, position)
+        for student_id, cgpa, passed, position in zip(
+            overall.student_id.tolist(), overall.cgpa.tolist(), overall.passed.tolist(), ranks.tolist()
+        )
+    }
+
+def timed(fn, rows, repeat):
+    fn(rows)  # warm-up
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(rows)
+        runs.append(time.perf_counter() - started)
+    return result, {"median_ms": statistics.median(runs) * 1000, "min_ms": min(runs) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, action="append", help="cohort size(s); default 1000 and 10000")
+    parser.add_argument("--subjects", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--subjects-per-year", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    years = [f"{year}-{(year + 1) % 100:02d}" for year in range(2024 - args.years + 1, 2025)]
+    report = {"config": vars(args), "results": {}}
+    for students in args.students or [1000, 10000]:
+        rows = cohort_rows(students, args.subjects, years, args.subjects_per_year, args.seed)
+        expected, loop = timed(per_student, rows, args.repeat)
+        actual, engine = timed(vectorized, rows, args.repeat)
+        if actual != expected:
+            mismatched = sum(actual.get(student_id) != result for student_id, result in expected.items())
+            raise SystemExit(f"{students} students: gradebook disagrees with the per-student loop "
+                             f"for {mismatched} students")
+        # Of which the arithmetic alone, on columns that are already built
+        _, arithmetic = timed(compute, gradebook.cohort_from_rows(rows), args.repeat)
+        speedup = loop["median_ms"] / engine["median_ms"]
+        report["results"][students] = {"marks": len(rows), "per_student": loop, "gradebook": engine,
+                                       "gradebook_compute": arithmetic, "speedup": speedup}
+        print(f"{students:>7} students, {len(rows):>8} marks: per-student {loop['median_ms']:9.1f} ms  "
+              f"gradebook {engine['median_ms']:8.1f} ms ({arithmetic['median_ms']:.1f} ms computing)  "
+              f"({speedup:.1f}x)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Read-replica routing check.
+
+Runs the app against a primary and one replica and verifies where each request
+went (per-engine pool checkouts) and what it saw:
+
+  1. a GET goes to the replica
+  2. a write (PATCH /teacher/marks) goes to the primary and sets the sticky cookie
+  3. the writer's next GET goes to the primary and sees its own write
+  4. without the cookie, or once it has expired, GETs go back to the replica
+
+By default the primary is a throwaway SQLite file generated with
+benchmarks/datagen.py and the replica a copy of it. The copy is never updated,
+so step 4 also shows the replica's (stale) value. With real replication, pass
+both URLs; the replica then catches up and its value is only reported:
+
+    python benchmarks/replicas.py
+    python benchmarks/replicas.py --async
+    python benchmarks/replicas.py --database-url mysql+pymysql://root:pw@localhost:3306/bench \\
+        --replica-url mysql+pymysql://root:pw@localhost:3307/bench
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DATASET = dict(students=200, teachers=5, subjects=20, years=2, subjects_per_year=4, exam_types=1)
+STICKY_SECONDS = 2
+
+def measure(args):
+    # Runs in its own process: backend.database reads the URLs at import time
+    sys.path.insert(0, str(REPO_ROOT))
+    from fastapi.testclient import TestClient
+    from backend import main
+    from backend.database import pool_monitors
+    from backend.replicas import STICKY_COOKIE
+
+    primary = "async" if args.use_async else "primary"
+    replica = "async_replica1" if args.use_async else "replica1"
+    client = TestClient(main.app)
+    failures = []
+
+    def checkouts():
+        return {name: pool_monitors[name].snapshot()["checkouts"] for name in (primary, replica)}
+
+    def served_by(method, path, **kwargs):
+        before = checkouts()
+        response = client.request(method, path, **kwargs)
+        after = checkouts()
+        used = [name for name in (primary, replica) if after[name] > before[name]]
+        return response, used
+
+    def check(step, condition, detail):
+        print(f"  {'ok' if condition else 'FAIL':<4} {step}: {detail}")
+        if not condition:
+            failures.append(step)
+
+    response = client.post("/login?user_type=teacher", json={"username": "teacher1", "password": "secret"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    check("login", STICKY_COOKIE not in response.cookies, "no sticky cookie for signing in")
+
+    response, used = served_by("GET", "/teacher/marks", headers=headers)
+    check("read", used == [replica], f"GET /teacher/marks served by {used}")
+    page = response.json()
+    mark = dict(zip(page["columns"], page["rows"][0]))
+    written = 100.0 if mark["marks_obtained"] != 100.0 else 99.0
+
+    response, used = served_by("PATCH", "/teacher/marks", headers=headers, json=[{
+        "student_id": mark["student_id"], "subject_id": mark["subject_id"], "academic_year": page["academic_year"],
+        "exam_type": mark["exam_type"], "previous_marks": mark["marks_obtained"], "marks_obtained": written
+    }])
+    check("write", response.status_code == 200 and used == [primary], f"PATCH {response.status_code} served by {used}")
+    check("sticky cookie", STICKY_COOKIE in response.cookies, f"Set-Cookie {STICKY_COOKIE}")
+
+    def current_value():
+        response, used = served_by("GET", "/teacher/marks", headers=headers,
+                                   params={"subject_id": mark["subject_id"], "exam_type": mark["exam_type"]})
+        rows = [dict(zip(page["columns"], row)) for row in response.json()["rows"]]
+        return next(row["marks_obtained"] for row in rows if row["mark_id"] == mark["mark_id"]), used
+
+    value, used = current_value()
+    check("read your writes", used == [primary] and value == written,
+          f"GET within {STICKY_SECONDS}s of the write served by {used}, sees {value}")
+
+    client.cookies.clear()
+    value, used = current_value()
+    check("other clients", used == [replica], f"GET without the cookie served by {used}, sees {value}")
+    if args.stale_replica:
+        check("replica is separate", value == mark["marks_obtained"], "the copied replica still has the old value")
+
+    response, _ = served_by("PATCH", "/teacher/marks", headers=headers, json=[{
+        "student_id": mark["student_id"], "subject_id": mark["subject_id"], "academic_year": page["academic_year"],
+        "exam_type": mark["exam_type"], "previous_marks": written, "marks_obtained": mark["marks_obtained"]
+    }])
+    time.sleep(STICKY_SECONDS + 0.5)
+    _, used = current_value()
+    check("expiry", used == [replica], f"GET {STICKY_SECONDS}s after the last write served by {used}")
+
+    if failures:
+        print(f"\nFailed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nReplica routing ok")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="primary; defaults to a throwaway SQLite file")
+    parser.add_argument("--replica-url", help="a replica of --database-url; defaults to a copy of the SQLite file")
+    parser.add_argument("--reuse", action="store_true", help="use the data already in --database-url")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run with ASYNC_DB=true")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--stale-replica", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args)
+    if bool(args.database_url) != bool(args.replica_url):
+        parser.error("--database-url and --replica-url go together")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        primary = args.database_url or f"sqlite:///{tmp}/primary.db"
+        replica = args.replica_url or f"sqlite:///{tmp}/replica.db"
+        env = dict(os.environ, DATABASE_URL=primary, ASYNC_DB="false", QUERY_BUDGET_MODE="off")
+        if not args.reuse:
+            options = [f"--{name.replace('_', '-')}={value}" for name, value in DATASET.items()]
+            subprocess.run([sys.executable, str(REPO_ROOT / "benchmarks" / "datagen.py"), "--drop", *options],
+                           env=env, check=True)
+        if not args.replica_url:
+            shutil.copy(f"{tmp}/primary.db", f"{tmp}/replica.db")
+
+        env.update(REPLICA_URLS=replica, REPLICA_STICKY_SECONDS=str(STICKY_SECONDS),
+                   ASYNC_DB="true" if args.use_async else "false")
+        command = [sys.executable, __file__, "--measure"]
+        if args.use_async:
+            command.append("--async")
+        if not args.replica_url:
+            command.append("--stale-replica")
+        return subprocess.run(command, env=env).returncode
+
+if __name__ == "__main__":
+    sys.exit(main())
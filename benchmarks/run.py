@@ -0,0 +1,306 @@
+"""Benchmark suite: every endpoint and the crud functions behind them, at several data scales.
+
+For each scale a dataset is generated with benchmarks/datagen.py, then a
+separate process times each crud call (own session per call) and each
+endpoint (in-process TestClient) --repeat times after one warm-up run. The
+process also records how many SQL statements each call issued. Results are
+written as JSON and tagged with the commit, so two runs can be compared:
+
+    python benchmarks/run.py --scale small --scale medium
+    python benchmarks/run.py --scale large --database-url mysql+pymysql://root:pw@localhost/bench
+    python benchmarks/run.py --compare benchmarks/results/old.json benchmarks/results/new.json
+
+Without --database-url every scale uses a throwaway SQLite file. A MySQL
+database given with --database-url is dropped and refilled for every scale.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from datagen import DEFAULT_LAST_YEAR, academic_years
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# datagen.py arguments per scale; "large" is the 50k-student, ~2M-marks target
+SCALES = {
+    "tiny": dict(students=200, teachers=10, subjects=16, years=2, subjects_per_year=6),
+    "small": dict(students=1000, teachers=20, subjects=50, years=2, subjects_per_year=8),
+    "medium": dict(students=10000, teachers=100, subjects=200, years=3, subjects_per_year=8),
+    "large": dict(students=50000, teachers=250, subjects=500, years=5, subjects_per_year=8),
+}
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "min_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+def time_call(fn, repeat):
+    fn(0)  # warm-up: caches, connection pool, SQLite page cache
+    samples = []
+    for i in range(1, repeat + 1):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def crud_benchmarks(dataset):
+    from sqlalchemy import select
+    from backend import crud, models, schemas
+    from backend.summaries import refresh_result_summaries
+
+    students = dataset["students"]
+    latest_year = dataset["latest_year"]
+
+    def changed_marks(db, i):
+        # 100 existing marks with a new value each run, so every run really writes
+        keys = db.execute(
+            select(models.Mark.student_id, models.Mark.subject_id, models.Mark.academic_year, models.Mark.exam_type)
+            .order_by(models.Mark.mark_id).limit(100)
+        ).all()
+        return [schemas.MarkUpdate(student_id=s, subject_id=j, academic_year=y, exam_type=e,
+                                   marks_obtained=(i * 7 + n) % 100) for n, (s, j, y, e) in enumerate(keys)]
+
+    def full_refresh(db, i):
+        refresh_result_summaries(db)
+        db.commit()
+
+    return {
+        "get_user": lambda db, i: crud.get_user(db, f"student{students // 2}", "student"),
+        "list_students": lambda db, i: crud.list_students(db),
+        "list_students_deep_page": lambda db, i: crud.list_students(db, after=students // 2),
+        "list_students_filtered": lambda db, i: crud.list_students(db, department="CS", semester=3, prefix="Student 1"),
+        "list_students_all": lambda db, i: crud.list_students(db, limit=None),
+        "list_teachers": lambda db, i: crud.list_teachers(db),
+        "list_subjects": lambda db, i: crud.list_subjects(db),
+        "get_admin_summary": lambda db, i: crud.get_admin_summary(db),
+        "get_admin_summary_breakdowns": lambda db, i: crud.get_admin_summary(db, list(crud.SUMMARY_BREAKDOWNS)),
+        "get_student_results": lambda db, i: crud.get_student_results(db, 1),
+        "get_marks_for_teacher_subjects": lambda db, i: crud.get_marks_for_teacher_subjects(db, 1),
+        "get_teacher_stats": lambda db, i: crud.get_teacher_stats(db, 1),
+        "get_class_rankings": lambda db, i: crud.get_class_rankings(db, top=10),
+        "get_subject_percentiles": lambda db, i: crud.get_subject_percentiles(db, 1),
+        "get_class_rankings_one_student": lambda db, i: crud.get_class_rankings(db, student_id=1),
+        "get_subject_percentiles_one_student": lambda db, i: crud.get_subject_percentiles(db, student_id=1),
+        "update_marks_100": lambda db, i: crud.update_marks(db, changed_marks(db, i), 1),
+        "refresh_result_summaries_full": full_refresh,
+        "iter_marks_export_latest_year": lambda db, i: sum(1 for _ in crud.iter_marks_export(db, latest_year)),
+        "iter_results_export": lambda db, i: sum(1 for _ in crud.iter_results_export(db)),
+    }
+
+def endpoint_benchmarks(client, dataset):
+    # name -> function(i) returning (method, path, request kwargs); only the request is timed
+    run_id = int(time.time())
+    created_subjects = []
+
+    def new_student(i):
+        return ("POST", "/admin/students", dict(json=dict(
+            username=f"bench{run_id}s{i}", password="secret", full_name="Bench", email=f"bench{run_id}s{i}@bench.local",
+            roll_number=f"B{run_id}S{i}", semester=1, department="CS")))
+
+    def new_teacher(i):
+        return ("POST", "/admin/teachers", dict(json=dict(
+            username=f"bench{run_id}t{i}", password="secret", full_name="Bench", email=f"bench{run_id}t{i}@bench.local",
+            department="CS")))
+
+    def import_file(i):
+        lines = ["username,password,full_name,email,roll_number,semester,department"]
+        lines += [f"bench{run_id}i{i}n{n},secret,Bench,bench{run_id}i{i}n{n}@bench.local,B{run_id}I{i}N{n},1,CS"
+                  for n in range(100)]
+        return ("POST", "/admin/import/students", dict(files={"file": ("students.csv", "\n".join(lines).encode())}))
+
+    def new_subject(i):
+        return ("POST", "/admin/subjects", dict(json=dict(
+            subject_code=f"B{run_id % 100000}{i}", subject_name="Bench", semester=1, credits=3, max_marks=100, passing_marks=40)))
+
+    def assign(i):
+        subject_id = created_subjects[i % len(created_subjects)]
+        return ("POST", f"/admin/assign-teacher?teacher_id=1&subject_id={subject_id}", {})
+
+    def logout(i):
+        # A fresh student per run: two logins in the same second yield the same (revoked) token
+        return ("POST", "/logout", dict(headers=login_headers("student", f"student{i + 2}")))
+
+    def marks_payload(i):
+        return ("POST", "/teacher/marks", dict(json=[
+            dict(student_id=s, subject_id=1, academic_year=dataset["latest_year"], exam_type="external",
+                 marks_obtained=(i * 7 + s) % 100)
+            for s in range(1, 101)
+        ]))
+
+    def login_headers(user_type, username):
+        response = client.post(f"/login?user_type={user_type}", json={"username": username, "password": "secret"})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    plain = lambda method, path: (lambda i: (method, path, {}))
+    return {
+        "metrics": (None, plain("GET", "/metrics")),
+        "login": (None, lambda i: ("POST", "/login?user_type=student",
+                                   dict(json={"username": f"student{i + 1}", "password": "secret"}))),
+        "logout": (None, logout),
+        "admin_token_cache": ("admin", plain("GET", "/admin/auth/token-cache")),
+        "admin_pool": ("admin", plain("GET", "/admin/pool")),
+        "admin_students": ("admin", plain("GET", "/admin/students")),
+        "admin_students_filtered": ("admin", plain("GET", "/admin/students?department=CS&semester=3&prefix=Student%201")),
+        "admin_students_all": ("admin", plain("GET", "/admin/students?paginate=false")),
+        "admin_teachers": ("admin", plain("GET", "/admin/teachers")),
+        "admin_subjects": ("admin", plain("GET", "/admin/subjects")),
+        "admin_create_student": ("admin", new_student),
+        "admin_create_teacher": ("admin", new_teacher),
+        "admin_import_100_students": ("admin", import_file),
+        "admin_create_subject": ("admin", new_subject),
+        "admin_assign_teacher": ("admin", assign),
+        "admin_summary": ("admin", plain("GET", "/admin/summary")),
+        "admin_summary_breakdowns": ("admin", plain("GET", "/admin/summary?breakdown=department&breakdown=semester&breakdown=academic_year")),
+        "admin_export_marks_latest_year": ("admin", plain("GET", f"/admin/export/marks?academic_year={dataset['latest_year']}")),
+        "admin_export_results": ("admin", plain("GET", "/admin/export/results")),
+        "admin_rankings_top10": ("admin", plain("GET", "/admin/rankings?top=10")),
+        "admin_subject_percentiles": ("admin", plain("GET", "/admin/rankings/subjects/1")),
+        "teacher_marks": ("teacher", plain("GET", "/teacher/marks")),
+        "teacher_stats": ("teacher", plain("GET", "/teacher/stats")),
+        "teacher_update_100_marks": ("teacher", marks_payload),
+        "student_results": ("student", plain("GET", "/student/results")),
+        "student_rank": ("student", plain("GET", "/student/rank")),
+    }, created_subjects
+
+def measure(args):
+    # Runs in its own process: backend.database reads DATABASE_URL at import time
+    sys.path.insert(0, str(REPO_ROOT))
+    from fastapi.testclient import TestClient
+    from backend import main, metrics
+    from backend.database import SessionLocal
+    from backend.query_budget import query_budget
+
+    dataset = json.loads(args.dataset)
+    results = {"crud": {}, "endpoints": {}}
+
+    for name, fn in crud_benchmarks(dataset).items():
+        trackers = []
+
+        def call(i):
+            with SessionLocal() as db, query_budget(None, None, name=name, mode="warn") as tracker:
+                fn(db, i)
+            trackers.append(tracker)
+        samples = time_call(call, args.repeat)
+        results["crud"][name] = dict(summarize(samples), statements=trackers[-1].count)
+        print(f"  crud  {name:<34} median {results['crud'][name]['median_ms']:9.2f} ms", file=sys.stderr)
+
+    client = TestClient(main.app)
+    headers = {}
+    for user_type, username in (("admin", "admin"), ("teacher", "teacher1"), ("student", "student1")):
+        response = client.post(f"/login?user_type={user_type}", json={"username": username, "password": "secret"})
+        response.raise_for_status()
+        headers[user_type] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    benchmarks, created_subjects = endpoint_benchmarks(client, dataset)
+    for name, (user_type, prepare) in benchmarks.items():
+        statuses = []
+        statements = []
+
+        def call(i):
+            method, path, kwargs = prepare(i)
+            kwargs.setdefault("headers", headers.get(user_type, {}))
+            before = route_statements(metrics.registry)
+            started = time.perf_counter()
+            response = client.request(method, path, **kwargs)
+            elapsed = time.perf_counter() - started
+            statuses.append(response.status_code)
+            statements.append(int(route_statements(metrics.registry) - before))
+            if name == "admin_create_subject" and response.status_code == 200:
+                created_subjects.append(response.json()["subject_id"])
+            return elapsed
+
+        call(0)
+        samples = [call(i) for i in range(1, args.repeat + 1)]
+        results["endpoints"][name] = dict(summarize(samples), statements=statements[-1],
+                                          errors=sum(1 for s in statuses if s >= 400))
+        print(f"  http  {name:<34} median {results['endpoints'][name]['median_ms']:9.2f} ms", file=sys.stderr)
+
+    print(json.dumps(results))
+
+def route_statements(registry):
+    return sum(route.queries.sum for route in list(registry.routes.values()))
+
+def run_scale(scale, args):
+    params = SCALES[scale]
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/{scale}.db"
+        env = dict(os.environ, DATABASE_URL=database_url, ASYNC_DB=os.environ.get("ASYNC_DB", "false"),
+                   QUERY_BUDGET_MODE="off")
+        datagen = [sys.executable, str(REPO_ROOT / "benchmarks" / "datagen.py"), "--database-url", database_url, "--drop"]
+        datagen += [f"--{key.replace('_', '-')}={value}" for key, value in params.items()]
+        print(f"[{scale}] generating {params}", file=sys.stderr)
+        started = time.perf_counter()
+        subprocess.run(datagen, env=env, check=True, stdout=sys.stderr)
+        generate_s = time.perf_counter() - started
+
+        dataset = dict(params, latest_year=academic_years(params["years"], DEFAULT_LAST_YEAR)[-1])
+        output = subprocess.run(
+            [sys.executable, __file__, "--measure", "--repeat", str(args.repeat), "--dataset", json.dumps(dataset)],
+            env=env, check=True, stdout=subprocess.PIPE, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        return dict(dataset=params, generate_s=generate_s, database=database_url.split(":", 1)[0], **result)
+
+def compare(old_path, new_path):
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    print(f"old {old['commit'][:10]}  ->  new {new['commit'][:10]}")
+    for scale, new_scale in new["scales"].items():
+        old_scale = old["scales"].get(scale)
+        if not old_scale:
+            continue
+        print(f"[{scale}]")
+        for section in ("crud", "endpoints"):
+            for name, stats in new_scale[section].items():
+                before = old_scale[section].get(name)
+                if not before:
+                    continue
+                ratio = stats["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+                print(f"  {section:<9} {name:<34} {before['median_ms']:9.2f} -> {stats['median_ms']:9.2f} ms"
+                      f"  x{ratio:5.2f}  statements {before['statements']} -> {stats['statements']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", action="append", choices=list(SCALES), help="dataset scale(s) to run (default: small)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark, after one warm-up")
+    parser.add_argument("--database-url", help="run against this database (e.g. local MySQL) instead of SQLite")
+    parser.add_argument("--output", help=f"JSON results path (default: {RESULTS_DIR.relative_to(REPO_ROOT)}/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="print median ratios between two result files")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dataset", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args)
+    if args.compare:
+        return compare(*args.compare)
+
+    report = dict(git_revision(), timestamp=datetime.now(timezone.utc).isoformat(), python=platform.python_version(),
+                  repeat=args.repeat, scales={})
+    for scale in args.scale or ["small"]:
+        report["scales"][scale] = run_scale(scale, args)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{report['commit'][:10]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
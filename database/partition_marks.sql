@@ -0,0 +1,29 @@
+-- Native academic-year partitions for marks (MySQL 8). Optional: run once on an existing
+-- database, in a maintenance window. Other backends keep a single marks table; there,
+-- python -m backend.archive close <year> deletes archived rows instead of dropping a partition.
+--
+-- MySQL requires the partitioning column in every unique key, the primary key included,
+-- and a partitioned InnoDB table cannot have foreign keys. unique_mark already contains
+-- academic_year; the primary key gains it, and the two foreign keys go (check their names
+-- with SHOW CREATE TABLE marks; the app never relied on them for cascading).
+ALTER TABLE marks DROP FOREIGN KEY marks_ibfk_1, DROP FOREIGN KEY marks_ibfk_2;
+ALTER TABLE marks DROP PRIMARY KEY, ADD PRIMARY KEY (mark_id, academic_year);
+
+-- One partition per academic year, named p<year> with the dash as an underscore: the
+-- archive command looks partitions up by that name. 'YYYY-YY' strings sort chronologically,
+-- so RANGE COLUMNS works on them directly. Adjust the list to the years in the table.
+-- p_before holds anything older than the first listed year, so each p<year> holds exactly
+-- its year; archiving refuses to drop a partition that holds other years.
+ALTER TABLE marks PARTITION BY RANGE COLUMNS (academic_year) (
+    PARTITION p_before VALUES LESS THAN ('2022-23'),
+    PARTITION p2022_23 VALUES LESS THAN ('2023-24'),
+    PARTITION p2023_24 VALUES LESS THAN ('2024-25'),
+    PARTITION p2024_25 VALUES LESS THAN ('2025-26'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- Before each new academic year, split it off p_future (empty, so this is instant):
+-- ALTER TABLE marks REORGANIZE PARTITION p_future INTO (
+--     PARTITION p2025_26 VALUES LESS THAN ('2026-27'),
+--     PARTITION p_future VALUES LESS THAN (MAXVALUE)
+-- );
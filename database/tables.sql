@@ -35,7 +35,8 @@ CREATE TABLE students (
     roll_number VARCHAR(50) UNIQUE NOT NULL,
     semester INT NOT NULL,
     department VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY ix_students_department_semester (department, semester)
 );
 
 -- Subjects table
@@ -57,7 +58,8 @@ CREATE TABLE teacher_subjects (
     academic_year VARCHAR(20) NOT NULL,
     FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id) ON DELETE CASCADE,
     FOREIGN KEY (subject_id) REFERENCES subjects(subject_id) ON DELETE CASCADE,
-    UNIQUE KEY unique_assignment (teacher_id, subject_id, academic_year)
+    UNIQUE KEY unique_assignment (teacher_id, subject_id, academic_year),
+    KEY ix_teacher_subjects_subject_year (subject_id, academic_year)
 );
 
 -- Student marks
@@ -72,9 +74,83 @@ CREATE TABLE marks (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
     FOREIGN KEY (subject_id) REFERENCES subjects(subject_id) ON DELETE CASCADE,
-    UNIQUE KEY unique_mark (student_id, subject_id, academic_year, exam_type)
+    UNIQUE KEY unique_mark (student_id, subject_id, academic_year, exam_type),
+    KEY ix_marks_subject_year (subject_id, academic_year, exam_type),
+    KEY ix_marks_year (academic_year),
+    KEY ix_marks_updated_at (updated_at)
+);
+
+-- Materialized per-student results, one row per academic year plus an 'ALL' row.
+-- Maintained by crud.update_marks; rebuild with: python -m backend.summaries
+CREATE TABLE student_result_summaries (
+    student_id INT NOT NULL,
+    academic_year VARCHAR(20) NOT NULL,
+    subjects_count INT DEFAULT 0,
+    total_credits INT DEFAULT 0,
+    grade_points DECIMAL(12,4) DEFAULT 0,
+    failed_subjects INT DEFAULT 0,
+    cgpa DECIMAL(4,2) DEFAULT 0,
+    passed BOOLEAN DEFAULT TRUE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (student_id, academic_year),
+    KEY ix_summaries_year_cgpa (academic_year, cgpa),
+    FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE
 );
 
+-- Closed academic years, moved out of marks by: python -m backend.archive close <year>
+-- Compact and write-once; see database/partition_marks.sql for native partitions on marks
+CREATE TABLE marks_history (
+    academic_year VARCHAR(20) NOT NULL,
+    student_id INT NOT NULL,
+    subject_id INT NOT NULL,
+    exam_type ENUM('internal', 'external', 'practical') NOT NULL,
+    marks_obtained DECIMAL(5,2) DEFAULT 0,
+    updated_by INT,
+    updated_at TIMESTAMP NULL,
+    PRIMARY KEY (academic_year, student_id, subject_id, exam_type)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE archived_years (
+    academic_year VARCHAR(20) PRIMARY KEY,
+    marks_count INT NOT NULL DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Background report jobs (backend/jobs.py); results are files under JOB_RESULT_DIR
+CREATE TABLE report_jobs (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(30) NOT NULL,
+    params VARCHAR(500) NOT NULL,
+    status ENUM('queued', 'running', 'done', 'failed', 'expired') NOT NULL DEFAULT 'queued',
+    data_version VARCHAR(100),
+    rows_done INT NOT NULL DEFAULT 0,
+    rows_total INT,
+    result_path VARCHAR(255),
+    result_bytes INT,
+    error TEXT,
+    requested_by INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    KEY ix_report_jobs_report (kind, params),
+    KEY ix_report_jobs_status (status, job_id)
+);
+
+-- Logged-out tokens (sha256), read by every API worker until they expire
+CREATE TABLE revoked_tokens (
+    revocation_id INT AUTO_INCREMENT PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL,
+    expires_at INT NOT NULL
+);
+
+CREATE TABLE data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0
+);
+
+INSERT INTO data_versions (name, version) VALUES ('catalog', 0), ('marks', 0);
+
 -- Insert sample admin
 INSERT INTO admins (username, password_hash, full_name, email) VALUES
 ('admin', '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW', 'System Administrator', 'admin@university.edu');
@@ -1,21 +1,89 @@
 import streamlit as st
-import requests
 import pandas as pd
+import api_client
 
-API_URL = "http://localhost:8000"
+PAGE_SIZE = 100
 
-def get_headers():
-    return {"Authorization": f"Bearer {st.session_state.token}"}
+# name -> (path, {query param: widget key}); widget values are already in session_state
+# at the start of a rerun, so every page can be requested before the tabs are drawn
+PAGED_TABLES = {
+    "students": ("/admin/students", {"prefix": "students_prefix", "department": "students_department", "semester": "students_semester"}),
+    "teachers": ("/admin/teachers", {"prefix": "teachers_prefix", "department": "teachers_department"}),
+    "subjects": ("/admin/subjects", {"prefix": "subjects_prefix", "semester": "subjects_semester"})
+}
+
+# label -> POST /admin/jobs kind
+REPORT_KINDS = {"Admin summary (all breakdowns)": "summary", "Class rankings": "rankings",
+                "Marks export": "marks_export", "Results export": "results_export"}
+
+RANKING_FILTERS = {"academic_year": "rankings_year", "department": "rankings_department",
+                   "semester": "rankings_semester", "top": "rankings_top"}
+
+def page_params(name, filters):
+    # Keyset pagination: keep the stack of cursors we came through so "Previous" works
+    state_key = f"{name}_cursors"
+    filters = {key: value for key, value in filters.items() if value}
+    if st.session_state.get(f"{name}_filters") != filters:
+        st.session_state[f"{name}_filters"] = filters
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+    
+    params = {"limit": PAGE_SIZE, **filters}
+    if cursors[-1] is not None:
+        params["after"] = cursors[-1]
+    return params
+
+def show_paged_table(name, result):
+    status_code, page = result
+    if status_code != 200:
+        st.error(f"Error loading {name}")
+        return
+    cursors = st.session_state[f"{name}_cursors"]
+    
+    if page["items"]:
+        st.dataframe(pd.DataFrame(page["items"]), use_container_width=True)
+    else:
+        st.info(f"No {name} found")
+    
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("Previous", key=f"{name}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(cursors)}")
+    with next_col:
+        if st.button("Next", key=f"{name}_next", disabled=page["next_cursor"] is None):
+            cursors.append(page["next_cursor"])
+            st.rerun()
+
+def report_filename(job):
+    if job["kind"] in ("summary", "rankings"):
+        return f"{job['kind']}.json"
+    return f"{job['kind'].removesuffix('_export')}.{job['params']['format']}"
 
 def admin_dashboard():
     st.title("👨‍💼 Admin Dashboard")
     
+    # Everything the dashboard shows, fetched concurrently (or straight from the client cache)
+    calls = {
+        "summary": ("/admin/summary", None),
+        "all_teachers": ("/admin/teachers", {"paginate": "false"}),
+        "all_subjects": ("/admin/subjects", {"paginate": "false"})
+    }
+    for name, (path, filter_keys) in PAGED_TABLES.items():
+        filters = {param: st.session_state.get(key) for param, key in filter_keys.items()}
+        calls[name] = (path, page_params(name, filters))
+    st.session_state.setdefault("rankings_top", 10)
+    calls["rankings"] = ("/admin/rankings", {
+        param: st.session_state.get(key) or None for param, key in RANKING_FILTERS.items()
+    })
+    results = api_client.get_many(calls)
+    
     # Get admin summary
     try:
-        summary_response = requests.get(f"{API_URL}/admin/summary", headers=get_headers())
-        if summary_response.status_code == 200:
-            summary = summary_response.json()
-            
+        summary_status, summary = results["summary"]
+        if summary_status == 200:
             col1, col2, col3, col4, col5 = st.columns(5)
             
             with col1:
@@ -32,7 +100,7 @@ def admin_dashboard():
     except Exception as e:
         st.error(f"Error loading summary: {e}")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Students", "Teachers", "Subjects", "Assignments"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["Students", "Teachers", "Subjects", "Assignments", "Rankings", "Analytics", "Reports"])
     
     with tab1:
         st.subheader("Student Management")
@@ -42,14 +110,14 @@ def admin_dashboard():
         with col1:
             # Display students
             try:
-                students_response = requests.get(f"{API_URL}/admin/students", headers=get_headers())
-                if students_response.status_code == 200:
-                    students = students_response.json()
-                    if students:
-                        df = pd.DataFrame(students)
-                        st.dataframe(df, use_container_width=True)
-                    else:
-                        st.info("No students found")
+                filter1, filter2, filter3 = st.columns(3)
+                with filter1:
+                    prefix = st.text_input("Name / roll number starts with", key="students_prefix")
+                with filter2:
+                    department = st.text_input("Department", key="students_department")
+                with filter3:
+                    semester = st.selectbox("Semester", [None, 1, 2, 3, 4, 5, 6, 7, 8], key="students_semester")
+                show_paged_table("students", results["students"])
             except Exception as e:
                 st.error(f"Error loading students: {e}")
         
@@ -78,8 +146,8 @@ def admin_dashboard():
                             "department": department,
                             "phone": phone
                         }
-                        response = requests.post(f"{API_URL}/admin/students", json=student_data, headers=get_headers())
-                        if response.status_code == 200:
+                        status_code, _ = api_client.post("/admin/students", json=student_data)
+                        if status_code == 200:
                             st.success("Student added successfully!")
                             st.rerun()
                         else:
@@ -95,14 +163,12 @@ def admin_dashboard():
         with col1:
             # Display teachers
             try:
-                teachers_response = requests.get(f"{API_URL}/admin/teachers", headers=get_headers())
-                if teachers_response.status_code == 200:
-                    teachers = teachers_response.json()
-                    if teachers:
-                        df = pd.DataFrame(teachers)
-                        st.dataframe(df, use_container_width=True)
-                    else:
-                        st.info("No teachers found")
+                filter1, filter2 = st.columns(2)
+                with filter1:
+                    prefix = st.text_input("Name / username starts with", key="teachers_prefix")
+                with filter2:
+                    department = st.text_input("Department", key="teachers_department")
+                show_paged_table("teachers", results["teachers"])
             except Exception as e:
                 st.error(f"Error loading teachers: {e}")
         
@@ -127,8 +193,8 @@ def admin_dashboard():
                             "department": department,
                             "phone": phone
                         }
-                        response = requests.post(f"{API_URL}/admin/teachers", json=teacher_data, headers=get_headers())
-                        if response.status_code == 200:
+                        status_code, _ = api_client.post("/admin/teachers", json=teacher_data)
+                        if status_code == 200:
                             st.success("Teacher added successfully!")
                             st.rerun()
                         else:
@@ -144,14 +210,12 @@ def admin_dashboard():
         with col1:
             # Display subjects
             try:
-                subjects_response = requests.get(f"{API_URL}/admin/subjects", headers=get_headers())
-                if subjects_response.status_code == 200:
-                    subjects = subjects_response.json()
-                    if subjects:
-                        df = pd.DataFrame(subjects)
-                        st.dataframe(df, use_container_width=True)
-                    else:
-                        st.info("No subjects found")
+                filter1, filter2 = st.columns(2)
+                with filter1:
+                    prefix = st.text_input("Code / name starts with", key="subjects_prefix")
+                with filter2:
+                    semester = st.selectbox("Semester", [None, 1, 2, 3, 4, 5, 6, 7, 8], key="subjects_semester")
+                show_paged_table("subjects", results["subjects"])
             except Exception as e:
                 st.error(f"Error loading subjects: {e}")
         
@@ -176,8 +240,8 @@ def admin_dashboard():
                             "max_marks": max_marks,
                             "passing_marks": passing_marks
                         }
-                        response = requests.post(f"{API_URL}/admin/subjects", json=subject_data, headers=get_headers())
-                        if response.status_code == 200:
+                        status_code, _ = api_client.post("/admin/subjects", json=subject_data)
+                        if status_code == 200:
                             st.success("Subject added successfully!")
                             st.rerun()
                         else:
@@ -192,12 +256,10 @@ def admin_dashboard():
         
         with col1:
             try:
-                teachers_response = requests.get(f"{API_URL}/admin/teachers", headers=get_headers())
-                subjects_response = requests.get(f"{API_URL}/admin/subjects", headers=get_headers())
+                teachers_status, teachers = results["all_teachers"]
+                subjects_status, subjects = results["all_subjects"]
                 
-                if teachers_response.status_code == 200 and subjects_response.status_code == 200:
-                    teachers = teachers_response.json()
-                    subjects = subjects_response.json()
+                if teachers_status == 200 and subjects_status == 200:
                     
                     teacher_options = {f"{t['full_name']} ({t['username']})": t['teacher_id'] for t in teachers}
                     subject_options = {f"{s['subject_code']} - {s['subject_name']}": s['subject_id'] for s in subjects}
@@ -210,11 +272,11 @@ def admin_dashboard():
                             teacher_id = teacher_options[selected_teacher]
                             subject_id = subject_options[selected_subject]
                             
-                            response = requests.post(
-                                f"{API_URL}/admin/assign-teacher?teacher_id={teacher_id}&subject_id={subject_id}",
-                                headers=get_headers()
+                            status_code, _ = api_client.post(
+                                "/admin/assign-teacher",
+                                params={"teacher_id": teacher_id, "subject_id": subject_id}
                             )
-                            if response.status_code == 200:
+                            if status_code == 200:
                                 st.success("Assignment successful!")
                             else:
                                 st.error("Error in assignment")
@@ -223,3 +285,106 @@ def admin_dashboard():
                             
             except Exception as e:
                 st.error(f"Error loading data: {e}")
+    
+    with tab5:
+        st.subheader("Class Rankings")
+        st.caption("CGPA rank within each department and semester; percentile is the share of the class ranked below.")
+        
+        filter1, filter2, filter3, filter4 = st.columns(4)
+        with filter1:
+            st.text_input("Academic year (blank = all years)", key="rankings_year")
+        with filter2:
+            st.text_input("Department", key="rankings_department")
+        with filter3:
+            st.selectbox("Semester", [None, 1, 2, 3, 4, 5, 6, 7, 8], key="rankings_semester")
+        with filter4:
+            st.number_input("Top N per class (0 = everyone)", min_value=0, step=1, key="rankings_top")
+        
+        rankings_status, rankings = results["rankings"]
+        if rankings_status == 200:
+            if rankings:
+                st.dataframe(pd.DataFrame(rankings), use_container_width=True, hide_index=True)
+            else:
+                st.info("No results to rank yet")
+        else:
+            st.error("Error loading rankings")
+    
+    with tab6:
+        st.subheader("Marks Analytics")
+        st.caption("Read from the Parquet snapshots (python -m backend.snapshots), not the live database.")
+        
+        snapshots_status, snapshots = api_client.get("/admin/snapshots")
+        if snapshots_status == 200 and snapshots["years"]:
+            st.dataframe(pd.DataFrame(snapshots["years"]), use_container_width=True, hide_index=True)
+            years = st.multiselect("Academic years", [year["academic_year"] for year in snapshots["years"]])
+            if st.button("Load Snapshot"):
+                status_code, marks = api_client.get_arrow("/admin/snapshots/marks", {"academic_year": years})
+                if status_code == 200:
+                    marks["percentage"] = marks["marks_obtained"] / marks["max_marks"] * 100
+                    st.write(f"{len(marks)} marks")
+                    st.dataframe(
+                        marks.pivot_table(index="department", columns="academic_year", values="percentage", aggfunc="mean").round(1),
+                        use_container_width=True
+                    )
+                    st.dataframe(
+                        marks.groupby(["academic_year", "subject_code"])["percentage"].describe().round(1),
+                        use_container_width=True
+                    )
+                else:
+                    st.error("Error loading snapshot")
+        elif snapshots_status == 200:
+            st.info("No snapshots written yet")
+        else:
+            st.error("Error loading snapshots")
+    
+    with tab7:
+        st.subheader("Background Reports")
+        st.caption("Heavy reports run on the server's job workers. A report already computed from the current marks is reused instead of run again.")
+        
+        report1, report2, report3, report4, report5 = st.columns(5)
+        with report1:
+            report = st.selectbox("Report", list(REPORT_KINDS.keys()))
+        with report2:
+            report_year = st.text_input("Academic year", key="report_year")
+        with report3:
+            report_department = st.text_input("Department", key="report_department")
+        with report4:
+            report_semester = st.selectbox("Semester", [None, 1, 2, 3, 4, 5, 6, 7, 8], key="report_semester")
+        with report5:
+            report_format = st.selectbox("Export format", ["csv", "ndjson"], key="report_format")
+        
+        if st.button("Run Report"):
+            status_code, job = api_client.post("/admin/jobs", json={
+                "kind": REPORT_KINDS[report],
+                "breakdown": ["department", "semester", "academic_year"],
+                "academic_year": report_year or None,
+                "department": report_department or None,
+                "semester": report_semester,
+                "format": report_format
+            })
+            if status_code == 202:
+                st.success(f"Job {job['job_id']} is {job['status']}")
+            else:
+                st.error("Error starting the report")
+        
+        jobs_status, report_jobs = api_client.get("/admin/jobs", ttl=0)
+        if jobs_status == 200 and report_jobs:
+            if st.button("Refresh Status"):
+                st.rerun()
+            st.dataframe(
+                pd.DataFrame(report_jobs)[["job_id", "kind", "status", "progress", "rows_done", "stale", "params", "created_at", "error"]],
+                use_container_width=True, hide_index=True
+            )
+            finished = {job["job_id"]: job for job in report_jobs if job["status"] == "done"}
+            if finished:
+                job_id = st.selectbox("Finished job", list(finished.keys()))
+                if st.button("Fetch Result"):
+                    status_code, content = api_client.download(f"/admin/jobs/{job_id}/result")
+                    if status_code == 200:
+                        st.download_button("Save Report", content, file_name=report_filename(finished[job_id]))
+                    else:
+                        st.error("Error fetching the result")
+        elif jobs_status == 200:
+            st.info("No reports run yet")
+        else:
+            st.error("Error loading report jobs")
@@ -0,0 +1,133 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+
+import pyarrow as pa
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = "http://localhost:8000"
+
+READ_CACHE_TTL = 60  # seconds a read is reused before it is revalidated
+REQUEST_TIMEOUT = 30
+MAX_PARALLEL_REQUESTS = 8
+# Set by the API after a write while read replicas are in use; sent back, reads go to the primary
+STICKY_COOKIE = "read_primary_until"
+
+@st.cache_resource
+def _http():
+    # One keep-alive connection pool and fan-out executor shared by every browser session
+    session = requests.Session()
+    # Shared by every user, so it must not collect cookies; see _cookies()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PARALLEL_REQUESTS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session, ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS)
+
+def _auth_headers():
+    token = st.session_state.get("token")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+def _cookies():
+    # Per browser session: only the user who wrote reads from the primary
+    value = st.session_state.get(STICKY_COOKIE)
+    return {STICKY_COOKIE: value} if value else {}
+
+def _cache():
+    # Per browser session and per token: logging in as someone else starts empty
+    cache = st.session_state.get("api_cache")
+    if cache is None or cache["token"] != st.session_state.get("token"):
+        cache = st.session_state["api_cache"] = {"token": st.session_state.get("token"), "entries": {}}
+    return cache["entries"]
+
+def _key(path, params):
+    params = {name: value for name, value in (params or {}).items() if value is not None}
+    return path, tuple(sorted((name, str(value)) for name, value in params.items()))
+
+def _fetch(session, path, params, headers, cookies):
+    # Runs on the executor: no Streamlit state in here
+    response = session.get(f"{API_URL}{path}", params=params, headers=headers, cookies=cookies,
+                           timeout=REQUEST_TIMEOUT)
+    data = response.json() if response.status_code == 200 else None
+    return response.status_code, response.headers.get("ETag"), data
+
+def get_many(calls, ttl=READ_CACHE_TTL):
+    # {name: (path, params)} -> {name: (status_code, data)}; fresh cache entries are served
+    # locally, everything else is fetched concurrently
+    session, executor = _http()
+    entries = _cache()
+    now = time.time()
+    cookies = _cookies()
+    results, pending = {}, {}
+    for name, (path, params) in calls.items():
+        key = _key(path, params)
+        entry = entries.get(key)
+        if entry and entry["expires_at"] > now:
+            results[name] = (200, entry["data"])
+            continue
+        headers = _auth_headers()
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        pending[name] = (key, executor.submit(_fetch, session, path, dict(key[1]), headers, cookies))
+
+    for name, (key, future) in pending.items():
+        try:
+            status_code, etag, data = future.result()
+        except requests.RequestException:
+            results[name] = (None, None)
+            continue
+        if status_code == 304:
+            entries[key]["expires_at"] = time.time() + ttl
+            results[name] = (200, entries[key]["data"])
+        elif status_code == 200:
+            entries[key] = {"data": data, "etag": etag, "expires_at": time.time() + ttl}
+            results[name] = (200, data)
+        else:
+            results[name] = (status_code, None)
+    return results
+
+def get(path, params=None, ttl=READ_CACHE_TTL):
+    return get_many({"result": (path, params)}, ttl)["result"]
+
+def get_arrow(path, params=None):
+    # Arrow IPC stream -> DataFrame; no per-row JSON parsing, numeric columns are used as sent
+    session, _ = _http()
+    response = session.get(f"{API_URL}{path}", params=params, headers=_auth_headers(), cookies=_cookies(),
+                           timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        return response.status_code, None
+    return 200, pa.ipc.open_stream(response.content).read_pandas()
+
+def download(path, params=None):
+    # Raw bytes, never cached (finished report files)
+    session, _ = _http()
+    response = session.get(f"{API_URL}{path}", params=params, headers=_auth_headers(), cookies=_cookies(),
+                           timeout=REQUEST_TIMEOUT)
+    return response.status_code, response.content if response.status_code == 200 else None
+
+def invalidate():
+    # Expire rather than drop, so the next read can still revalidate with its ETag
+    for entry in _cache().values():
+        entry["expires_at"] = 0
+
+def _write(method, path, json=None, params=None, files=None):
+    session, _ = _http()
+    response = session.request(method, f"{API_URL}{path}", json=json, params=params, files=files,
+                               headers=_auth_headers(), cookies=_cookies(), timeout=REQUEST_TIMEOUT)
+    if STICKY_COOKIE in response.cookies:
+        st.session_state[STICKY_COOKIE] = response.cookies[STICKY_COOKIE]
+    if response.ok:
+        invalidate()
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    return response.status_code, data
+
+def post(path, json=None, params=None, files=None):
+    return _write("POST", path, json=json, params=params, files=files)
+
+def patch(path, json=None, params=None):
+    return _write("PATCH", path, json=json, params=params)
@@ -1,5 +1,5 @@
 import streamlit as st
-import requests
+import api_client
 from admin_dashboard import admin_dashboard
 
 from teacher_dashboard import teacher_dashboard
@@ -12,16 +12,15 @@ st.set_page_config(
     layout="wide"
 )
 
-API_URL = "http://localhost:8000"
-
 def login(username, password, user_type):
     try:
-        response = requests.post(
-            f"{API_URL}/login?user_type={user_type}",
+        status_code, token_data = api_client.post(
+            "/login",
+            params={"user_type": user_type},
             json={"username": username, "password": password}
         )
-        if response.status_code == 200:
-            return response.json()
+        if status_code == 200:
+            return token_data
         return None
     except:
         st.error("Unable to connect to server")
@@ -72,6 +71,10 @@ def main():
             st.write(f"Role: {st.session_state.user_type.title()}")
             
             if st.button("Logout"):
+                try:
+                    api_client.post("/logout")
+                except Exception:
+                    pass  # the token expires on its own; never block logging out
                 for key in list(st.session_state.keys()):
                     del st.session_state[key]
                 st.rerun()
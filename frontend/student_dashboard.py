@@ -1,22 +1,23 @@
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.express as px
-
-API_URL = "http://localhost:8000"
-
-def get_headers():
-    return {"Authorization": f"Bearer {st.session_state.token}"}
+import api_client
 
 def student_dashboard():
     st.title("🎓 Student Dashboard")
     st.write(f"Welcome, {st.session_state.full_name}")
     
-    # Get student results
+    academic_year = st.text_input("Academic Year", placeholder="current year").strip() or None
+    
+    # Get student results and class standing together
     try:
-        results_response = requests.get(f"{API_URL}/student/results", headers=get_headers())
-        if results_response.status_code == 200:
-            results = results_response.json()
+        responses = api_client.get_many({
+            "results": ("/student/results", {"academic_year": academic_year}),
+            "standing": ("/student/rank", {"academic_year": academic_year})
+        })
+        results_status, results = responses["results"]
+        standing_status, standing = responses["standing"]
+        if results_status == 200:
             
             student_info = results["student"]
             marks_data = results["marks"]
@@ -43,6 +44,13 @@ def student_dashboard():
                 st.markdown(f"**CGPA:** <span style='color: {cgpa_color}; font-size: 24px; font-weight: bold;'>{cgpa}</span>", unsafe_allow_html=True)
                 
                 st.write(f"**Total Credits:** {total_credits}")
+                if results["year_cgpa"] is not None:
+                    st.write(f"**{results['academic_year']} GPA:** {results['year_cgpa']}")
+                
+                if standing_status == 200 and standing["class_rank"]:
+                    class_rank = standing["class_rank"]
+                    st.write(f"**Class Rank:** {class_rank['rank']} of {class_rank['cohort_size']} "
+                             f"({class_rank['percentile']:.1f} percentile)")
                 
                 # Overall status
                 status_color = "green" if passed else "red"
@@ -52,24 +60,22 @@ def student_dashboard():
             st.divider()
             
             # Marks table
-            st.subheader("Subject-wise Marks")
+            st.subheader(f"Subject-wise Marks ({results['academic_year']})")
             
             if marks_data:
-                # Create DataFrame
+                # Create DataFrame; grade points and pass/fail come from the backend's gradebook
                 df_marks = []
                 for mark in marks_data:
-                    grade_point = (mark["marks_obtained"] / mark["max_marks"]) * 10
-                    status = "Pass" if mark["marks_obtained"] >= mark["passing_marks"] else "Fail"
-                    
                     df_marks.append({
                         "Subject Code": mark["subject_code"],
                         "Subject Name": mark["subject_name"],
+                        "Year": mark["academic_year"],
                         "Marks Obtained": mark["marks_obtained"],
                         "Max Marks": mark["max_marks"],
                         "Passing Marks": mark["passing_marks"],
                         "Credits": mark["credits"],
-                        "Grade Point": round(grade_point, 2),
-                        "Status": status
+                        "Grade Point": mark["grade_point"],
+                        "Status": "Pass" if mark["passed"] else "Fail"
                     })
                 
                 df = pd.DataFrame(df_marks)
@@ -111,6 +117,17 @@ def student_dashboard():
                     )
                     st.plotly_chart(fig_pie, use_container_width=True)
                 
+                # Standing in each subject against everyone who sat the same exam
+                if standing_status == 200 and standing["subjects"]:
+                    st.subheader("Subject Percentiles")
+                    df_standing = pd.DataFrame(standing["subjects"])[[
+                        "subject_code", "subject_name", "academic_year", "exam_type", "marks_obtained",
+                        "rank", "cohort_size", "percentile"
+                    ]]
+                    df_standing.columns = ["Subject Code", "Subject Name", "Year", "Exam", "Marks Obtained",
+                                           "Rank", "Out Of", "Percentile"]
+                    st.dataframe(df_standing, use_container_width=True, hide_index=True)
+                
                 # Grade distribution
                 st.subheader("Grade Point Analysis")
                 
@@ -156,6 +173,8 @@ def student_dashboard():
                             st.warning(f"⚠️ Need to improve in: {', '.join(failed_subjects)}")
                         st.warning("📚 Focus on studies and seek help from teachers.")
             
+        elif academic_year is not None:
+            st.info(f"No results available for {academic_year}.")
         else:
             st.info("No results available yet.")
             
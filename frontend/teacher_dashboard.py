@@ -1,28 +1,85 @@
 import streamlit as st
-import requests
 import pandas as pd
+import api_client
 
-API_URL = "http://localhost:8000"
+MARK_KEY = ["student_id", "subject_id", "academic_year", "exam_type"]
+EXAM_TYPES = [None, "external", "internal", "practical"]
+SUBJECT_COLUMNS = ["subject_id", "subject_code", "subject_name", "max_marks", "passing_marks"]
 
-def get_headers():
-    return {"Authorization": f"Bearer {st.session_state.token}"}
+def marks_frame(page):
+    # Columnar page -> one row per mark, with its subject's details and the page's year
+    df = pd.DataFrame(page["rows"], columns=page["columns"])
+    subjects = pd.DataFrame(page["subjects"], columns=SUBJECT_COLUMNS)
+    df = df.merge(subjects, on="subject_id", how="left")
+    df["academic_year"] = page["academic_year"]
+    return df[["mark_id", "student_id", "student_name", "subject_code", "subject_name", "exam_type",
+               "marks_obtained", "max_marks", "passing_marks", "subject_id", "academic_year"]]
+
+def changed_marks(original_df, edited_df):
+    # Only the cells the teacher touched, each with the value it was loaded with
+    before = original_df["marks_obtained"].astype(float)
+    after = edited_df["marks_obtained"].astype(float)
+    changed = ~((before == after) | (before.isna() & after.isna()))
+    deltas = []
+    for index in edited_df.index[changed & after.notna()]:
+        row = edited_df.loc[index]
+        deltas.append({
+            "student_id": int(row["student_id"]),
+            "subject_id": int(row["subject_id"]),
+            "academic_year": row["academic_year"],
+            "exam_type": row["exam_type"],
+            "previous_marks": None if pd.isna(before[index]) else float(before[index]),
+            "marks_obtained": float(after[index])
+        })
+    return deltas
 
 def teacher_dashboard():
     st.title("👨‍🏫 Teacher Dashboard")
     st.write(f"Welcome, {st.session_state.full_name}")
     
-    # Get teacher's marks data
+    col1, col2 = st.columns(2)
+    with col1:
+        academic_year = st.text_input("Academic Year", placeholder="current year").strip() or None
+    with col2:
+        exam_type = st.selectbox("Exam Type", EXAM_TYPES, format_func=lambda value: value or "All")
+    # Chosen further down, once the subjects are known; the widget keeps its value across reruns
+    subject_id = st.session_state.get("marks_subject")
+    
+    # A page of marks at a time; the stack of cursors makes "Previous" a cache hit
+    filters = (academic_year, exam_type, subject_id)
+    if st.session_state.get("marks_filters") != filters:
+        st.session_state.marks_filters = filters
+        st.session_state.marks_cursors = [None]
+    cursors = st.session_state.marks_cursors
+    
+    # Get teacher's marks data, and the statistics computed over them server-side
     try:
-        marks_response = requests.get(f"{API_URL}/teacher/marks", headers=get_headers())
-        if marks_response.status_code == 200:
-            marks_data = marks_response.json()
+        def stats_call(year):
+            return ("/teacher/stats", {"academic_year": year, "exam_type": exam_type})
+        calls = {"marks": ("/teacher/marks", {"academic_year": academic_year, "exam_type": exam_type,
+                                              "subject_id": subject_id, "after": cursors[-1]})}
+        if academic_year is not None:
+            calls["stats"] = stats_call(academic_year)
+        responses = api_client.get_many(calls)
+        marks_status, marks_page = responses["marks"]
+        if "stats" not in responses:
+            # No year typed in: the stats follow the grid to the year the marks page resolved
+            responses["stats"] = (api_client.get_many({"stats": stats_call(marks_page["academic_year"])})["stats"]
+                                  if marks_status == 200 else (None, None))
+        stats_status, stats = responses["stats"]
+        if marks_status == 200:
             
-            if marks_data:
-                # Convert to DataFrame
-                df = pd.DataFrame(marks_data)
+            if stats_status == 200 and stats["subjects"]:
+                subject_names = {subject["subject_id"]: f"{subject['subject_code']} - {subject['subject_name']}"
+                                 for subject in stats["subjects"]}
+                st.selectbox("Subject", [None] + sorted(subject_names, key=subject_names.get),
+                             format_func=lambda value: subject_names.get(value, "All"), key="marks_subject")
+            
+            if marks_page["rows"]:
+                df = marks_frame(marks_page)
                 
                 # Display current marks with inline editing
-                st.subheader("Student Marks - Edit Inline")
+                st.subheader(f"Student Marks {marks_page['academic_year']} - Edit Inline")
                 st.write("You can edit marks directly in the table below. Changes will be saved when you click 'Update Marks'.")
                 
                 # Configure column types for data editor
@@ -49,92 +106,96 @@ def teacher_dashboard():
                     disabled=["mark_id", "student_id", "subject_id", "student_name", "subject_code", "subject_name", "max_marks", "passing_marks", "academic_year", "exam_type"],
                     hide_index=True,
                     use_container_width=True,
-                    key="marks_editor"
+                    key=f"marks_editor_{filters}_{cursors[-1]}"  # edits belong to one page
                 )
                 
+                col1, col2, _ = st.columns([1, 1, 4])
+                with col1:
+                    if st.button("Previous Page", disabled=len(cursors) == 1):
+                        cursors.pop()
+                        st.rerun()
+                with col2:
+                    if st.button("Next Page", disabled=marks_page["next_cursor"] is None):
+                        cursors.append(marks_page["next_cursor"])
+                        st.rerun()
+                
                 # Update marks button
                 col1, col2, col3 = st.columns([1, 1, 2])
                 
                 with col1:
                     if st.button("Update Marks", type="primary"):
                         try:
-                            # Prepare marks update data
-                            marks_updates = []
-                            for _, row in edited_df.iterrows():
-                                marks_updates.append({
-                                    "mark_id": int(row["mark_id"]) if pd.notna(row["mark_id"]) else None,
-                                    "student_id": int(row["student_id"]),
-                                    "subject_id": int(row["subject_id"]),
-                                    "marks_obtained": float(row["marks_obtained"]),
-                                    "academic_year": row["academic_year"]
-                                })
-                            
-                            # Send update request
-                            response = requests.post(
-                                f"{API_URL}/teacher/marks",
-                                json=marks_updates,
-                                headers=get_headers()
-                            )
-                            
-                            if response.status_code == 200:
-                                st.success("Marks updated successfully!")
-                                st.rerun()
+                            deltas = changed_marks(df, edited_df)
+                            if not deltas:
+                                st.info("No changes to save")
                             else:
-                                st.error("Error updating marks")
+                                status_code, result = api_client.patch("/teacher/marks", json=deltas)
+                                
+                                if status_code == 200:
+                                    st.success(f"Saved {len(deltas)} changed mark(s)")
+                                    st.rerun()
+                                elif status_code == 409:
+                                    # Someone else saved these cells first; nothing of ours was written
+                                    st.error(result["detail"]["message"])
+                                    st.dataframe(pd.DataFrame(result["detail"]["conflicts"]), hide_index=True)
+                                    api_client.invalidate()
+                                else:
+                                    st.error("Error updating marks")
                                 
                         except Exception as e:
                             st.error(f"Error updating marks: {e}")
                 
                 with col2:
                     if st.button("Refresh Data"):
+                        api_client.invalidate()
                         st.rerun()
                 
                 # Show statistics
                 st.subheader("Statistics")
                 
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    total_students = len(edited_df["student_id"].unique())
-                    st.metric("Total Students", total_students)
-                
-                with col2:
-                    subjects = edited_df["subject_name"].unique()
-                    st.metric("Subjects Teaching", len(subjects))
-                
-                with col3:
-                    avg_marks = edited_df["marks_obtained"].mean()
-                    st.metric("Average Marks", f"{avg_marks:.1f}")
-                
-                with col4:
-                    passed_count = len(edited_df[edited_df["marks_obtained"] >= edited_df["passing_marks"]])
-                    st.metric("Students Passed", passed_count)
-                
-                # Subject-wise breakdown
-                st.subheader("Subject-wise Performance")
-                
-                subject_stats = edited_df.groupby(['subject_code', 'subject_name']).agg({
-                    'marks_obtained': ['mean', 'min', 'max', 'count'],
-                    'passing_marks': 'first'
-                }).round(1)
-                
-                subject_stats.columns = ['Avg Marks', 'Min Marks', 'Max Marks', 'Total Students', 'Passing Marks']
-                subject_stats = subject_stats.reset_index()
-                
-                # Calculate pass percentage
-                pass_counts = []
-                for _, row in subject_stats.iterrows():
-                    subject_data = edited_df[edited_df['subject_code'] == row['subject_code']]
-                    passed = len(subject_data[subject_data['marks_obtained'] >= subject_data['passing_marks'].iloc[0]])
-                    pass_percentage = (passed / len(subject_data)) * 100
-                    pass_counts.append(f"{pass_percentage:.1f}%")
-                
-                subject_stats['Pass %'] = pass_counts
-                
-                st.dataframe(subject_stats, use_container_width=True)
-                
+                if stats_status == 200:
+                    totals = stats["totals"]
+                    col1, col2, col3, col4 = st.columns(4)
+                    
+                    with col1:
+                        st.metric("Total Students", totals["students"])
+                    
+                    with col2:
+                        st.metric("Subjects Teaching", totals["subjects"])
+                    
+                    with col3:
+                        average = totals["average"]
+                        st.metric("Average Marks", f"{average:.1f}" if average is not None else "-")
+                    
+                    with col4:
+                        st.metric("Marks Passed", totals["passed"])
+                    
+                    # Distribution as a percentage of max marks
+                    st.bar_chart(pd.DataFrame({"Marks": totals["histogram"]}, index=stats["buckets"]))
+                    
+                    # Subject-wise breakdown
+                    st.subheader("Subject-wise Performance")
+                    
+                    if stats["subjects"]:
+                        subject_stats = pd.DataFrame(stats["subjects"])
+                        subject_stats = subject_stats[[
+                            "subject_code", "subject_name", "academic_year", "average", "min", "max",
+                            "marks", "students", "passing_marks", "pass_percentage"
+                        ]]
+                        subject_stats.columns = [
+                            "Subject", "Subject Name", "Year", "Avg Marks", "Min Marks", "Max Marks",
+                            "Marks", "Total Students", "Passing Marks", "Pass %"
+                        ]
+                        st.dataframe(subject_stats, use_container_width=True, hide_index=True)
+                else:
+                    st.error("Error loading statistics")
+                
+            elif len(cursors) > 1 or any(filters):
+                st.info("No marks match these filters.")
             else:
                 st.info("No subjects assigned to you yet. Please contact the administrator.")
+        elif marks_status == 410:
+            st.info(f"Academic year {academic_year} is archived; its marks can no longer be edited.")
                 
     except Exception as e:
         st.error(f"Error loading marks data: {e}")
@@ -0,0 +1,56 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix="student-results-tests-"))
+
+# Settings are read when config is first imported, so they have to be in place before any
+# backend module loads. ASYNC_DB builds both engines; each test picks one per request.
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{WORKDIR / 'test.db'}",
+    "ASYNC_DATABASE_URL": "",
+    "ASYNC_DB": "true",
+    "REPLICA_URLS": "",
+    "CURRENT_ACADEMIC_YEAR": "2024-25",
+    "QUERY_BUDGET_MODE": "raise",
+    "BCRYPT_ROUNDS": "4",
+    "JOB_WORKERS": "0",
+    "JOB_RESULT_DIR": str(WORKDIR / "job_results"),
+    "SNAPSHOT_DIR": str(WORKDIR / "snapshots"),
+})
+sys.path.insert(0, str(ROOT))
+
+PASSWORD = "secret"  # every account benchmarks/datagen.py creates
+ARCHIVED_YEAR = "2022-23"
+
+@pytest.fixture(scope="session")
+def seeded():
+    # Three years of data with the oldest archived, so reads take their marks_history paths
+    subprocess.run(
+        [sys.executable, str(ROOT / "benchmarks" / "datagen.py"), "--drop", "--students=40", "--teachers=3",
+         "--subjects=12", "--years=3", "--last-year=2024", "--subjects-per-year=4", "--exam-types=2"],
+        env=dict(os.environ, QUERY_BUDGET_MODE="off"), check=True, stdout=subprocess.DEVNULL
+    )
+    from backend import archive, snapshots
+    from backend.database import SessionLocal
+    # Snapshot before archiving: an archived year keeps the snapshot it had
+    with SessionLocal() as db:
+        snapshots.write_snapshots(db, full=True)
+    with SessionLocal() as db:
+        archive.archive_year(db, ARCHIVED_YEAR)
+    yield
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def app_client(seeded):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    # One client for the session: shutdown stops the password hasher and the job runner
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,242 @@
+from decimal import Decimal
+
+import pytest
+
+from backend import jobs
+from backend.database import get_async_db, get_db
+from backend.main import app
+from backend.query_budget import ROUTE_BUDGETS
+from backend.response_cache import catalog_cache, rankings_cache
+from conftest import ARCHIVED_YEAR, PASSWORD
+
+CASES = {}
+
+def case(method, path, expected=200):
+    # Registers how to exercise a route at its worst case: caches cold, archived years present
+    def register(fn):
+        CASES[(method, path)] = (fn, expected)
+        return fn
+    return register
+
+class Caller:
+    def __init__(self, client, mode):
+        self.client = client
+        self.mode = mode
+        self.tokens = {}
+
+    def login(self, username, user_type):
+        response = self.client.post("/login", params={"user_type": user_type},
+                                    json={"username": username, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def auth(self, username, user_type):
+        if username not in self.tokens:
+            self.tokens[username] = self.login(username, user_type)
+        return self.tokens[username]
+
+    @property
+    def admin(self):
+        return self.auth("admin", "admin")
+
+    @property
+    def teacher(self):
+        return self.auth("teacher1", "teacher")
+
+    @property
+    def student(self):
+        return self.auth("student1", "student")
+
+    def unique(self, name):
+        # Writes run once per mode; keep their keys apart
+        return f"{name}_{self.mode}"
+
+    def teacher_marks(self):
+        response = self.client.get("/teacher/marks", headers=self.teacher)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        return [dict(zip(body["columns"], row), academic_year=body["academic_year"]) for row in body["rows"]]
+
+@case("GET", "/metrics")
+def metrics(c):
+    return c.client.get("/metrics")
+
+@case("POST", "/login")
+def login(c):
+    return c.client.post("/login", params={"user_type": "student"},
+                         json={"username": "student2", "password": PASSWORD})
+
+@case("POST", "/logout")
+def logout(c):
+    # A student per mode: a token issued within the same second as a revoked one is identical
+    username = {"sync": "student3", "async": "student4"}[c.mode]
+    return c.client.post("/logout", headers=c.login(username, "student"))
+
+@case("GET", "/admin/auth/token-cache")
+def token_cache(c):
+    return c.client.get("/admin/auth/token-cache", headers=c.admin)
+
+@case("GET", "/admin/pool")
+def pool(c):
+    return c.client.get("/admin/pool", headers=c.admin)
+
+@case("GET", "/admin/students")
+def list_students(c):
+    return c.client.get("/admin/students", params={"department": "CS", "prefix": "S"}, headers=c.admin)
+
+@case("GET", "/admin/teachers")
+def list_teachers(c):
+    return c.client.get("/admin/teachers", headers=c.admin)
+
+@case("GET", "/admin/subjects")
+def list_subjects(c):
+    return c.client.get("/admin/subjects", headers=c.admin)
+
+@case("POST", "/admin/students")
+def create_student(c):
+    username = c.unique("new_student")
+    return c.client.post("/admin/students", headers=c.admin, json={
+        "username": username, "password": "pw", "full_name": "New Student", "email": f"{username}@example.com",
+        "roll_number": username.upper(), "semester": 1, "department": "CS"
+    })
+
+@case("POST", "/admin/teachers")
+def create_teacher(c):
+    username = c.unique("new_teacher")
+    return c.client.post("/admin/teachers", headers=c.admin, json={
+        "username": username, "password": "pw", "full_name": "New Teacher", "email": f"{username}@example.com",
+        "department": "CS"
+    })
+
+@case("POST", "/admin/import/{target}")
+def import_students(c):
+    rows = [f"{c.unique(f'imported{i}')},pw,Imported,{c.unique(f'imported{i}')}@example.com,"
+            f"{c.unique(f'IMP{i}')},1,CS" for i in range(3)]
+    # The duplicate forces the row-by-row fallback
+    rows.append("student1,pw,Duplicate,duplicate@example.com,DUP1,1,CS")
+    body = "username,password,full_name,email,roll_number,semester,department\n" + "\n".join(rows) + "\n"
+    return c.client.post("/admin/import/students", headers=c.admin,
+                         files={"file": ("students.csv", body.encode())})
+
+@case("POST", "/admin/subjects")
+def create_subject(c):
+    return c.client.post("/admin/subjects", headers=c.admin, json={
+        "subject_code": c.unique("NEW"), "subject_name": "New Subject", "semester": 1
+    })
+
+@case("POST", "/admin/assign-teacher")
+def assign_teacher(c):
+    year = {"sync": "2030-31", "async": "2031-32"}[c.mode]
+    return c.client.post("/admin/assign-teacher", headers=c.admin,
+                         params={"teacher_id": 2, "subject_id": 1, "academic_year": year})
+
+@case("GET", "/admin/summary")
+def admin_summary(c):
+    return c.client.get("/admin/summary", headers=c.admin,
+                        params={"breakdown": ["department", "semester", "academic_year"]})
+
+@case("GET", "/admin/rankings")
+def rankings(c):
+    return c.client.get("/admin/rankings", params={"top": 5}, headers=c.admin)
+
+@case("GET", "/admin/rankings/subjects/{subject_id}")
+def subject_percentiles(c):
+    return c.client.get("/admin/rankings/subjects/1", headers=c.admin)
+
+@case("GET", "/admin/export/marks")
+def export_marks(c):
+    return c.client.get("/admin/export/marks", headers=c.admin)
+
+@case("GET", "/admin/export/results")
+def export_results(c):
+    return c.client.get("/admin/export/results", headers=c.admin)
+
+@case("GET", "/admin/snapshots")
+def list_snapshots(c):
+    return c.client.get("/admin/snapshots", headers=c.admin)
+
+@case("GET", "/admin/snapshots/marks")
+def stream_snapshot(c):
+    return c.client.get("/admin/snapshots/marks", params={"academic_year": ARCHIVED_YEAR}, headers=c.admin)
+
+@case("POST", "/admin/jobs", expected=202)
+def enqueue_job(c):
+    return c.client.post("/admin/jobs", headers=c.admin, json={"kind": "summary", "refresh": True})
+
+@case("GET", "/admin/jobs")
+def list_jobs(c):
+    return c.client.get("/admin/jobs", headers=c.admin)
+
+@case("GET", "/admin/jobs/{job_id}")
+def job_status(c):
+    job = c.client.post("/admin/jobs", headers=c.admin, json={"kind": "rankings", "refresh": True}).json()
+    return c.client.get(f"/admin/jobs/{job['job_id']}", headers=c.admin)
+
+@case("GET", "/admin/jobs/{job_id}/result")
+def job_result(c):
+    job = c.client.post("/admin/jobs", headers=c.admin, json={"kind": "marks_export", "refresh": True}).json()
+    jobs.run_job(job["job_id"])  # JOB_WORKERS=0: nothing else picks it up
+    return c.client.get(f"/admin/jobs/{job['job_id']}/result", headers=c.admin)
+
+@case("GET", "/teacher/marks")
+def teacher_marks(c):
+    return c.client.get("/teacher/marks", params={"academic_year": "2024-25"}, headers=c.teacher)
+
+@case("GET", "/teacher/stats")
+def teacher_stats(c):
+    return c.client.get("/teacher/stats", headers=c.teacher)
+
+@case("POST", "/teacher/marks")
+def upsert_marks(c):
+    marks = c.teacher_marks()[:4]
+    payload = [{"student_id": mark["student_id"], "subject_id": mark["subject_id"], "exam_type": mark["exam_type"],
+                "academic_year": mark["academic_year"], "marks_obtained": str(Decimal(str(mark["marks_obtained"])) + 1)}
+               for mark in marks]
+    return c.client.post("/teacher/marks", headers=c.teacher, json=payload)
+
+@case("PATCH", "/teacher/marks")
+def patch_marks(c):
+    marks = c.teacher_marks()
+    existing = marks[0]
+    present = {(mark["student_id"], mark["subject_id"], mark["exam_type"]) for mark in marks}
+    # A mark with no practical yet, so the patch both updates and inserts
+    missing = next(mark for mark in marks if (mark["student_id"], mark["subject_id"], "practical") not in present)
+    return c.client.patch("/teacher/marks", headers=c.teacher, json=[
+        {"student_id": existing["student_id"], "subject_id": existing["subject_id"],
+         "academic_year": existing["academic_year"], "exam_type": existing["exam_type"],
+         "previous_marks": str(existing["marks_obtained"]), "marks_obtained": "61"},
+        {"student_id": missing["student_id"], "subject_id": missing["subject_id"],
+         "academic_year": missing["academic_year"], "exam_type": "practical", "marks_obtained": "30"},
+    ])
+
+@case("GET", "/student/results")
+def student_results(c):
+    return c.client.get("/student/results", params={"academic_year": ARCHIVED_YEAR}, headers=c.student)
+
+@case("GET", "/student/rank")
+def student_rank(c):
+    return c.client.get("/student/rank", headers=c.student)
+
+@pytest.fixture(params=["sync", "async"])
+def caller(request, app_client):
+    if request.param == "sync":
+        app.dependency_overrides[get_async_db] = get_db
+    yield Caller(app_client, request.param)
+    app.dependency_overrides.clear()
+
+def test_every_route_has_a_budget_and_a_case():
+    docs = {app.openapi_url, app.docs_url, app.docs_url + "/oauth2-redirect", app.redoc_url}
+    served = {(method, route.path) for route in app.routes if route.path not in docs
+              for method in route.methods if method != "HEAD"}
+    assert served == set(ROUTE_BUDGETS)
+    assert set(CASES) == set(ROUTE_BUDGETS)
+
+@pytest.mark.parametrize("route", sorted(CASES), ids=lambda route: " ".join(route))
+def test_route_stays_within_budget(caller, route):
+    exercise, expected = CASES[route]
+    # Cold caches, so cached routes run their queries; QUERY_BUDGET_MODE=raise fails the
+    # request (and with it the test) when a route goes over
+    catalog_cache._entries.clear()
+    rankings_cache._entries.clear()
+    response = exercise(caller)
+    assert response.status_code == expected, response.text